@@ -1,16 +1,18 @@
-from flask import Flask, request, jsonify, send_from_director
+from flask import Flask, request, jsonify, send_from_directory
 from flask_cors import CORS
 import os
+import sys
 from werkzeug.utils import secure_filename
 import json
 import webbrowser
 import threading
 import time
-from datetime import datetime
+from datetime import datetime, timezone
 from models import db, FileRecord, TrainingHistory
-import hashlib
 import re
-from config import get_database_uri, USE_SUPABASE
+from config import (get_database_uri, USE_SUPABASE, RAG_AGENT_DIR, RAG_DATA_DIR,
+                    ASK_SLOTS, ASK_QUEUE_SIZE, ASK_QUEUE_TIMEOUT)
+from llm_queue import LLMQueue, QueueFull
 
 app = Flask(__name__)
 CORS(app)
@@ -64,6 +66,45 @@ with app.app_context():
         print(f"⚠️ Database initialization warning: {str(e)}")
         print("   Trying to continue...")
 
+# RAG agent - imported on the first question, so uploads keep working
+# without its dependencies (faiss, numpy, a running Ollama). Every request
+# thread shares its one index and metadata store, and the queue in front of
+# the LLM keeps concurrent questions from oversubscribing the model
+_agent = None
+_agent_lock = threading.Lock()
+ask_queue = LLMQueue(ASK_SLOTS, ASK_QUEUE_SIZE, ASK_QUEUE_TIMEOUT)
+ANSWER_MODES = {'generate', 'extractive'}
+
+def get_agent():
+    """Import the RAG agent and load its knowledge base, once per process"""
+    global _agent
+    if _agent is not None:
+        return _agent
+    with _agent_lock:
+        if _agent is None:
+            # Read by the agent at import; paths in it resolve against this directory
+            os.environ.setdefault('RAG_DATA_DIR', RAG_DATA_DIR)
+            agents_dir = os.path.join(RAG_AGENT_DIR, 'agents')
+            if agents_dir not in sys.path:
+                sys.path.insert(0, agents_dir)
+            import agent1
+            agent1.knowledge.current()
+            _agent = agent1
+    return _agent
+
+def preload_agent():
+    """Load the index and the generation model before the first question"""
+    try:
+        get_agent().warm_up_model()
+    except Exception as e:
+        print(f"⚠️ RAG agent not loaded: {str(e)}")
+        print("   /api/ask will retry on the first question")
+
+def agent_json(payload, status=200):
+    """JSON response for agent output, which may hold numpy floats"""
+    return app.response_class(json.dumps(payload, default=float), status=status,
+                              mimetype='application/json')
+
 def allowed_file(filename, file_type):
     """Check if file extension is allowed"""
     if '.' not in filename:
@@ -471,6 +512,82 @@ def health_check():
         'database': 'connected'
     }), 200
 
+@app.route('/api/ask', methods=['POST'])
+def ask():
+    """Answer a question about a case with the RAG agent"""
+    data = request.get_json(silent=True) or {}
+    question = str(data.get('question') or '').strip()
+    mode = data.get('mode')
+    doc_types = data.get('docTypes')
+    doc_sources = data.get('docSources')
+
+    if not question:
+        return jsonify({'error': 'No question provided', 'success': False}), 400
+    if mode is not None and mode not in ANSWER_MODES:
+        allowed = ', '.join(sorted(ANSWER_MODES))
+        return jsonify({'error': f'Invalid mode {mode!r}. Allowed modes: {allowed}', 'success': False}), 400
+    for name, value in (('docTypes', doc_types), ('docSources', doc_sources)):
+        if value is not None and not (isinstance(value, list) and all(isinstance(v, str) for v in value)):
+            return jsonify({'error': f'{name} must be a list of strings', 'success': False}), 400
+
+    try:
+        agent = get_agent()
+    except Exception as e:
+        app.logger.error(f'RAG agent unavailable: {str(e)}')
+        return jsonify({'error': f'RAG agent unavailable: {str(e)}', 'success': False}), 503
+
+    def answer():
+        return agent.ask_agent_structured(
+            str(data.get('caseId') or f"web_{int(time.time() * 1000)}"),
+            str(data.get('caseContext') or ''),
+            question,
+            doc_types=doc_types,
+            doc_sources=doc_sources,
+            mode=mode
+        )
+
+    try:
+        if agent.extractive_reason(mode or agent.ANSWER_MODE):
+            # Extractive answers (asked for, or while the LLM is down) never reach the model
+            result, waited = answer(), 0.0
+        else:
+            with ask_queue.slot() as waited:
+                result = answer()
+    except QueueFull as e:
+        response = jsonify({
+            'error': f'Too many questions in progress ({e.reason}), retry in {e.retry_after}s',
+            'success': False,
+            'queue': ask_queue.snapshot()
+        })
+        response.headers['Retry-After'] = str(e.retry_after)
+        return response, 429
+    except Exception as e:
+        app.logger.error(f'Ask error: {str(e)}', exc_info=True)
+        return jsonify({'error': f'Ask failed: {str(e)}', 'success': False}), 500
+
+    response = agent_json({
+        'success': True,
+        'response': result,
+        'queue': {'waitedMs': round(waited * 1000, 1), 'depth': ask_queue.queued}
+    })
+    response.headers['X-Queue-Depth'] = str(ask_queue.queued)
+    return response
+
+@app.route('/api/ask/status', methods=['GET'])
+def ask_status():
+    """Queue depth in front of the LLM, and the knowledge base being served"""
+    status = {'queue': ask_queue.snapshot(), 'agent': {'loaded': _agent is not None}}
+    if _agent is not None:
+        kb = _agent.knowledge.current()
+        status['agent'].update({
+            'documents': kb.store.live_count(),
+            'indexType': kb.info['index_type'],
+            'indexVersion': kb.version,
+            'loadedAt': datetime.fromtimestamp(kb.loaded_at, timezone.utc).isoformat(),
+            'modelResidency': _agent.residency_stats()
+        })
+    return agent_json(status)
+
 @app.route('/api/files', methods=['GET'])
 def list_files():
     """List all uploaded files from database"""
@@ -561,7 +678,7 @@ def train_file(file_id):
             training.training_status = 'completed'
             file_record.status = 'trained'
             if 'metadata' in result:
-                file_record.metadata = json.dumps(result['metadata'])
+                file_record.file_metadata = json.dumps(result['metadata'])
         else:
             training.training_status = 'failed'
             training.error_message = result.get('error', 'Processing failed')
@@ -650,5 +767,7 @@ if __name__ == '__main__':
     
     # Start browser in a separate thread
     threading.Thread(target=open_browser, daemon=True).start()
+    # Load the RAG agent in the background; /api/ask waits for it if asked first
+    threading.Thread(target=preload_agent, daemon=True).start()
     
     app.run(debug=True, host='127.0.0.1', port=5000)
@@ -18,6 +18,17 @@ SUPABASE_DB_PORT = os.getenv('SUPABASE_DB_PORT', '5432')
 # Use Supabase if credentials are provided, otherwise use SQLite
 USE_SUPABASE = bool(SUPABASE_URL or (SUPABASE_DB_HOST and SUPABASE_DB_PASSWORD))
 
+# RAG agent behind /api/ask
+# Directory of the RAG-Agent code, and of what its ingest.py wrote (index.faiss, store/, ...)
+RAG_AGENT_DIR = os.getenv('RAG_AGENT_DIR', os.path.abspath(os.path.join(
+    os.path.dirname(__file__), '..', '..', 'RAG-Agent')))
+RAG_DATA_DIR = os.getenv('RAG_DATA_DIR', RAG_AGENT_DIR)
+# Questions answered by the LLM at once, questions allowed to wait for a
+# slot, and seconds one may wait before it is turned away with a 429
+ASK_SLOTS = int(os.getenv('ASK_SLOTS', '2'))
+ASK_QUEUE_SIZE = int(os.getenv('ASK_QUEUE_SIZE', '16'))
+ASK_QUEUE_TIMEOUT = float(os.getenv('ASK_QUEUE_TIMEOUT', '30'))
+
 def get_database_uri():
     """Get database URI based on configuration"""
     if USE_SUPABASE:
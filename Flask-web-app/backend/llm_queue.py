@@ -0,0 +1,110 @@
+"""
+Bounded queue in front of the LLM
+Lets a fixed number of requests generate at once, queues a limited number
+more in arrival order, and turns the rest away with a retry hint
+"""
+import math
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+
+class QueueFull(Exception):
+    """Raised when a request cannot get a slot; retry_after is in seconds"""
+
+    def __init__(self, retry_after, reason='queue full'):
+        super().__init__(reason)
+        self.retry_after = retry_after
+        self.reason = reason
+
+
+class LLMQueue:
+    """
+    Admission control for LLM requests, shared by all request threads.
+
+    - `slots` requests hold a slot at once; the model never sees more
+    - Up to `max_queued` more wait for a slot, first come first served
+    - A request arriving to a full queue, or waiting longer than
+      `max_wait` seconds, raises QueueFull
+    """
+
+    def __init__(self, slots=2, max_queued=16, max_wait=30.0):
+        self.slots = max(1, slots)
+        self.max_queued = max(0, max_queued)
+        self.max_wait = max_wait
+        self.in_flight = 0
+        self._waiting = deque()
+        self._cond = threading.Condition()
+        # Moving average of seconds a request holds its slot, for Retry-After
+        self.avg_seconds = None
+        self.stats = {'admitted': 0, 'rejected': 0, 'timedOut': 0, 'peakQueued': 0}
+
+    @property
+    def queued(self):
+        return len(self._waiting)
+
+    @contextmanager
+    def slot(self):
+        """Hold a slot for the duration of the block; yields the seconds waited"""
+        waited = self._acquire()
+        start = time.perf_counter()
+        try:
+            yield waited
+        finally:
+            self._release(time.perf_counter() - start)
+
+    def _acquire(self):
+        start = time.perf_counter()
+        with self._cond:
+            if self.in_flight < self.slots and not self._waiting:
+                self.in_flight += 1
+                self.stats['admitted'] += 1
+                return 0.0
+            if len(self._waiting) >= self.max_queued:
+                self.stats['rejected'] += 1
+                raise QueueFull(self.retry_after())
+
+            ticket = object()
+            self._waiting.append(ticket)
+            self.stats['peakQueued'] = max(self.stats['peakQueued'], len(self._waiting))
+            deadline = time.monotonic() + self.max_wait
+            while self._waiting[0] is not ticket or self.in_flight >= self.slots:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._waiting.remove(ticket)
+                    self.stats['timedOut'] += 1
+                    self._cond.notify_all()  # the next in line may be able to go now
+                    raise QueueFull(self.retry_after(), 'timed out waiting for a slot')
+                self._cond.wait(remaining)
+            self._waiting.popleft()
+            self.in_flight += 1
+            self.stats['admitted'] += 1
+            self._cond.notify_all()
+        return time.perf_counter() - start
+
+    def _release(self, seconds):
+        with self._cond:
+            self.in_flight -= 1
+            if self.avg_seconds is None:
+                self.avg_seconds = seconds
+            else:
+                self.avg_seconds = 0.8 * self.avg_seconds + 0.2 * seconds
+            self._cond.notify_all()
+
+    def retry_after(self):
+        """Seconds until a new request would likely get a slot"""
+        per_request = self.avg_seconds if self.avg_seconds is not None else 5.0
+        return max(1, math.ceil((len(self._waiting) + 1) * per_request / self.slots))
+
+    def snapshot(self):
+        with self._cond:
+            return {
+                'inFlight': self.in_flight,
+                'queued': len(self._waiting),
+                'slots': self.slots,
+                'maxQueued': self.max_queued,
+                'maxWaitSeconds': self.max_wait,
+                'avgServiceMs': round(self.avg_seconds * 1000, 1) if self.avg_seconds is not None else None,
+                **self.stats
+            }
@@ -16,7 +16,9 @@ class FileRecord(db.Model):
     file_path = db.Column(db.String(500), nullable=False)
     upload_date = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
     status = db.Column(db.String(50), default='uploaded')  # uploaded, processing, trained, error
-    metadata = db.Column(db.Text)  # JSON string for additional metadata
+    # JSON string for additional metadata; the attribute cannot be called
+    # metadata, which SQLAlchemy reserves, but the column still is
+    file_metadata = db.Column('metadata', db.Text)
     
     # Relationship to training history
     training_history = db.relationship('TrainingHistory', backref='file_record', lazy=True, cascade='all, delete-orphan')
@@ -32,7 +34,7 @@ class FileRecord(db.Model):
             'filePath': self.file_path,
             'uploadDate': self.upload_date.isoformat() if self.upload_date else None,
             'status': self.status,
-            'metadata': self.metadata,
+            'metadata': self.file_metadata,
             'trainingCount': len(self.training_history)
         }
 
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Backend modules import each other by name (config, models, llm_queue)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,104 @@
+import importlib
+from types import SimpleNamespace
+
+import pytest
+
+# The backend's requirements.txt, not needed by the other tests
+for module in ('flask', 'flask_cors', 'flask_sqlalchemy', 'dotenv'):
+    pytest.importorskip(module)
+
+from llm_queue import LLMQueue
+
+
+@pytest.fixture(scope='module')
+def app_module(tmp_path_factory):
+    """app.py imported against an in-memory database, with uploads/ in a temp dir"""
+    with pytest.MonkeyPatch.context() as mp:
+        mp.chdir(tmp_path_factory.mktemp('backend'))
+        mp.setattr('config.get_database_uri', lambda: 'sqlite://')
+        module = importlib.import_module('app')
+    module.app.config['TESTING'] = True
+    return module
+
+
+class FakeAgent:
+    """Stands in for agent1: records the questions it is asked"""
+    ANSWER_MODE = 'generate'
+
+    def __init__(self):
+        self.calls = []
+        self.knowledge = SimpleNamespace(current=lambda: SimpleNamespace(
+            store=SimpleNamespace(live_count=lambda: 13),
+            info={'index_type': 'IndexFlat'},
+            version='v1',
+            loaded_at=0.0
+        ))
+
+    def extractive_reason(self, mode):
+        return 'requested' if mode == 'extractive' else None
+
+    def ask_agent_structured(self, case_id, case_context, question, **kwargs):
+        self.calls.append((case_id, case_context, question, kwargs))
+        return {'case_id': case_id, 'answer': 'Flood is excluded.', 'relevance': 0.5}
+
+    def residency_stats(self):
+        return {}
+
+
+@pytest.fixture
+def agent(app_module, monkeypatch):
+    fake = FakeAgent()
+    monkeypatch.setattr(app_module, '_agent', fake)
+    monkeypatch.setattr(app_module, 'ask_queue', LLMQueue(slots=1, max_queued=0, max_wait=1))
+    return fake
+
+
+@pytest.fixture
+def client(app_module, agent):
+    return app_module.app.test_client()
+
+
+def test_ask_answers_through_the_agent(client, agent):
+    response = client.post('/api/ask', json={
+        'question': 'Is flood covered?', 'caseId': 'C1', 'caseContext': 'HO-3 policy',
+        'docTypes': ['policy'], 'mode': 'generate'
+    })
+    assert response.status_code == 200
+    body = response.get_json()
+    assert body['success'] and body['response']['answer'] == 'Flood is excluded.'
+    assert body['queue']['depth'] == 0
+    assert response.headers['X-Queue-Depth'] == '0'
+    assert agent.calls == [('C1', 'HO-3 policy', 'Is flood covered?',
+                            {'doc_types': ['policy'], 'doc_sources': None, 'mode': 'generate'})]
+
+
+@pytest.mark.parametrize('payload', [
+    {},
+    {'question': '   '},
+    {'question': 'Is flood covered?', 'mode': 'poetry'},
+    {'question': 'Is flood covered?', 'docTypes': 'policy'},
+    {'question': 'Is flood covered?', 'docSources': [1, 2]},
+])
+def test_ask_rejects_bad_requests(client, agent, payload):
+    response = client.post('/api/ask', json=payload)
+    assert response.status_code == 400
+    assert response.get_json()['success'] is False
+    assert agent.calls == []
+
+
+def test_ask_is_turned_away_with_retry_after_when_the_queue_is_full(client, agent, app_module):
+    with app_module.ask_queue.slot():
+        response = client.post('/api/ask', json={'question': 'Is flood covered?'})
+        # Extractive answers skip the queue
+        extractive = client.post('/api/ask', json={'question': 'Is flood covered?', 'mode': 'extractive'})
+    assert response.status_code == 429
+    assert int(response.headers['Retry-After']) >= 1
+    assert response.get_json()['queue']['rejected'] == 1
+    assert extractive.status_code == 200
+    assert len(agent.calls) == 1
+
+
+def test_status_reports_the_loaded_knowledge_base(client):
+    agent = client.get('/api/ask/status').get_json()['agent']
+    assert agent['loaded'] and agent['documents'] == 13
+    assert agent['loadedAt'] == '1970-01-01T00:00:00+00:00'
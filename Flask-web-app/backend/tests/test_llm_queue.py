@@ -0,0 +1,114 @@
+import threading
+import time
+
+import pytest
+
+from llm_queue import LLMQueue, QueueFull
+
+
+def hold(queue, started, release, results, name):
+    """Take a slot, signal `started`, keep it until `release` is set"""
+    try:
+        with queue.slot() as waited:
+            results[name] = waited
+            started.set()
+            release.wait(5)
+    except QueueFull as e:
+        results[name] = e
+        started.set()
+
+
+def start(queue, release, results, name):
+    started = threading.Event()
+    thread = threading.Thread(target=hold, args=(queue, started, release, results, name))
+    thread.start()
+    return thread, started
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, 'condition not reached'
+        time.sleep(0.005)
+
+
+def test_free_slot_is_taken_without_waiting():
+    queue = LLMQueue(slots=2, max_queued=1)
+    with queue.slot() as waited:
+        assert waited == 0.0
+        assert queue.snapshot()['inFlight'] == 1
+    snapshot = queue.snapshot()
+    assert snapshot['inFlight'] == 0 and snapshot['admitted'] == 1
+    assert snapshot['avgServiceMs'] is not None
+
+
+def test_full_queue_rejects_with_retry_after():
+    queue = LLMQueue(slots=1, max_queued=1, max_wait=5)
+    release, results = threading.Event(), {}
+    holder, started = start(queue, release, results, 'holder')
+    started.wait(5)
+    waiter, _ = start(queue, release, results, 'waiter')
+    wait_for(lambda: queue.queued == 1)
+
+    with pytest.raises(QueueFull) as rejected:
+        with queue.slot():
+            pass
+    assert rejected.value.reason == 'queue full'
+    assert rejected.value.retry_after >= 1
+    assert queue.snapshot()['rejected'] == 1
+
+    release.set()
+    holder.join()
+    waiter.join()
+    assert results['waiter'] > 0
+    assert queue.snapshot()['admitted'] == 2
+
+
+def test_waiters_are_admitted_in_arrival_order():
+    queue = LLMQueue(slots=1, max_queued=5, max_wait=5)
+    release, results = threading.Event(), {}
+    holder, started = start(queue, release, results, 'holder')
+    started.wait(5)
+
+    order = []
+    def waiter(n):
+        with queue.slot():
+            order.append(n)
+
+    threads = []
+    for n in range(4):
+        threads.append(threading.Thread(target=waiter, args=(n,)))
+        threads[-1].start()
+        wait_for(lambda: queue.queued == n + 1)
+    assert queue.snapshot()['peakQueued'] == 4
+
+    release.set()
+    for thread in [holder] + threads:
+        thread.join()
+    assert order == [0, 1, 2, 3]
+
+
+def test_waiting_too_long_times_out():
+    queue = LLMQueue(slots=1, max_queued=5, max_wait=0.05)
+    release, results = threading.Event(), {}
+    holder, started = start(queue, release, results, 'holder')
+    started.wait(5)
+
+    with pytest.raises(QueueFull) as timed_out:
+        with queue.slot():
+            pass
+    assert timed_out.value.reason == 'timed out waiting for a slot'
+    assert queue.queued == 0 and queue.snapshot()['timedOut'] == 1
+
+    release.set()
+    holder.join()
+    with queue.slot():
+        pass  # the slot is free again
+
+
+def test_retry_after_grows_with_the_queue():
+    queue = LLMQueue(slots=2, max_queued=10)
+    queue.avg_seconds = 4.0
+    assert queue.retry_after() == 2
+    queue._waiting.extend(object() for _ in range(3))
+    assert queue.retry_after() == 8
@@ -1,20 +1,19 @@
 # agent.py
-import faiss
 import numpy as np
 import requests
-import pickle
+import os
+import sys
 
-INDEX_PATH = "index.faiss"
-META_PATH = "metadata.pkl"
-
-# -------- LOAD INDEX & METADATA --------
-index = faiss.read_index(INDEX_PATH)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils.store import STORE_DIR
+from utils.knowledge_base import KnowledgeBase
 
-with open(META_PATH, "rb") as f:
-    store = pickle.load(f)
+INDEX_PATH = "index.faiss"
+STORE_PATH = STORE_DIR
 
-texts = store["texts"]
-metadata = store["metadata"]
+# -------- INDEX & METADATA --------
+# Loaded on the first question and reloaded after each ingest run
+knowledge = KnowledgeBase(INDEX_PATH, STORE_PATH, hybrid=False)
 
 # -------- OLLAMA EMBEDDING FUNCTION --------
 def get_embedding(text):
@@ -29,14 +28,17 @@ def get_embedding(text):
 
 # -------- RETRIEVE RELEVANT CONTEXT --------
 def retrieve_context(query, top_k=3):
+    kb = knowledge.current()
     query_embedding = get_embedding(query).reshape(1, -1)
-    _, indices = index.search(query_embedding, top_k)
+    _, indices = kb.index.search(query_embedding, top_k)
 
     results = []
     for i in indices[0]:
+        if not kb.store.is_live(i):
+            continue
         results.append({
-            "text": texts[i],
-            "metadata": metadata[i]
+            "text": kb.store.text(i),
+            "metadata": kb.store.metadata(i)
         })
     return results
 
@@ -3,17 +3,120 @@ AI KNOWLEDGE AGENT WITH STRUCTURED DICTIONARY OUTPUT
 Retrieves context from FAISS index and generates structured responses
 """
 
-import faiss
+import asyncio
 import numpy as np
 import requests
-import pickle
+from requests.adapters import HTTPAdapter
 import json
-from typing import Dict, List, Any
-from dataclasses import dataclass, asdict
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Any, Iterator, Optional
+from dataclasses import dataclass, asdict, fields
 from datetime import datetime
 
-INDEX_PATH = "index.faiss"
-META_PATH = "metadata.pkl"
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils.embeddings import EmbeddingClient
+from utils.embedding_cache import EmbeddingCache, CACHE_PATH
+from utils.ollama_async import AsyncOllamaClient
+from utils.model_residency import ModelResidency
+from utils.context_packing import pack_context
+from utils.json_stream import IncrementalJSON, repair_json
+from utils.extractive import extract_sentences, highlight
+from utils.answer_cache import AnswerCache, ANSWER_CACHE_PATH
+from utils.knowledge_base import KnowledgeBase, Snapshot, MANIFEST_PATH
+from utils.store import STORE_DIR
+from utils.lexical import LEXICAL_DIR, looks_like_code
+from utils.vector_index import INDEX_INFO_PATH, search_params, search_settings
+
+# Directory holding what ingest.py wrote (index, store/, lexical/, manifest)
+# and the caches; unset = the working directory, as for the CLI
+DATA_DIR = os.getenv("RAG_DATA_DIR", "")
+INDEX_PATH = os.path.join(DATA_DIR, "index.faiss")
+STORE_PATH = os.path.join(DATA_DIR, STORE_DIR)
+LEXICAL_PATH = os.path.join(DATA_DIR, LEXICAL_DIR)
+
+# Search-time knobs for approximate indexes (ignored by index types they don't apply to)
+NPROBE = int(os.getenv("RAG_NPROBE", "16"))         # IVF: inverted lists scanned per query
+EF_SEARCH = int(os.getenv("RAG_EF_SEARCH", "64"))   # HNSW: candidate list size
+
+# Two-stage retrieval: a wide candidate set from the index, re-scored by exact
+# cosine similarity against the full-precision vectors in store/. "auto" =
+# for approximate indexes (compressed codes, IVF, HNSW). RAG_CANDIDATES sets
+# the candidate set size outright; 0 = RESCORE_FACTOR candidates per result
+RESCORE = os.getenv("RAG_RESCORE", "auto")              # auto | on | off
+RESCORE_FACTOR = int(os.getenv("RAG_RESCORE_FACTOR", "4"))  # candidates per result
+CANDIDATES = int(os.getenv("RAG_CANDIDATES", "0"))
+
+# Memory-map index.faiss, and seconds between checks for a newly ingested
+# version to swap in (0 = load once and never reload)
+INDEX_MMAP = os.getenv("RAG_INDEX_MMAP", "1") == "1"
+RELOAD_INTERVAL = float(os.getenv("RAG_RELOAD_INTERVAL", "5"))
+
+# In-process LRU of query embeddings, in front of the on-disk embedding cache
+QUERY_CACHE_SIZE = int(os.getenv("RAG_QUERY_CACHE_SIZE", "1024"))
+# Embed case context and question separately and combine the vectors, so the
+# case context is embedded once per case instead of once per question
+SPLIT_CONTEXT = os.getenv("RAG_SPLIT_CONTEXT", "0") == "1"
+CONTEXT_WEIGHT = float(os.getenv("RAG_CONTEXT_WEIGHT", "0.5"))  # share of the case context vector
+
+# Hybrid retrieval: BM25 scores from lexical/ fused with vector similarity.
+# When the embedder fails or times out, retrieval is lexical-only for
+# EMBED_COOLDOWN seconds instead of waiting on the model for every query
+HYBRID = os.getenv("RAG_HYBRID", "1") == "1"
+LEXICAL_WEIGHT = float(os.getenv("RAG_LEXICAL_WEIGHT", "0.3"))  # share of the BM25 score
+EMBED_TIMEOUT = float(os.getenv("RAG_EMBED_TIMEOUT", "5"))      # seconds per embedding call
+EMBED_COOLDOWN = float(os.getenv("RAG_EMBED_COOLDOWN", "30"))   # seconds to skip the embedder
+
+# Filtered searches (doc_types / doc_sources) scan the selected chunks'
+# full-precision vectors directly when the index is exact anyway (Flat) or
+# the selection is at most this many bytes of vectors (about 2700 chunks at
+# 3072 dimensions); larger selections go through the index with a bitmap
+# ID selector rather than copying the vectors out of the store per query
+FILTER_EXACT_BYTES = int(os.getenv("RAG_FILTER_EXACT_BYTES", str(32 * 1024 * 1024)))
+
+# Generation. Responses are streamed, so the read timeout is the longest
+# allowed pause between tokens rather than a cap on the whole answer
+GENERATE_URL = "http://localhost:11434/api/generate"
+GENERATE_MODEL = "llama3.2"
+CONNECT_TIMEOUT = 10
+GENERATE_READ_TIMEOUT = float(os.getenv("RAG_GENERATE_TIMEOUT", "60"))
+# Print answers in the CLI as they are generated
+STREAM_OUTPUT = os.getenv("RAG_STREAM", "1") == "1"
+# Requests the async core sends to Ollama at once (per event loop)
+MAX_IN_FLIGHT = int(os.getenv("RAG_MAX_IN_FLIGHT", "8"))
+# How long Ollama keeps the model loaded after a request ("30m", "2h",
+# "-1" = always), and whether agents load it at startup instead of on the
+# first question. Loads that take COLD_LOAD_MS or longer count as cold loads
+KEEP_ALIVE = os.getenv("RAG_KEEP_ALIVE", "30m")
+WARM_UP = os.getenv("RAG_WARM_UP", "1") == "1"
+COLD_LOAD_MS = float(os.getenv("RAG_COLD_LOAD_MS", "500"))
+# Constrain generation to the response schema with Ollama's format option
+STRUCTURED_OUTPUT = os.getenv("RAG_STRUCTURED_OUTPUT", "1") == "1"
+
+# Answer mode: "generate" (the LLM writes the answer) or "extractive" (the
+# best-matching source sentences, no LLM). Extractive answers are also given
+# when generation fails, and for GENERATE_COOLDOWN seconds after
+ANSWER_MODE = os.getenv("RAG_ANSWER_MODE", "generate")
+EXTRACTIVE_SENTENCES = int(os.getenv("RAG_EXTRACTIVE_SENTENCES", "3"))
+GENERATE_COOLDOWN = float(os.getenv("RAG_GENERATE_COOLDOWN", "30"))
+
+# Token budget for source text in the prompt, and the word 3-gram overlap
+# above which a passage counts as a repeat of one already included
+CONTEXT_TOKENS = int(os.getenv("RAG_CONTEXT_TOKENS", "1500"))
+DEDUP_THRESHOLD = float(os.getenv("RAG_DEDUP_THRESHOLD", "0.8"))
+
+# Finished answers are reused for a repeated case (same text after
+# normalizing case and whitespace) until the TTL runs out or the index
+# changes. Setting RAG_ANSWER_SIMILARITY (e.g. 0.97) also reuses them for
+# near-identical cases (query vectors at or above it); off by default, as
+# similar wording can still ask about different facts
+ANSWER_CACHE = os.getenv("RAG_ANSWER_CACHE", "1") == "1"
+ANSWER_CACHE_SIZE = int(os.getenv("RAG_ANSWER_CACHE_SIZE", "5000"))
+ANSWER_CACHE_TTL = float(os.getenv("RAG_ANSWER_CACHE_TTL", str(24 * 3600)))  # seconds
+ANSWER_SIMILARITY = float(os.getenv("RAG_ANSWER_SIMILARITY") or 0) or None
 
 # ============================================================================
 # STRUCTURED DATA CLASSES
@@ -66,14 +169,31 @@ class AgentResponse:
         
         output.append(f"\n🎯 CONFIDENCE: {self.confidence.upper()}")
         
-        if self.citations:
-            output.append(f"\n📚 CITATIONS ({len(self.citations)}):")
-            for idx, citation in enumerate(self.citations, 1):
+        cache = self.metadata.get("answer_cache") or {}
+        if cache.get("hit"):
+            match = "exact repeat" if cache["hit"] == "exact" else f"{cache['similarity']:.1%} similar"
+            output.append(f"♻️  CACHED ANSWER ({match} of case {cache['cached_case_id']}, "
+                          f"{cache['age_s']:.0f}s old)")
+        
+        output.extend(self.citation_lines(self.citations))
+        output.extend(self.assessment_lines())
+        return "\n".join(output)
+
+    @staticmethod
+    def citation_lines(citations: List[Dict]) -> List[str]:
+        output = []
+        if citations:
+            output.append(f"\n📚 CITATIONS ({len(citations)}):")
+            for idx, citation in enumerate(citations, 1):
                 output.append(f"   [{idx}] {citation.get('document_name', 'Unknown')}")
                 output.append(f"       Section: {citation.get('section_id', 'N/A')} | "
                             f"Page: {citation.get('page_number', 'N/A')} | "
                             f"Relevance: {citation.get('relevance_score', 0):.1%}")
-        
+        return output
+
+    def assessment_lines(self) -> List[str]:
+        """Risk factors, recommendations and review status."""
+        output = []
         if self.risk_factors:
             output.append(f"\n⚠️  RISK FACTORS:")
             for risk in self.risk_factors:
@@ -88,118 +208,577 @@ class AgentResponse:
             output.append(f"\n🚨 STATUS: REQUIRES MANUAL REVIEW")
         
         output.append("\n" + "="*80)
-        return "\n".join(output)
+        return output
+
+
 
+# Fields the model writes; the rest of AgentResponse is filled in here
+GENERATED_FIELDS = ("answer", "confidence", "risk_factors", "recommendations", "requires_manual_review")
+CONFIDENCE_LEVELS = ("high", "medium", "low")
+JSON_TYPES = {
+    str: {"type": "string"},
+    bool: {"type": "boolean"},
+    List[str]: {"type": "array", "items": {"type": "string"}},
+}
+
+
+def response_schema() -> Dict[str, Any]:
+    """JSON schema of the generated AgentResponse fields, for Ollama's format option."""
+    types = {f.name: f.type for f in fields(AgentResponse)}
+    properties = {name: dict(JSON_TYPES[types[name]]) for name in GENERATED_FIELDS}
+    properties["confidence"]["enum"] = list(CONFIDENCE_LEVELS)
+    return {"type": "object", "properties": properties, "required": list(GENERATED_FIELDS)}
+
+
+RESPONSE_SCHEMA = response_schema()
 
 # ============================================================================
-# LOAD INDEX & METADATA
+# KNOWLEDGE BASE
 # ============================================================================
 
-print("🔄 Loading FAISS index and metadata...")
-try:
-    index = faiss.read_index(INDEX_PATH)
-    with open(META_PATH, "rb") as f:
-        store = pickle.load(f)
-    
-    texts = store["texts"]
-    metadata = store["metadata"]
-    print(f"✅ Loaded {len(texts)} documents")
-except Exception as e:
-    print(f"❌ Error loading index: {e}")
-    print("   Make sure index.faiss and metadata.pkl exist")
-    exit(1)
+def report_loaded(kb: Snapshot, previous: Optional[Snapshot]):
+    """Print what was loaded; runs on the first load and again on every reload."""
+    rescoring = ""
+    if kb.info["rescore"]:
+        rescoring = f" + exact re-scoring of {CANDIDATES or f'{RESCORE_FACTOR}x top_k'} candidates"
+    print(f"✅ {'Reloaded' if previous is not None else 'Loaded'} {kb.store.live_count()} documents")
+    print(f"   Index: {kb.info['factory']} ({kb.info['index_type']}, {kb.index.ntotal} vectors) "
+          f"{search_settings(kb.index, NPROBE, EF_SEARCH)}{rescoring}"
+          f"{f' + BM25 ({len(kb.lexical)} terms)' if kb.lexical is not None else ''}")
+
+
+# Loaded on first use, not at import; every query answers from the snapshot
+# that was current when it started, even if a newer ingest is swapped in
+knowledge = KnowledgeBase(INDEX_PATH, STORE_PATH, LEXICAL_PATH,
+                          manifest_path=os.path.join(DATA_DIR, MANIFEST_PATH),
+                          info_path=os.path.join(DATA_DIR, INDEX_INFO_PATH),
+                          hybrid=HYBRID, rescore=RESCORE, mmap=INDEX_MMAP,
+                          watch_interval=RELOAD_INTERVAL, on_load=report_loaded)
+
+
+def load_knowledge():
+    """Load the knowledge base up front, exiting with a hint when there is none."""
+    print("🔄 Loading FAISS index and metadata...")
+    try:
+        knowledge.current()
+    except Exception as e:
+        print(f"❌ Error loading index: {e}")
+        print("   Make sure index.faiss and the store/ directory exist")
+        sys.exit(1)
 
 
 # ============================================================================
 # OLLAMA FUNCTIONS
 # ============================================================================
 
-def get_embedding(text: str) -> np.ndarray:
-    """Get embedding from Ollama."""
+# Same endpoint, model and on-disk cache as ingestion, so repeated queries
+# (and texts already embedded by ingest.py) never reach the model. No
+# retries: a failed call falls back to lexical search at once, and
+# embedder_down_until decides when to try the model again
+embedder = EmbeddingClient(max_retries=0, timeout=EMBED_TIMEOUT, cache=EmbeddingCache(os.path.join(DATA_DIR, CACHE_PATH)))
+embedder_down_until = 0.0
+generator_down_until = 0.0
+
+# Sync generation shares one keep-alive session, like the embedder does
+http = requests.Session()
+http.mount("http://", HTTPAdapter(pool_connections=1, pool_maxsize=MAX_IN_FLIGHT))
+
+# Keep-alive policy and cold-load counts for the generation model, shared
+# by the sync and async paths
+residency = ModelResidency(GENERATE_MODEL, keep_alive=KEEP_ALIVE, cold_load_ms=COLD_LOAD_MS,
+                           session=http)
+
+# Async core: pooled connections and a cap on requests in flight toward
+# Ollama, shared by every case being answered
+ollama = AsyncOllamaClient(max_in_flight=MAX_IN_FLIGHT,
+                           embed_timeout=EMBED_TIMEOUT,
+                           generate_timeout=GENERATE_READ_TIMEOUT,
+                           connect_timeout=CONNECT_TIMEOUT,
+                           cache=embedder.cache,
+                           residency=residency)
+
+
+def warm_up_model():
+    """Load the generation model now, so the first question doesn't wait for it."""
+    if not WARM_UP:
+        return
+    print(f"🔥 Warming up {GENERATE_MODEL} (keep_alive {KEEP_ALIVE})...")
     try:
-        response = requests.post(
-            "http://localhost:11434/api/embeddings",
-            json={
-                "model": "llama3.2",
-                "prompt": text
-            },
-            timeout=30
-        )
-        response.raise_for_status()
-        return np.array(response.json()["embedding"], dtype="float32")
+        result = residency.warm_up(timeout=GENERATE_READ_TIMEOUT)
     except Exception as e:
-        print(f"⚠️  Embedding error: {e}")
-        return np.zeros(4096, dtype="float32")  # Fallback
+        print(f"⚠️  Warm-up failed: {e}")
+        return
+    if result["cold_load"]:
+        print(f"✅ Model loaded in {result['load_ms']:.0f} ms")
+    else:
+        print("✅ Model already loaded")
+
+
+def residency_stats() -> Dict[str, Any]:
+    """Generations so far and how many of them waited for a cold model load."""
+    return residency.snapshot()
 
 
-def call_ollama(prompt: str, extract_json: bool = True) -> str:
-    """Call Ollama for text generation."""
+class QueryCache:
+    """Thread-safe LRU of query embeddings, in front of the on-disk embedding cache."""
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = self.misses = 0
+
+    def get(self, text: str) -> Optional[np.ndarray]:
+        with self.lock:
+            vector = self.entries.get(text)
+            if vector is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(text)
+            self.hits += 1
+            return vector
+
+    def put(self, text: str, vector: np.ndarray):
+        vector.setflags(write=False)  # shared between callers
+        with self.lock:
+            self.entries[text] = vector
+            self.entries.move_to_end(text)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+
+    def stats(self) -> Dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses, "size": len(self.entries)}
+
+
+query_cache = QueryCache(QUERY_CACHE_SIZE)
+answer_cache = AnswerCache(os.path.join(DATA_DIR, ANSWER_CACHE_PATH),
+                           max_entries=ANSWER_CACHE_SIZE, ttl=ANSWER_CACHE_TTL,
+                           similarity=ANSWER_SIMILARITY) if ANSWER_CACHE else None
+
+
+def embedder_failed(e: Exception):
+    """Log an embedding failure; with a lexical index, stop calling the model for a while."""
+    global embedder_down_until
+    print(f"⚠️  Embedding error: {e}")
+    if knowledge.current().lexical is not None:
+        embedder_down_until = time.time() + EMBED_COOLDOWN
+
+
+def get_embedding(text: str) -> Optional[np.ndarray]:
+    """
+    Get embedding from Ollama (or the in-process LRU / on-disk cache).
+    None when the embedder is failing; retrieval then goes lexical-only.
+    """
+    if time.time() < embedder_down_until:
+        return None
+    vector = query_cache.get(text)
+    if vector is not None:
+        return vector
     try:
-        response = requests.post(
-            "http://localhost:11434/api/generate",
-            json={
-                "model": "llama3.2",
-                "prompt": prompt,
-                "stream": False
-            },
-            timeout=60
-        )
-        response.raise_for_status()
-        result = response.json()["response"].strip()
-        
-        if extract_json:
-            # Try to extract JSON from response
-            try:
-                if "```json" in result:
-                    result = result.split("```json")[1].split("```")[0].strip()
-                elif "```" in result:
-                    result = result.split("```")[1].split("```")[0].strip()
-                return result
-            except:
-                return result
-        
-        return result
+        vector = embedder.embed(text)
     except Exception as e:
-        print(f"⚠️  Ollama error: {e}")
-        return json.dumps({
-            "answer": f"Error: {str(e)}",
-            "confidence": "low",
-            "risk_factors": ["System error occurred"],
-            "recommendations": ["Retry request or contact support"]
-        })
+        embedder_failed(e)
+        return None
+    query_cache.put(text, vector)
+    return vector
+
+
+async def get_embedding_async(text: str) -> Optional[np.ndarray]:
+    """get_embedding on the shared async client."""
+    if time.time() < embedder_down_until:
+        return None
+    vector = query_cache.get(text)
+    if vector is not None:
+        return vector
+    try:
+        vector = await ollama.embed(text)
+    except Exception as e:
+        embedder_failed(e)
+        return None
+    query_cache.put(text, vector)
+    return vector
+
+
+def get_embeddings(texts: List[str]) -> Optional[np.ndarray]:
+    """Embed many queries in batched /api/embed calls (None when the embedder is failing)."""
+    if len(texts) == 1:
+        vector = get_embedding(texts[0])
+        return None if vector is None else vector.reshape(1, -1)
+    if time.time() < embedder_down_until:
+        return None
+    try:
+        return embedder.embed_many(texts)
+    except Exception as e:
+        embedder_failed(e)
+        return None
+
+
+def query_cache_stats() -> Dict[str, int]:
+    """Hit/miss counters of the in-process query embedding LRU."""
+    return query_cache.stats()
+
+
+async def embed_case_query_async(case_context: str, user_question: str,
+                                 context_weight: float = CONTEXT_WEIGHT) -> Optional[np.ndarray]:
+    """
+    Embed case context and question separately and blend the two vectors.
+    The context vector comes from the LRU after the first question of a
+    case, so follow-ups cost one short embedding call.
+    """
+    context_vector, question_vector = await asyncio.gather(
+        get_embedding_async(case_context), get_embedding_async(user_question))
+    return blend_vectors(context_vector, question_vector, context_weight)
+
+
+def blend_vectors(context_vector: Optional[np.ndarray], question_vector: Optional[np.ndarray],
+                  context_weight: float) -> Optional[np.ndarray]:
+    if context_vector is None or question_vector is None:
+        return None
+    combined = context_weight * context_vector + (1 - context_weight) * question_vector
+    # Ollama's /api/embed vectors are unit length; keep the blend comparable
+    norm = np.linalg.norm(combined)
+    return combined / norm if norm else combined
+
+
+def extract_json_text(result: str) -> str:
+    """Strip a ```json fence the model may wrap its JSON in."""
+    try:
+        if "```json" in result:
+            result = result.split("```json")[1].split("```")[0].strip()
+        elif "```" in result:
+            result = result.split("```")[1].split("```")[0].strip()
+        return result
+    except:
+        return result
+
+
+def generator_failed(e: Exception):
+    """Log a generation failure and answer extractively for a while."""
+    global generator_down_until
+    print(f"⚠️  Ollama error: {e} (extractive answers for the next {GENERATE_COOLDOWN:.0f}s)")
+    generator_down_until = time.time() + GENERATE_COOLDOWN
+
+
+def extractive_reason(mode: str) -> Optional[str]:
+    """Why this answer is extractive ("requested" / "llm unavailable"), or None."""
+    if mode == "extractive":
+        return "requested"
+    if time.time() < generator_down_until:
+        return "llm unavailable"
+    return None
+
+
+def generation_schema() -> Optional[Dict]:
+    """The format to request for structured answers (None = free text)."""
+    return RESPONSE_SCHEMA if STRUCTURED_OUTPUT else None
+
+
+def parse_model_output(text: str) -> tuple:
+    """
+    (fields, how) for a structured answer. how is "json" when the output
+    parsed as is, "repaired" when the fields were recovered from malformed
+    or truncated output, and "failed" (fields None) when there was no
+    answer to recover.
+    """
+    try:
+        data = json.loads(text)
+        if isinstance(data, dict):
+            return conform_fields(data), "json"
+    except json.JSONDecodeError:
+        pass
+    data = repair_json(text)
+    if data and isinstance(data.get("answer"), str) and data["answer"].strip():
+        # Whatever went missing with the rest of the output, a human should look
+        return conform_fields(data, review_default=True), "repaired"
+    return None, "failed"
+
+
+def conform_fields(data: Dict, review_default: bool = False) -> Dict[str, Any]:
+    """Coerce parsed model output to the types of the generated AgentResponse fields."""
+    confidence = str(data.get("confidence", "medium")).lower()
+    review = data.get("requires_manual_review", review_default)
+    if isinstance(review, str):
+        review = review.lower() == "true"
+    conformed = {
+        "answer": str(data.get("answer", "No answer provided")),
+        "confidence": confidence if confidence in CONFIDENCE_LEVELS else "medium",
+        "requires_manual_review": bool(review),
+    }
+    for name in ("risk_factors", "recommendations"):
+        items = data.get(name, [])
+        conformed[name] = [str(i) for i in items] if isinstance(items, list) else [str(items)]
+    return conformed
+
+
+def stream_ollama(prompt: str, timings: Dict = None, schema: Dict = None) -> Iterator[str]:
+    """
+    Stream generated text from Ollama as it is produced. The read timeout
+    applies between chunks, so a long answer never times out while tokens
+    keep arriving. `timings` receives ttft_ms (time to first token),
+    total_ms, tokens, load_ms and cold_load. A JSON `schema` constrains
+    the output to match it.
+    """
+    start = time.perf_counter()
+    body = {"model": GENERATE_MODEL, "prompt": prompt, "stream": True, **residency.options()}
+    if schema is not None:
+        body["format"] = schema
+    with http.post(
+        GENERATE_URL,
+        json=body,
+        stream=True,
+        timeout=(CONNECT_TIMEOUT, GENERATE_READ_TIMEOUT)
+    ) as response:
+        response.raise_for_status()
+        for line in response.iter_lines():
+            if not line:
+                continue
+            chunk = json.loads(line)
+            if "error" in chunk:
+                raise RuntimeError(chunk["error"])
+            token = chunk.get("response", "")
+            if token:
+                if timings is not None and "ttft_ms" not in timings:
+                    timings["ttft_ms"] = round((time.perf_counter() - start) * 1000, 1)
+                yield token
+            # No break after "done": reading to the end of the body returns
+            # the connection to the session's pool
+            if chunk.get("done"):
+                if timings is not None:
+                    timings["tokens"] = chunk.get("eval_count")
+                residency.record(chunk, timings)
+    if timings is not None:
+        timings["total_ms"] = round((time.perf_counter() - start) * 1000, 1)
 
 
 # ============================================================================
 # RETRIEVAL FUNCTION
 # ============================================================================
 
-def retrieve_context(query: str, top_k: int = 3) -> List[Dict]:
-    """Retrieve relevant context from FAISS index."""
-    query_embedding = get_embedding(query).reshape(1, -1)
-    distances, indices = index.search(query_embedding, top_k)
+def cosine_similarity(query_embeddings: np.ndarray, vectors: np.ndarray) -> np.ndarray:
+    """N x M cosine similarities between N queries and M vectors."""
+    q = query_embeddings / np.maximum(np.linalg.norm(query_embeddings, axis=1, keepdims=True), 1e-12)
+    v = vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+    return q @ v.T
+
+
+def rescore_exact(kb: Snapshot, query_vector: np.ndarray, candidate_ids: np.ndarray, top_k: int):
+    """Re-rank candidates by exact cosine similarity to their full-precision vectors."""
+    ids = np.array([i for i in candidate_ids if kb.store.is_live(i)], dtype="int64")
+    if not len(ids):
+        return np.zeros(0, dtype="float32"), ids
+    similarities = cosine_similarity(query_vector.reshape(1, -1), kb.store.vectors(ids))[0]
+    order = np.argsort(-similarities, kind="stable")[:top_k]
+    return similarities[order], ids[order]
+
+
+def search_subset(kb: Snapshot, query_embeddings: np.ndarray, ids: np.ndarray,
+                  top_k: int) -> List[tuple]:
+    """Exact cosine search over a few chunks, reading only their vectors from the store."""
+    similarities = cosine_similarity(query_embeddings, kb.store.vectors(ids))
+    hits = []
+    for row in similarities:
+        order = np.argsort(-row, kind="stable")[:top_k]
+        hits.append((row[order], ids[order]))
+    return hits
+
+
+def search_vectors(kb: Snapshot, query_embeddings: np.ndarray, top_k: int, nprobe: int = None,
+                   ef_search: int = None, mask: np.ndarray = None,
+                   candidates: int = None) -> List[tuple]:
+    """
+    Search an N x d matrix of query vectors in a single index.search call.
+    Returns one (similarities, ids) pair per query, most similar first.
+    `mask` (from store.select) restricts the search to the chunks it selects.
+
+    Two stages when the store keeps full-precision vectors: the index
+    proposes candidates (`candidates` per query, default RAG_CANDIDATES or
+    top_k * RAG_RESCORE_FACTOR, when re-scoring is on; otherwise top_k),
+    and they are ranked by exact cosine similarity. Scores therefore mean
+    the same whatever the index type.
+    """
+    if mask is not None and kb.store.has_vectors:
+        selected = np.flatnonzero(mask)
+        if not kb.info["approximate"] or len(selected) * kb.store.dimension * 4 <= FILTER_EXACT_BYTES:
+            # Cost follows the size of the selection, not of the whole index
+            return search_subset(kb, query_embeddings, selected, top_k)
+    params = search_params(kb.index,
+                           nprobe=NPROBE if nprobe is None else nprobe,
+                           ef_search=EF_SEARCH if ef_search is None else ef_search,
+                           mask=mask)
+    if not kb.store.has_vectors:
+        distances, ids = kb.index.search(query_embeddings, top_k, params=params)
+        # Embeddings are unit length, so cosine similarity is 1 - L2^2 / 2
+        return [(1 - row / 2, row_ids) for row, row_ids in zip(distances, ids)]
+    
+    width = top_k
+    if kb.info["rescore"]:
+        if candidates is None:
+            candidates = CANDIDATES or top_k * RESCORE_FACTOR
+        width = max(top_k, candidates)
+    _, candidate_ids = kb.index.search(query_embeddings, width, params=params)
+    return [rescore_exact(kb, query_vector, row, top_k)
+            for query_vector, row in zip(query_embeddings, candidate_ids)]
+
+
+def build_results(kb: Snapshot, vector_hits: Optional[tuple], lexical_hits: Optional[tuple],
+                  top_k: int) -> List[Dict]:
+    """
+    Turn one query's search hits into result dicts. Vector similarity and
+    BM25 score (as a share of the query's maximum, see
+    LexicalIndex.max_score) are blended with LEXICAL_WEIGHT; either side
+    may be missing.
+    """
+    vector_scores, lexical_scores = {}, {}
+    if vector_hits is not None:
+        for similarity, i in zip(*vector_hits):
+            # FAISS pads missing hits with -1; removed chunks are flagged in the store
+            if kb.store.is_live(i):
+                vector_scores[int(i)] = max(0.0, float(similarity))
+    if lexical_hits is not None:
+        for score, i in zip(*lexical_hits):
+            if kb.store.is_live(i):
+                lexical_scores[int(i)] = float(score)
+
+    if vector_hits is None:
+        weight, retrieval = 1.0, "lexical"
+    elif lexical_hits is None:
+        weight, retrieval = 0.0, "vector"
+    else:
+        weight, retrieval = LEXICAL_WEIGHT, "hybrid"
+    scores = {
+        i: (1 - weight) * vector_scores.get(i, 0.0) + weight * lexical_scores.get(i, 0.0)
+        for i in set(vector_scores) | set(lexical_scores)
+    }
+    ranked = sorted(scores, key=scores.get, reverse=True)[:top_k]
     
     results = []
-    for i, dist in zip(indices[0], distances[0]):
-        if i < len(texts):
-            # Calculate similarity score (convert L2 distance to similarity)
-            similarity = 1 / (1 + float(dist))
-            
-            results.append({
-                "text": texts[i],
-                "metadata": metadata[i],
-                "relevance_score": similarity
-            })
+    for i in ranked:
+        results.append({
+            "text": kb.store.text(i),
+            "metadata": kb.store.metadata(i),
+            "relevance_score": scores[i],
+            "retrieval": retrieval
+        })
     
     return results
 
 
+def retrieve_many(queries: List[str], top_k: int = 3, nprobe: int = None, ef_search: int = None,
+                  query_embeddings: np.ndarray = None, doc_types: List[str] = None,
+                  doc_sources: List[str] = None, kb: Snapshot = None,
+                  candidates: int = None) -> List[List[Dict]]:
+    """
+    Retrieve context for many queries at once: one batched embedding call
+    and one index.search over the N x d query matrix. Returns a result
+    list per query, in order. Use this for bulk jobs instead of calling
+    retrieve_context in a loop.
+
+    With a lexical index, BM25 hits are fused in; policy-number and
+    form-code queries skip the embedder, and every query falls back to
+    BM25 alone while the embedder is down. Both retrievers then return
+    as many hits as re-scoring considers, so a chunk ranked lower by one
+    but high by the other still makes the fused top_k.
+
+    doc_types (policy / sop / regulation) and doc_sources (PDF file names)
+    restrict results to matching chunks; the filter is applied inside the
+    search, so top_k results come back whenever that many chunks match.
+
+    `kb` pins the knowledge base snapshot to search (default: the current one);
+    `candidates` overrides the size of the candidate set that is re-scored.
+    """
+    if not len(queries):
+        return []
+    if kb is None:
+        kb = knowledge.current()
+    mask = None
+    if doc_types or doc_sources:
+        mask = kb.store.select(doc_types, doc_sources)
+        if not mask.any():
+            return [[] for _ in queries]
+    vectors = [None] * len(queries)
+    if query_embeddings is not None:
+        # One vector per query; None rows are answered from BM25 alone
+        vectors = [None if v is None else np.asarray(v, dtype="float32").reshape(-1)
+                   for v in query_embeddings]
+    else:
+        to_embed = [n for n, q in enumerate(queries)
+                    if kb.lexical is None or not looks_like_code(q)]
+        embedded = get_embeddings([queries[n] for n in to_embed]) if to_embed else None
+        if embedded is not None:
+            for n, vector in zip(to_embed, embedded):
+                vectors[n] = vector
+
+    width = top_k
+    if kb.lexical is not None:
+        width = max(top_k, candidates or CANDIDATES or top_k * RESCORE_FACTOR)
+
+    vector_hits = [None] * len(queries)
+    searched = [n for n, vector in enumerate(vectors) if vector is not None]
+    if searched:
+        matrix = np.ascontiguousarray(np.vstack([vectors[n] for n in searched]), dtype="float32")
+        hits = search_vectors(kb, matrix, width, nprobe=nprobe, ef_search=ef_search, mask=mask,
+                              candidates=candidates)
+        for n, (distances, ids) in zip(searched, hits):
+            vector_hits[n] = (distances, ids)
+
+    results = []
+    for n, query in enumerate(queries):
+        lexical_hits = None
+        if kb.lexical is not None:
+            scores, ids = kb.lexical.search(query, width, mask)
+            lexical_hits = (scores / (kb.lexical.max_score(query) or 1.0), ids)
+        if vector_hits[n] is None and lexical_hits is None:
+            results.append([])  # embedder down and no lexical index
+        else:
+            results.append(build_results(kb, vector_hits[n], lexical_hits, top_k))
+    return results
+
+
+def retrieve_context(query: str, top_k: int = 3, nprobe: int = None, ef_search: int = None,
+                     query_embedding: np.ndarray = None, doc_types: List[str] = None,
+                     doc_sources: List[str] = None, kb: Snapshot = None,
+                     candidates: int = None) -> List[Dict]:
+    """
+    Retrieve relevant context from FAISS index.
+    nprobe / ef_search override NPROBE / EF_SEARCH for this query only.
+    A precomputed query_embedding skips embedding `query`.
+    doc_types / doc_sources restrict the search (see retrieve_many).
+    """
+    return retrieve_many([query], top_k=top_k, nprobe=nprobe, ef_search=ef_search,
+                         query_embeddings=None if query_embedding is None else [query_embedding],
+                         doc_types=doc_types, doc_sources=doc_sources, kb=kb,
+                         candidates=candidates)[0]
+
+
+async def retrieve_context_async(query: str, top_k: int = 3, query_embedding: np.ndarray = None,
+                                 kb: Snapshot = None, **kwargs) -> List[Dict]:
+    """
+    retrieve_context with the query embedded on the async client. The
+    search itself runs in a worker thread (FAISS releases the GIL), so
+    the event loop keeps serving other cases meanwhile.
+    """
+    if kb is None:
+        kb = knowledge.current()
+    if query_embedding is None and (kb.lexical is None or not looks_like_code(query)):
+        query_embedding = await get_embedding_async(query)
+    results = await asyncio.to_thread(retrieve_many, [query], top_k,
+                                      query_embeddings=[query_embedding], kb=kb, **kwargs)
+    return results[0]
+
+
+
 # ============================================================================
 # STRUCTURED AGENT FUNCTION
 # ============================================================================
 
-def ask_agent_structured(case_id: str, case_context: str, user_question: str) -> Dict[str, Any]:
+def ask_agent_structured(case_id: str, case_context: str, user_question: str,
+                         split_context: bool = None, doc_types: List[str] = None,
+                         doc_sources: List[str] = None, mode: str = None) -> Dict[str, Any]:
     """
     Main agent function that returns structured dictionary output.
+    split_context overrides RAG_SPLIT_CONTEXT for this call; doc_types /
+    doc_sources limit the documents the answer may draw on; mode
+    ("generate" / "extractive") overrides RAG_ANSWER_MODE.
     
     Returns:
         Dictionary with keys:
@@ -214,13 +793,224 @@ def ask_agent_structured(case_id: str, case_context: str, user_question: str) ->
         - requires_manual_review: bool
         - metadata: Dict
     """
+    return run_sync(ask_agent_structured_async(case_id, case_context, user_question,
+                                               split_context, doc_types, doc_sources, mode))
+
+
+async def ask_agent_structured_async(case_id: str, case_context: str, user_question: str,
+                                     split_context: bool = None, doc_types: List[str] = None,
+                                     doc_sources: List[str] = None, mode: str = None) -> Dict[str, Any]:
+    """
+    ask_agent_structured as a coroutine. Embedding and generation go
+    through the shared async client, so many cases can be in flight on one
+    event loop; Ollama sees at most RAG_MAX_IN_FLIGHT requests at a time.
+    """
+    prepared = await prepare_case_async(case_id, case_context, user_question,
+                                        split_context, doc_types, doc_sources, mode)
+    if "response" in prepared:
+        return prepared["response"]
+    reason = extractive_reason(mode or ANSWER_MODE)
+    if reason:
+        return await asyncio.to_thread(finish_extractive, prepared, reason, {})
     
-    # Step 1: Retrieve relevant context
+    # Step 4: Get AI response
+    timings = {}
+    try:
+        ai_response_text = extract_json_text(
+            (await ollama.generate(prepared["prompt"], timings, schema=generation_schema())).strip())
+    except Exception as e:
+        timings["error"] = str(e)
+        generator_failed(e)
+        return await asyncio.to_thread(finish_extractive, prepared, "llm unavailable", timings)
+    
+    # Steps 5-6: Parse it and build the final structured response
+    return await asyncio.to_thread(finish_case, prepared, ai_response_text, timings)
+
+
+async def ask_many_async(cases: List[Dict[str, Any]], **kwargs) -> List[Dict[str, Any]]:
+    """
+    Answer many {"case_id", "case_context", "question"} cases concurrently
+    on the running event loop. Results keep the input order.
+    """
+    return await asyncio.gather(*(
+        ask_agent_structured_async(c["case_id"], c["case_context"], c["question"], **kwargs)
+        for c in cases
+    ))
+
+
+_loop = None
+_loop_lock = threading.Lock()
+
+
+def run_sync(coro):
+    """
+    Run a coroutine of the async core from synchronous code and wait for
+    it. All sync callers share one background event loop, and with it one
+    connection pool and one in-flight cap, whichever thread they call from.
+    """
+    global _loop
+    with _loop_lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            threading.Thread(target=_loop.run_forever, name="agent-event-loop", daemon=True).start()
+    return asyncio.run_coroutine_threadsafe(coro, _loop).result()
+
+
+def ask_agent_structured_stream(case_id: str, case_context: str, user_question: str,
+                                split_context: bool = None, doc_types: List[str] = None,
+                                doc_sources: List[str] = None,
+                                mode: str = None) -> Iterator[Dict[str, Any]]:
+    """
+    Streaming variant of ask_agent_structured. Yields events:
+
+        {"event": "citations", "case_id", "query", "citations", "metadata"}
+            as soon as retrieval is done, before generation starts
+        {"event": "answer", "text"}
+            pieces of the answer field while the model writes it
+        {"event": "field", "name", "value"}
+            each other field (confidence, risk_factors, ...) once written
+        {"event": "done", "response"}
+            the same dictionary ask_agent_structured returns
+    """
+    prepared = prepare_case(case_id, case_context, user_question,
+                            split_context, doc_types, doc_sources, mode)
+    if "response" in prepared:
+        yield {"event": "done", "response": prepared["response"]}
+        return
+    
+    yield {
+        "event": "citations",
+        "case_id": case_id,
+        "query": user_question,
+        "citations": prepared["citations"],
+        "metadata": {"sources_found": len(prepared["sources"])}
+    }
+    
+    timings = {}
+    reason = extractive_reason(mode or ANSWER_MODE)
+    if reason:
+        response = finish_extractive(prepared, reason, timings)
+        yield {"event": "answer", "text": response["answer"]}
+        yield {"event": "done", "response": response}
+        return
+    
+    parser = IncrementalJSON()
+    text = []
+    try:
+        for token in stream_ollama(prepared["prompt"], timings, schema=generation_schema()):
+            text.append(token)
+            for kind, name, value in parser.feed(token):
+                if kind == "delta" and name == "answer":
+                    yield {"event": "answer", "text": value}
+                elif kind == "field" and name != "answer":
+                    yield {"event": "field", "name": name, "value": value}
+        ai_response_text = extract_json_text("".join(text).strip())
+    except Exception as e:
+        timings["error"] = str(e)
+        generator_failed(e)
+        response = finish_extractive(prepared, "llm unavailable", timings)
+        # After any part of a generated answer, start the passages on a new line
+        yield {"event": "answer", "text": ("\n" if text else "") + response["answer"]}
+        yield {"event": "done", "response": response}
+        return
+    
+    yield {"event": "done", "response": finish_case(prepared, ai_response_text, timings)}
+
+
+def prepare_case(case_id: str, case_context: str, user_question: str,
+                 split_context: bool = None, doc_types: List[str] = None,
+                 doc_sources: List[str] = None, mode: str = None) -> Dict[str, Any]:
+    """prepare_case_async for synchronous callers, on the shared event loop."""
+    return run_sync(prepare_case_async(case_id, case_context, user_question,
+                                       split_context, doc_types, doc_sources, mode))
+
+
+async def prepare_case_async(case_id: str, case_context: str, user_question: str,
+                             split_context: bool = None, doc_types: List[str] = None,
+                             doc_sources: List[str] = None, mode: str = None) -> Dict[str, Any]:
+    """
+    Retrieval, citations and prompt for one question. Returns a dict with
+    "response" already set when there is nothing to generate from or the
+    answer cache has the case. The answer cache (SQLite), the search and
+    context packing block, so they run in worker threads.
+    """
+    
+    # Step 0: Answer repeated cases from the answer cache (generated answers only)
+    kb = knowledge.current()
     search_query = f"{case_context}. {user_question}"
-    sources = retrieve_context(search_query, top_k=5)
+    if split_context is None:
+        split_context = SPLIT_CONTEXT
+    mode = mode or ANSWER_MODE
+    scope = answer_scope(split_context, doc_types, doc_sources)
+    cached = None
+    if mode == "generate":
+        cached = await asyncio.to_thread(lookup_answer, kb, case_id, case_context, user_question, scope)
+    if cached is not None:
+        return {"response": cached}
+    query_embedding = None
+    if split_context:
+        query_embedding = await embed_case_query_async(case_context, user_question)
+    elif kb.lexical is None or not looks_like_code(search_query):
+        query_embedding = await get_embedding_async(search_query)
+    if ANSWER_SIMILARITY and query_embedding is not None and mode == "generate":
+        cached = await asyncio.to_thread(lookup_answer, kb, case_id, case_context, user_question,
+                                         scope, query_embedding)
+        if cached is not None:
+            return {"response": cached}
     
+    # Step 1: Retrieve relevant context
+    sources = await retrieve_context_async(search_query, top_k=5, query_embedding=query_embedding,
+                                           kb=kb, doc_types=doc_types, doc_sources=doc_sources)
+    
+    # Steps 2-3: Build citations and the prompt
+    prepared = await asyncio.to_thread(build_case, case_id, case_context, user_question, sources)
+    if "response" not in prepared:
+        vector = query_embedding if ANSWER_SIMILARITY else None
+        prepared.update(kb=kb, answer_cache={"scope": scope, "vector": vector})
+    return prepared
+
+
+def answer_scope(split_context: bool, doc_types: List[str] = None,
+                 doc_sources: List[str] = None) -> str:
+    """Everything besides the case text that changes the answer, as a cache key part."""
+    return json.dumps([sorted(doc_types or []), sorted(doc_sources or []), bool(split_context)])
+
+
+def lookup_answer(kb: Snapshot, case_id: str, case_context: str, user_question: str, scope: str,
+                  query_embedding: np.ndarray = None) -> Optional[Dict[str, Any]]:
+    """
+    A cached response for this case from the same version of the knowledge
+    base, re-addressed to the case, or None. Without
+    a query_embedding only exact repeats match; with one (and
+    RAG_ANSWER_SIMILARITY set), near-identical cases do too.
+    metadata["answer_cache"] says which tier answered.
+    """
+    if answer_cache is None:
+        return None
+    try:
+        if query_embedding is None:
+            hit = answer_cache.get(case_context, user_question, kb.version, scope)
+        else:
+            hit = answer_cache.get_similar(query_embedding, kb.version, scope)
+    except Exception as e:
+        print(f"⚠️  Answer cache error: {e}")
+        return None
+    if hit is None:
+        return None
+    response, info = hit
+    info["age_s"] = round(time.time() - info.pop("cached_at"), 1)
+    info["cached_case_id"] = response["case_id"]
+    response.update(case_id=case_id, timestamp=datetime.now().isoformat(), query=user_question)
+    response["metadata"]["case_context"] = case_context
+    response["metadata"]["answer_cache"] = info
+    return response
+
+
+def build_case(case_id: str, case_context: str, user_question: str,
+               sources: List[Dict]) -> Dict[str, Any]:
+    """Citations and prompt from retrieved sources (see prepare_case)."""
     if not sources:
-        return AgentResponse(
+        return {"response": AgentResponse(
             case_id=case_id,
             timestamp=datetime.now().isoformat(),
             query=user_question,
@@ -231,20 +1021,21 @@ def ask_agent_structured(case_id: str, case_context: str, user_question: str) ->
             recommendations=["Manual review required", "Consult policy expert"],
             requires_manual_review=True,
             metadata={"sources_found": 0}
-        ).to_dict()
+        ).to_dict()}
     
-    # Step 2: Build citations
+    # Step 2: Pack sources into the token budget and build citations
+    packed = pack_context(sources, CONTEXT_TOKENS, DEDUP_THRESHOLD)
     citations = []
     combined_sources = ""
     
-    for idx, s in enumerate(sources, 1):
+    for idx, s in enumerate(packed.passages, 1):
         meta = s["metadata"]
         
         citation = Citation(
-            document_name=meta.get("document_name", f"Document_{idx}"),
+            document_name=meta.get("document_name", meta.get("source", f"Document_{idx}")),
             section_id=meta.get("section_id", "N/A"),
-            page_number=meta.get("page_number", 0),
-            paragraph_number=meta.get("paragraph_number", 0),
+            page_number=meta.get("page_number", meta.get("page", 0)),
+            paragraph_number=meta.get("paragraph_number", meta.get("chunk", -1) + 1),
             relevance_score=s.get("relevance_score", 0.0),
             text_excerpt=s["text"][:200] + "..."
         )
@@ -284,14 +1075,26 @@ Respond with ONLY a JSON object (no other text) with this exact structure:
 }}
 """
     
-    # Step 4: Get AI response
-    ai_response_text = call_ollama(prompt, extract_json=True)
+    return {
+        "case_id": case_id,
+        "case_context": case_context,
+        "user_question": user_question,
+        "sources": sources,
+        "citations": citations,
+        "passages": packed.passages,
+        "context": packed.report(),
+        "prompt": prompt
+    }
+
+
+def finish_case(prepared: Dict[str, Any], ai_response_text: str, timings: Dict) -> Dict[str, Any]:
+    """Parse the model output for a prepared case into the structured response."""
+    kb = prepared["kb"]
     
-    # Step 5: Parse AI response
-    try:
-        ai_data = json.loads(ai_response_text)
-    except json.JSONDecodeError:
-        # Fallback if JSON parsing fails
+    # Step 5: Parse AI response, repairing it if need be
+    ai_data, timings["parse"] = parse_model_output(ai_response_text)
+    if ai_data is None:
+        # Fallback if nothing could be recovered
         ai_data = {
             "answer": ai_response_text,
             "confidence": "medium",
@@ -302,23 +1105,79 @@ Respond with ONLY a JSON object (no other text) with this exact structure:
     
     # Step 6: Build final structured response
     response = AgentResponse(
-        case_id=case_id,
+        case_id=prepared["case_id"],
         timestamp=datetime.now().isoformat(),
-        query=user_question,
-        answer=ai_data.get("answer", "No answer provided"),
-        confidence=ai_data.get("confidence", "medium"),
-        citations=citations,
-        risk_factors=ai_data.get("risk_factors", []),
-        recommendations=ai_data.get("recommendations", []),
-        requires_manual_review=ai_data.get("requires_manual_review", False),
-        metadata={
-            "sources_found": len(sources),
-            "avg_relevance": np.mean([s["relevance_score"] for s in sources]),
-            "case_context": case_context
-        }
-    )
+        query=prepared["user_question"],
+        answer=ai_data["answer"],
+        confidence=ai_data["confidence"],
+        citations=prepared["citations"],
+        risk_factors=ai_data["risk_factors"],
+        recommendations=ai_data["recommendations"],
+        requires_manual_review=ai_data["requires_manual_review"],
+        metadata=response_metadata(prepared, timings)
+    ).to_dict()
+    
+    # Only clean answers are worth serving again
+    cache_key = prepared.get("answer_cache")
+    if answer_cache is not None and cache_key and timings["parse"] == "json" and "error" not in timings:
+        try:
+            answer_cache.put(prepared["case_context"], prepared["user_question"], kb.version,
+                             response, cache_key["vector"], cache_key["scope"])
+        except Exception as e:
+            print(f"⚠️  Answer cache error: {e}")
     
-    return response.to_dict()
+    return response
+
+
+def finish_extractive(prepared: Dict[str, Any], reason: str, timings: Dict) -> Dict[str, Any]:
+    """
+    Structured response quoting the source sentences that best match the
+    question, without generation. The answer marks matched terms in **bold**
+    and ends each sentence with its citation number; metadata["extractive"]
+    holds the sentence and term spans.
+    """
+    start = time.perf_counter()
+    sentences = extract_sentences(prepared["user_question"], prepared["passages"],
+                                  EXTRACTIVE_SENTENCES)
+    best = sentences[0]["coverage"] if sentences else 0.0
+    timings.update(mode="extractive", reason=reason,
+                   extract_ms=round((time.perf_counter() - start) * 1000, 1))
+    metadata = response_metadata(prepared, timings)
+    metadata["extractive"] = [dict(s, citation=s["passage"] + 1) for s in sentences]
+    
+    return AgentResponse(
+        case_id=prepared["case_id"],
+        timestamp=datetime.now().isoformat(),
+        query=prepared["user_question"],
+        answer=" ".join(f"{highlight(s)} [{s['passage'] + 1}]" for s in sentences)
+               or "No sentence in the retrieved sources matches the question.",
+        confidence="high" if best >= 0.75 else "medium" if best >= 0.4 else "low",
+        citations=prepared["citations"],
+        risk_factors=[] if sentences else ["No source sentence matches the question"],
+        recommendations=["Read the quoted passages in the cited documents before deciding"],
+        requires_manual_review=best < 0.4,
+        metadata=metadata
+    ).to_dict()
+
+
+def response_metadata(prepared: Dict[str, Any], timings: Dict) -> Dict[str, Any]:
+    """Metadata shared by generated and extractive responses."""
+    sources = prepared["sources"]
+    kb = prepared["kb"]
+    return {
+        "sources_found": len(sources),
+        "index_type": kb.info["index_type"],
+        "rescored": kb.info["rescore"],
+        "index_version": kb.version,
+        "retrieval": sources[0]["retrieval"],
+        "query_cache": query_cache_stats(),
+        "model_residency": residency_stats(),
+        "generation": timings,
+        "context": prepared["context"],
+        "avg_relevance": np.mean([s["relevance_score"] for s in sources]),
+        "case_context": prepared["case_context"],
+        "answer_cache": {"hit": None}
+    }
 
 
 # ============================================================================
@@ -331,6 +1190,42 @@ def print_structured_output(response_dict: Dict[str, Any]):
     print(response.format_output())
 
 
+def print_streaming(events: Iterator[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Print events from ask_agent_structured_stream as they arrive: citations
+    first, then the answer token by token. Returns the final response dict.
+    """
+    started = streamed = False
+    for event in events:
+        if event["event"] == "citations":
+            started = True
+            print("\n" + "="*80)
+            print(f"📋 CASE ID: {event['case_id']}")
+            print("="*80)
+            print(f"\n❓ QUERY:")
+            print(f"   {event['query']}")
+            print("\n".join(AgentResponse.citation_lines(event["citations"])))
+            print(f"\n💬 ANSWER:")
+            print("   ", end="", flush=True)
+        elif event["event"] == "answer":
+            streamed = True
+            print(event["text"], end="", flush=True)
+        elif event["event"] == "done":
+            response_dict = event["response"]
+            if not started:
+                print_structured_output(response_dict)
+                return response_dict
+            response = AgentResponse(**response_dict)
+            print("" if streamed else response.answer)
+            print(f"\n🎯 CONFIDENCE: {response.confidence.upper()}")
+            generation = response.metadata.get("generation", {})
+            if "ttft_ms" in generation:
+                print(f"⏱️  First token after {generation['ttft_ms']:.0f} ms, "
+                      f"done after {generation['total_ms']:.0f} ms")
+            print("\n".join(response.assessment_lines()))
+            return response_dict
+
+
 def print_raw_dict(response_dict: Dict[str, Any]):
     """Print the raw dictionary (for debugging/API use)."""
     print("\n" + "="*80)
@@ -349,12 +1244,15 @@ def run_interactive_agent():
     print("\n" + "="*80)
     print("🤖 AI KNOWLEDGE AGENT - STRUCTURED OUTPUT MODE")
     print("="*80)
-    print("Type 'exit' to quit, 'raw' to toggle raw dictionary output\n")
+    print("Type 'exit' to quit, 'raw' to toggle raw dictionary output, "
+          "'stream' to toggle streaming, 'extract' to toggle extractive answers\n")
     
     case_context = input("📋 Enter case context: ")
     case_id = f"CASE-{datetime.now().strftime('%Y%m%d-%H%M%S')}"
     
     show_raw = False
+    stream = STREAM_OUTPUT
+    mode = ANSWER_MODE
     
     while True:
         question = input("\n❓ Ask a question: ")
@@ -368,13 +1266,26 @@ def run_interactive_agent():
             print(f"\n🔧 Raw dictionary output: {'ON' if show_raw else 'OFF'}")
             continue
         
+        if question.lower() == "stream":
+            stream = not stream
+            print(f"\n🔧 Streaming output: {'ON' if stream else 'OFF'}")
+            continue
+        
+        if question.lower() == "extract":
+            mode = "generate" if mode == "extractive" else "extractive"
+            print(f"\n🔧 Extractive answers (no LLM): {'ON' if mode == 'extractive' else 'OFF'}")
+            continue
+        
         if not question.strip():
             continue
         
         print("\n🔄 Processing...")
         
         # Get structured response
-        response_dict = ask_agent_structured(case_id, case_context, question)
+        if stream and not show_raw:
+            print_streaming(ask_agent_structured_stream(case_id, case_context, question, mode=mode))
+            continue
+        response_dict = ask_agent_structured(case_id, case_context, question, mode=mode)
         
         # Display based on mode
         if show_raw:
@@ -407,8 +1318,11 @@ def run_example():
         print(f"QUERY: {q}")
         print(f"{'='*80}")
         
-        response_dict = ask_agent_structured(case_id, case_context, q)
-        print_structured_output(response_dict)
+        if STREAM_OUTPUT:
+            response_dict = print_streaming(ask_agent_structured_stream(case_id, case_context, q))
+        else:
+            response_dict = ask_agent_structured(case_id, case_context, q)
+            print_structured_output(response_dict)
         
         print("\n--- RAW DICTIONARY ---")
         print(json.dumps(response_dict, indent=2))
@@ -419,8 +1333,8 @@ def run_example():
 # ============================================================================
 
 if __name__ == "__main__":
-    import sys
-    
+    load_knowledge()
+    warm_up_model()
     if len(sys.argv) > 1 and sys.argv[1] == "example":
         run_example()
     else:
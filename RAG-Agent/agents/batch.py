@@ -0,0 +1,158 @@
+# batch.py
+
+'''Run many cases through the agent, from the RAG-Agent directory:
+
+    python agents/batch.py cases.jsonl --output answers.ndjson --workers 8
+    python agents/batch.py cases.csv --output answers.ndjson
+
+Input rows need case_id, case_context and question (JSONL objects or CSV
+columns). Every answer is appended to the output as one JSON line as soon
+as it is ready, so the output doubles as the checkpoint: running the same
+command again skips the cases already answered and retries failed ones.
+'''
+import argparse
+import asyncio
+import csv
+import json
+import os
+import time
+
+# -------- COMMAND LINE OPTIONS --------
+parser = argparse.ArgumentParser(description="Answer a file of cases with the structured agent")
+parser.add_argument("input", help="JSONL or CSV file of case_id, case_context, question rows")
+parser.add_argument("--output", required=True,
+                    help="NDJSON file answers are appended to (also the resume checkpoint)")
+parser.add_argument("--workers", type=int, default=8,
+                    help="cases in flight at once")
+parser.add_argument("--progress-every", type=float, default=5.0,
+                    help="seconds between progress lines")
+parser.add_argument("--doc-type", action="append", dest="doc_types",
+                    help="only use documents of this type (repeatable)")
+parser.add_argument("--extractive", action="store_true",
+                    help="answer with source sentences instead of generating (no LLM)")
+
+
+def row_key(row):
+    return f"{row['case_id']}\0{row['question']}"
+
+
+def read_rows(path):
+    """Input rows as dicts with case_id, case_context and question."""
+    with open(path, newline="", encoding="utf-8") as f:
+        if path.lower().endswith(".csv"):
+            rows = list(csv.DictReader(f))
+        else:
+            rows = [json.loads(line) for line in f if line.strip()]
+    for n, row in enumerate(rows, 1):
+        if "question" not in row and "user_question" in row:
+            row["question"] = row.pop("user_question")
+        missing = [k for k in ("case_id", "case_context", "question") if not row.get(k)]
+        if missing:
+            raise SystemExit(f"{path}: row {n} is missing {', '.join(missing)}")
+    return rows
+
+
+def load_checkpoint(path):
+    """
+    Keys of the cases already answered in `path`. A line cut off by an
+    interrupted run is truncated away so appending continues cleanly.
+    """
+    done = set()
+    if not os.path.exists(path):
+        return done
+    good_end = 0
+    with open(path, "rb") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                break
+            good_end += len(line)
+            if "error" not in record:
+                done.add(row_key(record))
+    if good_end < os.path.getsize(path):
+        with open(path, "r+b") as f:
+            f.truncate(good_end)
+    return done
+
+
+# -------- WORKER POOL --------
+async def run(ask, rows, output, workers, progress_every, doc_types, mode=None):
+    queue = asyncio.Queue()
+    for row in rows:
+        queue.put_nowait(row)
+    stats = {"done": 0, "errors": 0, "ttft_ms": 0.0}
+    start = time.perf_counter()
+
+    async def worker():
+        while True:
+            try:
+                row = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            record = {"case_id": row["case_id"], "question": row["question"]}
+            try:
+                response = await ask(row["case_id"], row["case_context"], row["question"],
+                                     doc_types=doc_types, mode=mode)
+                generation = response["metadata"].get("generation", {})
+                if "error" in generation:
+                    # Ollama failed; keep the row out of the checkpoint
+                    raise RuntimeError(generation["error"])
+                record["response"] = response
+                stats["ttft_ms"] += generation.get("ttft_ms", 0.0)
+            except Exception as e:
+                record["error"] = str(e)
+                stats["errors"] += 1
+            # One line per case, flushed at once: the checkpoint is never behind
+            output.write(json.dumps(record, default=float) + "\n")
+            output.flush()
+            stats["done"] += 1
+
+    async def report():
+        while True:
+            await asyncio.sleep(progress_every)
+            print_progress(stats, len(rows), time.perf_counter() - start)
+
+    reporter = asyncio.create_task(report())
+    await asyncio.gather(*(worker() for _ in range(workers)))
+    reporter.cancel()
+    return stats, time.perf_counter() - start
+
+
+def print_progress(stats, total, seconds):
+    rate = stats["done"] / seconds if seconds else 0.0
+    eta = (total - stats["done"]) / rate if rate else 0.0
+    print(f"  {stats['done']}/{total} cases ({rate:.2f} cases/s, "
+          f"{stats['errors']} errors, ETA {eta / 60:.1f} min)", flush=True)
+
+
+def main():
+    args = parser.parse_args()
+    rows = read_rows(args.input)
+    from agent1 import ask_agent_structured_async, load_knowledge, warm_up_model
+    load_knowledge()
+    if not args.extractive:
+        warm_up_model()
+    done = load_checkpoint(args.output)
+    pending = [row for row in rows if row_key(row) not in done]
+    print(f"{len(rows)} cases, {len(rows) - len(pending)} already answered, {len(pending)} to go")
+    if not pending:
+        return
+
+    with open(args.output, "a", encoding="utf-8") as output:
+        stats, seconds = asyncio.run(run(ask_agent_structured_async, pending, output,
+                                         max(1, args.workers), args.progress_every,
+                                         args.doc_types,
+                                         "extractive" if args.extractive else None))
+
+    answered = stats["done"] - stats["errors"]
+    print(f"Answered {answered} cases in {seconds:.1f}s "
+          f"({stats['done'] / seconds:.2f} cases/s, {args.workers} workers)")
+    if answered and stats["ttft_ms"]:
+        print(f"Average time to first token: {stats['ttft_ms'] / answered:.0f} ms")
+    if stats["errors"]:
+        print(f"{stats['errors']} cases failed; run again to retry them.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+"""
+BENCHMARK: FAISS INDEX CONFIGURATIONS
+Recall@k and per-query latency of factory strings against an exact flat index.
+
+Vectors come from the current index.faiss (when it is a flat index) or are
+generated synthetically. Queries are held-out corpus vectors plus noise.
+
+Usage (from RAG-Agent/):
+    python benchmarks/bench_index.py --synthetic 50000 --dim 3072 \\
+        --factory "IVF1024,Flat" "HNSW32" "IVF1024,PQ64" --nprobe 8 32 --ef-search 64 256
+    python benchmarks/bench_index.py --synthetic 50000 --factory SQfp16 SQ8 --rescore 4
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import faiss
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils.vector_index import build_index, inner_index, is_compressed, search_params
+
+
+def corpus_vectors(args):
+    if args.synthetic:
+        rng = np.random.default_rng(0)
+        # Clustered data behaves more like real embeddings than uniform noise
+        centers = rng.normal(size=(max(1, args.synthetic // 200), args.dim)).astype("float32")
+        labels = rng.integers(0, len(centers), size=args.synthetic)
+        return centers[labels] + 0.3 * rng.normal(size=(args.synthetic, args.dim)).astype("float32")
+
+    index = faiss.read_index(args.index)
+    flat = inner_index(index)
+    if not isinstance(flat, faiss.IndexFlat):
+        sys.exit(f"{args.index} is not a flat index; use --synthetic")
+    return flat.reconstruct_n(0, flat.ntotal)
+
+
+def measure(index, queries, k, params, vectors=None, rescore=0):
+    # One query at a time, the way retrieve_context searches. With `rescore`,
+    # k * rescore candidates are re-ranked by exact distance, as agent1 does
+    start = time.perf_counter()
+    results = []
+    for q in queries:
+        if rescore:
+            candidates = index.search(q.reshape(1, -1), k * rescore, params=params)[1][0]
+            candidates = candidates[candidates >= 0]
+            diffs = vectors[candidates] - q
+            exact = np.einsum("ij,ij->i", diffs, diffs)
+            found = candidates[np.argsort(exact)[:k]]
+            results.append(np.pad(found, (0, k - len(found)), constant_values=-1))
+        else:
+            results.append(index.search(q.reshape(1, -1), k, params=params)[1][0])
+    per_query = (time.perf_counter() - start) / len(queries)
+    return np.vstack(results), per_query
+
+
+def recall(found, truth):
+    hits = sum(len(set(f) & set(t)) for f, t in zip(found, truth))
+    return hits / truth.size
+
+
+def index_bytes(index):
+    return len(faiss.serialize_index(index))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--index", default="index.faiss")
+    parser.add_argument("--synthetic", type=int, default=0, help="number of random vectors instead of index.faiss")
+    parser.add_argument("--dim", type=int, default=3072)
+    parser.add_argument("--factory", nargs="+", default=["IVF256,Flat", "HNSW32", "IVF256,PQ32"])
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[8, 32])
+    parser.add_argument("--ef-search", type=int, nargs="+", default=[64, 256])
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--rescore", type=int, default=0,
+                        help="also measure compressed indexes with exact re-scoring of k * N candidates")
+    args = parser.parse_args()
+
+    vectors = corpus_vectors(args)
+    rng = np.random.default_rng(1)
+    picks = rng.choice(len(vectors), size=min(args.queries, len(vectors)), replace=False)
+    queries = vectors[picks] + 0.05 * rng.normal(size=(len(picks), vectors.shape[1])).astype("float32")
+    ids = np.arange(len(vectors), dtype="int64")
+    print(f"{len(vectors)} vectors, dim {vectors.shape[1]}, {len(queries)} queries, k={args.k}\n")
+
+    flat = build_index("Flat", vectors.shape[1])
+    flat.add_with_ids(vectors, ids)
+    truth, flat_latency = measure(flat, queries, args.k, None)
+    print(f"{'config':<32} {'recall@k':>9} {'ms/query':>9} {'speedup':>8} {'size MB':>8}")
+    print(f"{'Flat':<32} {1.0:>9.3f} {flat_latency * 1000:>9.3f} {1.0:>8.2f} {index_bytes(flat) / 1e6:>8.1f}")
+
+    for factory in args.factory:
+        index = build_index(factory, vectors.shape[1])
+        if not index.is_trained:
+            index.train(vectors)
+        index.add_with_ids(vectors, ids)
+        size = index_bytes(index) / 1e6
+
+        inner = inner_index(index)
+        if isinstance(inner, faiss.IndexIVF):
+            settings = [(f"nprobe={n}", search_params(index, nprobe=n)) for n in args.nprobe]
+        elif hasattr(inner, "hnsw"):
+            settings = [(f"efSearch={e}", search_params(index, ef_search=e)) for e in args.ef_search]
+        else:
+            settings = [("", None)]
+
+        for label, params in settings:
+            found, latency = measure(index, queries, args.k, params)
+            name = f"{factory} {label}".strip()
+            print(f"{name:<32} {recall(found, truth):>9.3f} {latency * 1000:>9.3f} "
+                  f"{flat_latency / latency:>8.2f} {size:>8.1f}")
+            if args.rescore and is_compressed(index):
+                found, latency = measure(index, queries, args.k, params, vectors, args.rescore)
+                name = f"{name} +rescore x{args.rescore}"
+                print(f"{name:<32} {recall(found, truth):>9.3f} {latency * 1000:>9.3f} "
+                      f"{flat_latency / latency:>8.2f} {size:>8.1f}")
@@ -10,71 +10,393 @@
 │   ├── regulation_doc.pdf
 │
 ├── index.faiss        ← auto-created
-├── metadata.pkl       ← auto-created
+├── index_info.json    ← auto-created (factory string the index was built from)
+├── store/             ← auto-created (chunk texts + metadata, read via mmap)
+├── manifest.json      ← auto-created (content hash per file/page, chunk ids)
+├── lexical/           ← auto-created (BM25 inverted index over the store)
+├── embedding_cache.sqlite ← auto-created (shared with the agents)
 '''
-import fitz  # PyMuPDF
 import faiss
 import numpy as np
-import requests
-import pickle
+import hashlib
+import json
 import os
+import shutil
+import sys
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils.embeddings import EmbeddingClient
+from utils.embedding_cache import EmbeddingCache, CACHE_PATH
+from utils.chunking import ChunkConfig, CHUNK_MODES, chunk_page
+from utils.extraction import extract_pages
+from utils.store import MetadataStore, StoreWriter, STORE_DIR, replace_store
+from utils.lexical import build_lexical_index, LEXICAL_DIR
+from utils.vector_index import (build_index, index_type, min_training_points, can_remove_ids,
+                                uses_chunk_ids, transforms, read_index_info, write_index_info,
+                                apply_storage, apply_transform,
+                                DEFAULT_FACTORY, INDEX_INFO_PATH, STORAGE_CODES)
 
 DATA_DIR = "data"
 INDEX_PATH = "index.faiss"
-META_PATH = "metadata.pkl"
-
-# -------- OLLAMA EMBEDDING FUNCTION --------
-def get_embedding(text):
-    response = requests.post(
-        "http://localhost:11434/api/embeddings",
-        json={
-            "model": "llama3.2",
-            "prompt": text
-        }
-    )
-    return np.array(response.json()["embedding"], dtype="float32")
-
-texts = []
-metadata = []
-
-# -------- INGEST MULTIPLE DOCUMENTS --------
-for file_name in os.listdir(DATA_DIR):
-    if not file_name.endswith(".pdf"):
-        continue
-
-    file_path = os.path.join(DATA_DIR, file_name)
-    doc = fitz.open(file_path)
+STORE_PATH = STORE_DIR
+LEXICAL_PATH = LEXICAL_DIR
+MANIFEST_PATH = "manifest.json"
+
+# -------- COMMAND LINE OPTIONS --------
+parser = argparse.ArgumentParser(description="Ingest PDFs into the FAISS index")
+parser.add_argument("--batch-size", type=int, default=32,
+                    help="chunks per embedding request")
+parser.add_argument("--concurrency", type=int, default=4,
+                    help="embedding requests in flight at once")
+parser.add_argument("--retries", type=int, default=3,
+                    help="retries per failed embedding batch")
+parser.add_argument("--rebuild", action="store_true",
+                    help="ignore the manifest and re-embed every page")
+parser.add_argument("--cache-path", default=CACHE_PATH,
+                    help="on-disk embedding cache shared with the agents")
+parser.add_argument("--cache-max-mb", type=int, default=512,
+                    help="evict least recently used embeddings beyond this size")
+parser.add_argument("--no-cache", action="store_true",
+                    help="always call the embedding model")
+parser.add_argument("--chunk-mode", choices=CHUNK_MODES, default="tokens",
+                    help="split pages by token window, by paragraph, or not at all")
+parser.add_argument("--chunk-tokens", type=int, default=200,
+                    help="maximum tokens per chunk")
+parser.add_argument("--chunk-overlap", type=int, default=40,
+                    help="tokens shared between neighbouring chunks")
+parser.add_argument("--workers", type=int, default=0,
+                    help="PDF extraction processes (0 = one per CPU, 1 = no pool)")
+parser.add_argument("--pages-per-task", type=int, default=16,
+                    help="pages handed to an extraction worker at a time")
+parser.add_argument("--add-batch", type=int, default=256,
+                    help="chunks embedded and added to the index per step; bounds memory")
+parser.add_argument("--index-factory", default=DEFAULT_FACTORY,
+                    help='FAISS factory string, e.g. "Flat", "IVF1024,Flat", "HNSW32", "IVF256,PQ32"')
+parser.add_argument("--storage", choices=STORAGE_CODES, default="float32",
+                    help="vector encoding inside the index (float16 halves, sq8 quarters memory); "
+                         "full-precision copies stay on disk in store/ for re-scoring")
+parser.add_argument("--transform", default="",
+                    help='trained dimensionality reduction stored with the index, e.g. "PCA256" or "OPQ16_64"')
+parser.add_argument("--train-size", type=int, default=50000,
+                    help="vectors buffered to train IVF/PQ indexes before adding")
+parser.add_argument("--max-stale", type=float, default=0.2,
+                    help="share of stale vectors an index that cannot remove them (HNSW) may hold "
+                         "before it is rebuilt from the vectors in store/")
+
 
+# -------- HELPERS --------
+def doc_type_for(file_name):
     # Identify source type by filename (simple demo logic)
     if "policy" in file_name.lower():
-        doc_type = "policy"
+        return "policy"
     elif "sop" in file_name.lower():
-        doc_type = "sop"
-    else:
-        doc_type = "regulation"
+        return "sop"
+    return "regulation"
+
+
+def file_fingerprint(file_path):
+    stat = os.stat(file_path)
+    return {"size": stat.st_size, "mtime": stat.st_mtime}
+
+
+def page_hash(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def write_atomic(path, write):
+    # Write to a temp file and swap it in, so readers never see half a file
+    tmp_path = path + ".tmp"
+    write(tmp_path)
+    os.replace(tmp_path, path)
+
+
+def batched(items, size):
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
 
-    for page_number, page in enumerate(doc):
-        text = page.get_text().strip()
+def load_previous_run(rebuild, chunking, factory):
+    """Return (manifest, index) from the last run, or empty ones."""
+    empty = {"next_id": 0, "chunking": chunking, "files": {}}, None
+    if rebuild or not all(os.path.exists(p) for p in (MANIFEST_PATH, INDEX_PATH, STORE_PATH)):
+        return empty
+
+    index = faiss.read_index(INDEX_PATH)
+    if not uses_chunk_ids(index):
+        print("Existing index does not map chunk ids, rebuilding from scratch.")
+        return empty
+    if read_index_info().get("requested_factory", DEFAULT_FACTORY) != factory:
+        print("Index factory changed, rebuilding from scratch.")
+        return empty
+
+    with open(MANIFEST_PATH) as f:
+        manifest = json.load(f)
+    if manifest.get("chunking") != chunking:
+        print("Chunking settings changed, rebuilding from scratch.")
+        return empty
+    return manifest, index
+
+
+def find_changed_documents(previous_files, new_files):
+    """
+    Return {file_path: fingerprint} for PDFs that are new or modified.
+    Unchanged files are copied into new_files without opening the PDF.
+    """
+    changed = {}
+    for file_name in sorted(os.listdir(DATA_DIR)):
+        if not file_name.endswith(".pdf"):
+            continue
+
+        file_path = os.path.join(DATA_DIR, file_name)
+        fingerprint = file_fingerprint(file_path)
+        previous = previous_files.get(file_name)
+
+        if previous and previous["fingerprint"] == fingerprint:
+            new_files[file_name] = previous
+        else:
+            changed[file_path] = fingerprint
+            new_files[file_name] = {"fingerprint": fingerprint, "pages": {}}
+    return changed
+
+
+def iter_new_chunks(changed, previous_files, new_files, manifest, chunk_config, args):
+    """Yield (id, text, metadata) for every chunk of a new or changed page."""
+    for file_path, page_number, text in extract_pages(list(changed), workers=args.workers,
+                                                      pages_per_task=args.pages_per_task):
+        text = text.strip()
         if not text:
             continue
 
-        texts.append(text)
-        metadata.append({
-            "source": file_name,
-            "type": doc_type,
-            "page": page_number + 1
-        })
+        file_name = os.path.basename(file_path)
+        previous = previous_files.get(file_name)
+        previous_pages = previous["pages"] if previous else {}
+        pages = new_files[file_name]["pages"]
+
+        key = str(page_number)
+        digest = page_hash(text)
+        old = previous_pages.get(key)
+        if old and old["hash"] == digest:
+            pages[key] = old
+            continue
+
+        chunk_ids = []
+        for chunk in chunk_page(text, page_number, chunk_config):
+            chunk_id = manifest["next_id"]
+            manifest["next_id"] += 1
+            chunk_ids.append(chunk_id)
+
+            yield chunk_id, chunk.text, {
+                "source": file_name,
+                "type": doc_type_for(file_name),
+                "page": chunk.page,
+                "chunk": chunk.chunk,
+                "char_start": chunk.char_start,
+                "char_end": chunk.char_end,
+                "id": chunk_id
+            }
+        pages[key] = {"hash": digest, "ids": chunk_ids}
+
+
+def rebuild_from_store(store_path, factory, batch_size, train_size):
+    """
+    A new index over the live chunks, from the full-precision vectors in
+    the store; nothing is re-embedded. None if the store has no vectors or
+    too few to train `factory`.
+    """
+    store = MetadataStore(store_path)
+    live = np.flatnonzero(store.select())
+    if not store.has_vectors or not len(live):
+        store.close()
+        return None
+    index = build_index(factory, store.dimension)
+    if not index.is_trained:
+        if len(live) < min_training_points(index):
+            store.close()
+            return None
+        index.train(store.vectors(live[:train_size]))
+    for start in range(0, len(live), batch_size):
+        ids = live[start:start + batch_size]
+        index.add_with_ids(store.vectors(ids), ids)
+    store.close()
+    return index
+
+
+def find_stale_ids(previous_files, new_files):
+    """Chunk ids whose page changed, vanished, or whose file was removed."""
+    stale_ids = []
+    for file_name, previous in previous_files.items():
+        kept = new_files.get(file_name, {"pages": {}})["pages"]
+        kept_ids = {i for p in kept.values() for i in p["ids"]}
+        stale_ids.extend(i for p in previous["pages"].values() for i in p["ids"] if i not in kept_ids)
+    return stale_ids
+
+
+def main():
+    args = parser.parse_args()
+    chunk_config = ChunkConfig(mode=args.chunk_mode,
+                               max_tokens=args.chunk_tokens,
+                               overlap=args.chunk_overlap)
+    try:
+        requested_factory = apply_transform(apply_storage(args.index_factory, args.storage), args.transform)
+    except ValueError as e:
+        parser.error(str(e))
+    manifest, index = load_previous_run(args.rebuild, chunk_config.to_dict(), requested_factory)
+    factory = read_index_info()["factory"] if index is not None else requested_factory
+    previous_files = manifest["files"]
+    new_files = {}
+
+    # A fresh build writes a new store next to the old one and swaps it in at
+    # the end; an incremental run appends to the existing store in place
+    fresh = index is None
+    store_path = STORE_PATH + ".tmp" if fresh else STORE_PATH
+    store = StoreWriter(store_path, truncate=fresh)
+
+    # Rows past next_id were appended by a run that died before saving the
+    # manifest; they are not in the index, so retire them and skip their ids
+    if store.rows > manifest["next_id"]:
+        store.delete(range(manifest["next_id"], store.rows))
+        manifest["next_id"] = store.rows
+
+    cache = None
+    if not args.no_cache:
+        cache = EmbeddingCache(args.cache_path, max_bytes=args.cache_max_mb * 1024 * 1024)
+    client = EmbeddingClient(batch_size=args.batch_size,
+                             max_in_flight=args.concurrency,
+                             max_retries=args.retries,
+                             cache=cache)
+
+    # -------- STREAM: EXTRACT → CHUNK → EMBED → ADD --------
+    changed = find_changed_documents(previous_files, new_files)
+    chunks = iter_new_chunks(changed, previous_files, new_files, manifest, chunk_config, args)
+    added = 0
+
+    # IVF/PQ indexes and PCA/OPQ transforms must be trained before anything
+    # is added, so the first --train-size vectors are held back, used for
+    # training, then added
+    untrained = []
+
+    def train_and_flush():
+        nonlocal index, factory
+        vectors = np.vstack([v for _, v in untrained])
+        ids = np.concatenate([i for i, _ in untrained])
+        needed = min_training_points(index)
+        fallback = apply_storage(DEFAULT_FACTORY, args.storage)
+        if len(vectors) < needed:
+            print(f"Only {len(vectors)} vectors, {factory} needs at least {needed} to train. "
+                  f"Falling back to {fallback}.")
+            factory = fallback
+            index = build_index(factory, vectors.shape[1])
+        if not index.is_trained:
+            print(f"Training {factory} on {len(vectors)} vectors...")
+            index.train(vectors)
+        index.add_with_ids(vectors, ids)
+        untrained.clear()
+
+    for batch in batched(chunks, args.add_batch):
+        ids, texts, metadata = zip(*batch)
+        embeddings = client.embed_many(texts)
+        ids_array = np.array(ids, dtype="int64")
+
+        if index is None:
+            index = build_index(factory, embeddings.shape[1])
+        if index.is_trained:
+            index.add_with_ids(embeddings, ids_array)
+        else:
+            untrained.append((ids_array, embeddings))
+            if sum(len(i) for i, _ in untrained) >= args.train_size:
+                train_and_flush()
+        store.append(ids, texts, metadata, embeddings)
+        added += len(ids)
+
+    if untrained:
+        train_and_flush()
+
+    client.close()
+    stats = client.report()
+    if added:
+        print(f"Embedded {stats['texts']} chunks in {stats['seconds']:.1f}s "
+              f"({stats['texts_per_second']:.1f} chunks/s, {stats['batches']} batches, "
+              f"{stats['retries']} retries)")
+    if cache is not None:
+        if added:
+            print(f"Embedding cache: {stats['cache_hits']} hits, {stats['cache_misses']} misses")
+        cache.close()
+
+    # -------- DROP STALE CHUNKS --------
+    stale_ids = find_stale_ids(previous_files, new_files)
+    if stale_ids:
+        if can_remove_ids(index):
+            index.remove_ids(np.array(stale_ids, dtype="int64"))
+        store.delete(stale_ids)
+    store.close()
+
+    # Indexes that cannot remove vectors keep stale ones, which the agents
+    # skip because the store flags them deleted; past --max-stale of the
+    # index they are dropped by rebuilding it from store/
+    if index is not None and not can_remove_ids(index) and index.ntotal:
+        live = MetadataStore(store_path)
+        stale = index.ntotal - live.live_count()
+        live.close()
+        if stale > args.max_stale * index.ntotal:
+            print(f"{stale} of {index.ntotal} vectors in the {index_type(index)} index are stale, "
+                  f"rebuilding it from {store_path}/...")
+            rebuilt = rebuild_from_store(store_path, factory, args.add_batch, args.train_size)
+            if rebuilt is not None:
+                index = rebuilt
+            else:
+                print("Store has no vectors to rebuild from; stale vectors stay until --rebuild.")
+        elif stale:
+            print(f"{index_type(index)} cannot remove vectors; {stale} stale vectors stay in the "
+                  f"index until they pass --max-stale ({args.max_stale:.0%}).")
+
+    manifest["files"] = new_files
+
+    def dump_manifest(path):
+        with open(path, "w") as f:
+            json.dump(manifest, f)
+
+    if index is None:
+        shutil.rmtree(store_path)
+        print("No text found in data/. Nothing to ingest.")
+        return
+
+    if not added and not stale_ids and not fresh:
+        # Only file timestamps moved; remember them so the PDFs are skipped next time
+        if new_files != previous_files:
+            write_atomic(MANIFEST_PATH, dump_manifest)
+        if not os.path.exists(LEXICAL_PATH):
+            build_lexical_index(STORE_PATH, LEXICAL_PATH)
+        print("Index is up to date. Nothing to ingest.")
+        return
 
-# -------- CREATE VECTOR INDEX --------
-embeddings = [get_embedding(t) for t in texts]
-dimension = len(embeddings[0])
+    print(f"{added} new or changed chunks, {len(stale_ids)} stale chunks")
 
-index = faiss.IndexFlatL2(dimension)
-index.add(np.array(embeddings))
+    write_atomic(INDEX_PATH, lambda p: faiss.write_index(index, p))
+    write_index_info({
+        "requested_factory": requested_factory,
+        "factory": factory,
+        "index_type": index_type(index),
+        # A fallback to Flat drops the transform with the factory
+        "transform": (args.transform or None) if transforms(index) else None,
+        "dimension": index.d,
+        "ntotal": index.ntotal,
+    }, INDEX_INFO_PATH)
+    if fresh:
+        replace_store(store_path, STORE_PATH)
+    # Only the chunks appended this run are tokenized; stale ones drop out
+    # of the carried-over postings. A fresh store gets a fresh index.
+    terms = build_lexical_index(STORE_PATH, LEXICAL_PATH, rebuild=fresh)
+    write_atomic(MANIFEST_PATH, dump_manifest)
 
-faiss.write_index(index, INDEX_PATH)
+    print(f"Ingestion complete. {index.ntotal} chunks indexed ({factory}), {terms} lexical terms.")
 
-with open(META_PATH, "wb") as f:
-    pickle.dump({"texts": texts, "metadata": metadata}, f)
 
-print("Ingestion complete. Documents indexed successfully.")
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+import importlib
+import json
+import os
+import sys
+
+import numpy as np
+import pytest
+
+# The utils package is imported as "utils", the way the agents and ingest.py import it
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+TYPES = ("policy", "sop", "regulation")
+
+
+@pytest.fixture
+def write_knowledge_base(tmp_path):
+    """
+    Writes what ingest.py would for `n` random unit vectors: an index built
+    with build_index, the store with full-precision vectors, the lexical
+    index, index_info.json and a manifest. Chunk i reads "chunk i" plus
+    words[i], and is of type TYPES[i % 3].
+    """
+    import faiss
+    from utils.lexical import build_lexical_index
+    from utils.store import StoreWriter
+    from utils.vector_index import build_index, write_index_info
+
+    def write(n, factory="HNSW8,SQ8", words=None, seed=0, dim=8):
+        path = tmp_path / "kb"
+        path.mkdir(exist_ok=True)
+        vectors = np.random.default_rng(seed).normal(size=(n, dim)).astype(np.float32)
+        vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+        texts = [f"chunk {i} {words[i] if words else ''}".strip() for i in range(n)]
+        metadata = [{"source": f"{TYPES[i % 3]}.pdf", "type": TYPES[i % 3], "page": 1} for i in range(n)]
+        store = StoreWriter(str(path / "store"), truncate=True)
+        store.append(range(n), texts, metadata, vectors)
+        store.close()
+        index = build_index(factory, dim)
+        index.train(vectors)
+        index.add_with_ids(vectors, np.arange(n, dtype="int64"))
+        # Swapped in like ingest.py does, so a loaded (mmapped) version stays intact
+        faiss.write_index(index, str(path / "index.faiss.tmp"))
+        os.replace(path / "index.faiss.tmp", path / "index.faiss")
+        write_index_info({"factory": factory, "requested_factory": factory}, str(path / "index_info.json"))
+        build_lexical_index(str(path / "store"), str(path / "lexical"), rebuild=True)
+        with open(path / "manifest.json", "w") as f:
+            json.dump({"next_id": n, "seed": seed}, f)
+        return path
+
+    return write
+
+
+@pytest.fixture
+def open_knowledge_base():
+    """A KnowledgeBase over a directory from write_knowledge_base, without the watcher thread"""
+    from utils.knowledge_base import KnowledgeBase
+
+    def open_(path, **kwargs):
+        return KnowledgeBase(str(path / "index.faiss"), str(path / "store"), str(path / "lexical"),
+                             manifest_path=str(path / "manifest.json"),
+                             info_path=str(path / "index_info.json"),
+                             watch_interval=0, **kwargs)
+
+    return open_
+
+
+@pytest.fixture(scope="session")
+def agent1(tmp_path_factory):
+    """agents/agent1.py, imported with its caches in a temp dir and no warm-up call"""
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setenv("RAG_DATA_DIR", str(tmp_path_factory.mktemp("agent1")))
+        mp.setenv("RAG_ANSWER_CACHE", "0")
+        mp.setenv("RAG_WARM_UP", "0")
+        mp.setenv("RAG_RELOAD_INTERVAL", "0")
+        mp.syspath_prepend(os.path.join(ROOT, "agents"))
+        return importlib.import_module("agent1")
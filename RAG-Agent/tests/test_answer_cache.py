@@ -0,0 +1,74 @@
+import numpy as np
+import pytest
+
+from utils.answer_cache import AnswerCache, normalize
+
+
+@pytest.fixture
+def cache(tmp_path):
+    cache = AnswerCache(str(tmp_path / "answers.sqlite"), max_entries=3, ttl=3600, similarity=0.95)
+    yield cache
+    cache.close()
+
+
+def test_normalize():
+    assert normalize("  Is FLOOD\n covered?? ") == "is flood covered"
+
+
+def test_exact_hits_ignore_case_and_whitespace(cache):
+    cache.put("Flood claim", "Is it covered?", "v1", {"answer": "yes"})
+    response, hit = cache.get("flood  claim", "is it covered", "v1")
+    assert response == {"answer": "yes"} and hit["hit"] == "exact"
+    assert cache.get("flood claim", "is it covered", "v2") is None
+    assert cache.get("flood claim", "is it covered", "v1", scope="sop") is None
+    assert cache.stats["exact_hits"] == 1
+
+
+def test_similar_hits_need_the_threshold_and_scope(cache):
+    cache.put("ctx", "q", "v1", {"answer": "a"}, vector=np.array([1, 0, 0], dtype=np.float32))
+    response, hit = cache.get_similar(np.array([1, 0.1, 0], dtype=np.float32), "v1")
+    assert response == {"answer": "a"} and hit["hit"] == "similar" and hit["similarity"] > 0.95
+    assert cache.get_similar(np.array([0, 1, 0], dtype=np.float32), "v1") is None
+    assert cache.get_similar(np.array([1, 0, 0], dtype=np.float32), "v1", scope="x") is None
+    assert cache.get_similar(np.array([1, 0, 0], dtype=np.float32), "v2") is None
+    # A later put is visible to the similarity tier without reopening
+    cache.put("ctx", "q2", "v1", {"answer": "b"}, vector=np.array([0, 1, 0], dtype=np.float32))
+    assert cache.get_similar(np.array([0, 1, 0], dtype=np.float32), "v1")[0] == {"answer": "b"}
+
+
+def test_similarity_tier_is_off_by_default(tmp_path):
+    cache = AnswerCache(str(tmp_path / "answers.sqlite"))
+    vector = np.array([1, 0, 0], dtype=np.float32)
+    cache.put("ctx", "q", "v1", {"answer": "a"}, vector=vector)
+    assert cache.get_similar(vector, "v1") is None
+    assert cache.get("ctx", "q", "v1") is not None
+    cache.close()
+
+
+def test_new_version_evicts_old_answers(cache):
+    cache.put("a", "q", "v1", {"answer": 1})
+    cache.put("b", "q", "v2", {"answer": 2})
+    assert cache.conn.execute("SELECT COUNT(*) FROM answers").fetchone()[0] == 1
+    assert cache.stats["evictions"] == 1
+
+
+def test_least_recently_used_beyond_max_entries(cache, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr("utils.answer_cache.time.time", lambda: now[0])
+    for n, key in enumerate("abc"):
+        now[0] += 1
+        cache.put(key, "q", "v1", {"answer": n})
+    now[0] += 1
+    cache.get("a", "q", "v1")  # a is now the most recently used
+    now[0] += 1
+    cache.put("d", "q", "v1", {"answer": 3})
+    assert cache.get("b", "q", "v1") is None
+    assert cache.get("a", "q", "v1") is not None
+
+
+def test_expired_answers_are_not_served(cache, monkeypatch):
+    cache.put("a", "q", "v1", {"answer": 1}, vector=np.ones(3, dtype=np.float32))
+    later = __import__("time").time() + 7200
+    monkeypatch.setattr("utils.answer_cache.time.time", lambda: later)
+    assert cache.get("a", "q", "v1") is None
+    assert cache.get_similar(np.ones(3, dtype=np.float32), "v1") is None
@@ -0,0 +1,81 @@
+import asyncio
+import json
+import os
+import sys
+import types
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "agents"))
+import batch
+
+ROWS = [{"case_id": f"c{i}", "case_context": "HO-3 policy", "question": f"question {i}"} for i in range(8)]
+
+
+class FakeAgent:
+    """Stands in for agent1's async entry point; `script` maps a case id to what happens on its next ask"""
+
+    def __init__(self, script=None):
+        self.script = dict(script or {})
+        self.asked = []
+
+    async def ask_agent_structured_async(self, case_id, case_context, question, doc_types=None, mode=None):
+        self.asked.append(case_id)
+        await asyncio.sleep(0)
+        outcome = self.script.pop(case_id, None)
+        if outcome == "interrupt":
+            raise KeyboardInterrupt
+        if outcome == "fail":
+            raise RuntimeError("embedder down")
+        generation = {"error": "ollama timed out"} if outcome == "llm error" else {"ttft_ms": 10.0}
+        return {"case_id": case_id, "answer": f"answer to {question}", "metadata": {"generation": generation}}
+
+    def module(self):
+        return types.SimpleNamespace(ask_agent_structured_async=self.ask_agent_structured_async,
+                                     load_knowledge=lambda: None, warm_up_model=lambda: None)
+
+
+def run_batch(monkeypatch, tmp_path, agent):
+    monkeypatch.setitem(sys.modules, "agent1", agent.module())
+    monkeypatch.setattr(sys, "argv", ["batch.py", str(tmp_path / "cases.jsonl"),
+                                      "--output", str(tmp_path / "answers.ndjson"), "--workers", "1"])
+    batch.main()
+
+
+def records(tmp_path):
+    with open(tmp_path / "answers.ndjson") as f:
+        return [json.loads(line) for line in f]
+
+
+@pytest.fixture
+def cases(tmp_path):
+    with open(tmp_path / "cases.jsonl", "w") as f:
+        f.writelines(json.dumps(row) + "\n" for row in ROWS)
+
+
+def test_interrupted_run_resumes_where_it_stopped(tmp_path, monkeypatch, cases):
+    first = FakeAgent({"c1": "fail", "c2": "llm error", "c5": "interrupt"})
+    with pytest.raises(KeyboardInterrupt):
+        run_batch(monkeypatch, tmp_path, first)
+    assert first.asked == ["c0", "c1", "c2", "c3", "c4", "c5"]
+    assert [("error" in r) for r in records(tmp_path)] == [False, True, True, False, False]
+    # The process died halfway through writing c5's line
+    with open(tmp_path / "answers.ndjson", "a") as f:
+        f.write('{"case_id": "c5", "question": "question 5", "resp')
+
+    second = FakeAgent()
+    run_batch(monkeypatch, tmp_path, second)
+    # Answered cases are skipped; failed ones are asked again
+    assert second.asked == ["c1", "c2", "c5", "c6", "c7"]
+    answered = [r["case_id"] for r in records(tmp_path) if "error" not in r]
+    assert sorted(answered) == [row["case_id"] for row in ROWS]
+
+
+def test_load_checkpoint_drops_a_cut_off_last_line(tmp_path):
+    path = tmp_path / "answers.ndjson"
+    good = (json.dumps({"case_id": "c0", "question": "question 0", "response": {}}) + "\n"
+            + json.dumps({"case_id": "c1", "question": "question 1", "error": "timed out"}) + "\n")
+    path.write_text(good + '{"case_id": "c2", "quest')
+    assert batch.load_checkpoint(str(path)) == {batch.row_key(ROWS[0])}
+    assert path.read_text() == good
+    assert batch.load_checkpoint(str(tmp_path / "missing.ndjson")) == set()
@@ -0,0 +1,56 @@
+import pytest
+
+from utils.chunking import ChunkConfig, chunk_page
+
+
+def words(n):
+    return " ".join(f"w{i}" for i in range(n))
+
+
+def test_token_windows_overlap_and_offsets_match_text():
+    text = words(25)
+    chunks = chunk_page(text, page=3, config=ChunkConfig(max_tokens=10, overlap=2))
+    assert [c.chunk for c in chunks] == [0, 1, 2]
+    assert [len(c.text.split()) for c in chunks] == [10, 10, 9]
+    for c in chunks:
+        assert c.page == 3
+        assert text[c.char_start:c.char_end] == c.text
+    # The last two words of a chunk open the next one
+    assert chunks[0].text.split()[-2:] == chunks[1].text.split()[:2]
+
+
+def test_short_page_is_one_chunk():
+    chunks = chunk_page("  only a few words  ", page=1, config=ChunkConfig(max_tokens=10, overlap=2))
+    assert [c.text for c in chunks] == ["only a few words"]
+
+
+def test_paragraph_mode_packs_whole_paragraphs():
+    text = "one two three\n\nfour five\n\nsix seven eight nine"
+    chunks = chunk_page(text, page=1, config=ChunkConfig(mode="paragraph", max_tokens=5, overlap=1))
+    assert [c.text for c in chunks] == ["one two three\n\nfour five", "six seven eight nine"]
+
+
+def test_paragraph_mode_splits_an_oversized_paragraph():
+    text = "short one\n\n" + words(12)
+    chunks = chunk_page(text, page=1, config=ChunkConfig(mode="paragraph", max_tokens=5, overlap=0))
+    assert chunks[0].text == "short one"
+    assert " ".join(c.text for c in chunks[1:]) == words(12)
+
+
+def test_page_mode_strips_and_keeps_offsets():
+    text = "\n  whole page text \n"
+    (chunk,) = chunk_page(text, page=7, config=ChunkConfig(mode="page"))
+    assert chunk.text == "whole page text"
+    assert text[chunk.char_start:chunk.char_end] == chunk.text
+    assert chunk_page("   ", page=7, config=ChunkConfig(mode="page")) == []
+
+
+@pytest.mark.parametrize("kwargs", [
+    {"mode": "sentences"},
+    {"max_tokens": 0},
+    {"max_tokens": 10, "overlap": 10},
+    {"overlap": -1},
+])
+def test_invalid_config_is_rejected(kwargs):
+    with pytest.raises(ValueError):
+        ChunkConfig(**kwargs)
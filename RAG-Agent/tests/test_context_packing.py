@@ -0,0 +1,56 @@
+from utils.context_packing import MIN_PASSAGE_TOKENS, count_tokens, pack_context
+
+
+def source(text, score, source="policy.pdf", page=1, start=None, end=None, id=0):
+    meta = {"id": id, "source": source, "page": page}
+    if start is not None:
+        meta.update(char_start=start, char_end=end)
+    return {"text": text, "metadata": meta, "relevance_score": score}
+
+
+def words(prefix, n):
+    return " ".join(f"{prefix}{i}" for i in range(n))
+
+
+def test_passages_are_kept_most_relevant_first():
+    packed = pack_context([source(words("a", 10), 0.2, id=1), source(words("b", 10), 0.9, id=2)],
+                          budget=1000)
+    assert [p["metadata"]["id"] for p in packed.passages] == [2, 1]
+    assert packed.tokens == 2 * count_tokens(words("a", 10))
+    assert packed.dropped == [] and packed.trimmed == []
+
+
+def test_overlap_with_a_chosen_chunk_of_the_same_page_is_trimmed():
+    page = words("w", 30)
+    first_end = len(words("w", 20))
+    second_start = len(words("w", 15)) + 1
+    packed = pack_context([
+        source(page[:first_end], 0.9, start=0, end=first_end, id=1),
+        source(page[second_start:], 0.5, start=second_start, end=len(page), id=2),
+    ], budget=1000)
+    assert packed.passages[1]["text"] == " ".join(f"w{i}" for i in range(20, 30))
+    assert packed.trimmed[0]["reason"] == "overlap"
+
+
+def test_fully_covered_chunks_and_near_duplicates_are_dropped():
+    text = words("w", 20)
+    packed = pack_context([
+        source(text, 0.9, start=0, end=len(text), id=1),
+        source(text[:20], 0.8, start=0, end=20, id=2),
+        source(text, 0.7, source="copy.pdf", id=3),
+    ], budget=1000)
+    assert [p["metadata"]["id"] for p in packed.passages] == [1]
+    assert [(d["id"], d["reason"]) for d in packed.dropped] == [(2, "duplicate"), (3, "duplicate")]
+
+
+def test_budget_cuts_the_last_passage_and_drops_the_rest():
+    first, second = words("a", 100), words("b", 100)
+    budget = count_tokens(first) + MIN_PASSAGE_TOKENS + 10
+    packed = pack_context([source(first, 0.9, id=1), source(second, 0.8, id=2),
+                           source(words("c", 100), 0.7, id=3)], budget=budget)
+    assert packed.tokens <= budget
+    assert second.startswith(packed.passages[1]["text"])
+    assert packed.trimmed[0]["reason"] == "budget"
+    assert [(d["id"], d["reason"]) for d in packed.dropped] == [(3, "budget")]
+    report = packed.report()
+    assert report["passages_kept"] == 2 and "passages" not in report
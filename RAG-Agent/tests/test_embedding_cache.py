@@ -0,0 +1,68 @@
+import sqlite3
+
+import numpy as np
+
+from utils.embedding_cache import EmbeddingCache
+
+
+def vectors(n, dim=4):
+    return np.arange(n * dim, dtype=np.float32).reshape(n, dim)
+
+
+def stored_bytes(path):
+    with sqlite3.connect(path) as conn:
+        return conn.execute("SELECT COALESCE(SUM(nbytes), 0) FROM embeddings").fetchone()[0]
+
+
+def test_byte_total_follows_replacements_and_deletes(tmp_path):
+    path = str(tmp_path / "cache.sqlite")
+    cache = EmbeddingCache(path)
+    cache.put_many("m", ["a", "b"], vectors(2))
+    assert cache.total_bytes == 32
+    # Replacing a key with a longer vector only counts the difference
+    cache.put("m", "a", np.zeros(8, dtype=np.float32))
+    assert cache.total_bytes == 48 == stored_bytes(path)
+    assert cache.get("m", "a").tolist() == [0.0] * 8
+    cache.conn.execute("DELETE FROM embeddings WHERE key = ?", (cache.key("m", "b"),))
+    cache.conn.commit()
+    assert cache.total_bytes == 32
+    cache.close()
+
+
+def test_writes_from_another_connection_are_counted(tmp_path):
+    path = str(tmp_path / "cache.sqlite")
+    first, second = EmbeddingCache(path), EmbeddingCache(path)
+    first.put_many("m", ["a", "b"], vectors(2))
+    second.put_many("m", ["b", "c"], vectors(2))
+    assert first.total_bytes == second.total_bytes == 48 == stored_bytes(path)
+    first.close()
+    second.close()
+
+
+def test_existing_caches_are_summed_once_on_open(tmp_path):
+    path = str(tmp_path / "cache.sqlite")
+    cache = EmbeddingCache(path)
+    cache.put_many("m", ["a", "b", "c"], vectors(3))
+    # A cache written before the running total existed
+    cache.conn.executescript("DROP TABLE cache_meta; DROP TRIGGER embeddings_bytes_insert;")
+    cache.close()
+    cache = EmbeddingCache(path)
+    assert cache.total_bytes == 48
+    cache.put("m", "d", vectors(1)[0])
+    assert cache.total_bytes == 64
+    cache.close()
+
+
+def test_least_recently_used_entries_are_evicted_over_the_limit(tmp_path):
+    cache = EmbeddingCache(str(tmp_path / "cache.sqlite"), max_bytes=100)
+    for i, text in enumerate("abcdef"):
+        cache.put("m", text, vectors(1)[0])
+        cache.conn.execute("UPDATE embeddings SET last_used = ? WHERE key = ?", (i, cache.key("m", text)))
+        cache.conn.commit()
+    # 7 x 16 bytes crosses 100, so the oldest go until at most 90 remain
+    cache.get("m", "a")
+    cache.put("m", "g", vectors(1)[0])
+    assert cache.stats["evictions"] == 2
+    assert [cache.get("m", t) is not None for t in "abcdefg"] == [True, False, False, True, True, True, True]
+    assert cache.total_bytes == 80
+    cache.close()
@@ -0,0 +1,96 @@
+import random
+import threading
+
+import numpy as np
+import pytest
+import requests
+
+from utils.embedding_cache import EmbeddingCache
+from utils.embeddings import EmbeddingClient
+
+
+def vector(text):
+    return [float(len(text)), float(sum(map(ord, text)) % 997)]
+
+
+class Response:
+    def __init__(self, payload):
+        self.payload = payload
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return self.payload
+
+
+class FakeSession:
+    """Answers /api/embed like Ollama, after a random delay; fails the first `failures` calls"""
+
+    def __init__(self, failures=0):
+        self.failures = failures
+        self.batches = []
+        self._lock = threading.Lock()
+
+    def post(self, url, json, timeout):
+        with self._lock:
+            self.batches.append(list(json["input"]))
+            if self.failures:
+                self.failures -= 1
+                raise requests.ConnectionError("refused")
+        threading.Event().wait(random.uniform(0, 0.01))  # batches finish out of order
+        return Response({"embeddings": [vector(t) for t in json["input"]]})
+
+    def close(self):
+        pass
+
+
+def client_with(session, **kwargs):
+    client = EmbeddingClient(**kwargs)
+    client.session = session
+    return client
+
+
+def test_batches_keep_the_input_order():
+    session = FakeSession()
+    client = client_with(session, batch_size=3, max_in_flight=4)
+    texts = [f"chunk {i} " + "x" * i for i in range(20)]
+    vectors = client.embed_many(texts)
+    assert vectors.dtype == np.float32
+    assert vectors.tolist() == [vector(t) for t in texts]
+    assert sorted(len(b) for b in session.batches) == [2] + [3] * 6
+    assert client.stats["texts"] == 20 and client.stats["batches"] == 7
+
+
+def test_failed_batches_are_retried_with_backoff(monkeypatch):
+    delays = []
+    monkeypatch.setattr("utils.embeddings.time.sleep", delays.append)
+    client = client_with(FakeSession(failures=2), max_retries=3, backoff=0.5)
+    assert client.embed_batch(["a"]).tolist() == [vector("a")]
+    assert delays == [0.5, 1.0]
+    assert client.stats["retries"] == 2
+
+
+def test_retries_give_up_after_max_retries(monkeypatch):
+    monkeypatch.setattr("utils.embeddings.time.sleep", lambda s: None)
+    session = FakeSession(failures=5)
+    client = client_with(session, max_retries=1)
+    with pytest.raises(requests.ConnectionError):
+        client.embed_batch(["a"])
+    assert len(session.batches) == 2
+
+
+def test_cache_hits_are_merged_with_misses(tmp_path):
+    cache = EmbeddingCache(str(tmp_path / "cache.sqlite"))
+    session = FakeSession()
+    client = client_with(session, batch_size=2, cache=cache)
+    cache.put_many(client.model, ["b", "d"], np.array([[9, 9], [8, 8]], dtype=np.float32))
+
+    vectors = client.embed_many(["a", "b", "c", "d", "e"])
+    assert vectors.tolist() == [vector("a"), [9, 9], vector("c"), [8, 8], vector("e")]
+    assert sorted(t for batch in session.batches for t in batch) == ["a", "c", "e"]
+    # The misses were stored, so a second call never reaches the model
+    session.batches.clear()
+    assert client.embed_many(["e", "a"]).tolist() == [vector("e"), vector("a")]
+    assert session.batches == []
+    cache.close()
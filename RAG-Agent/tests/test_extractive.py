@@ -0,0 +1,39 @@
+from utils.extractive import extract_sentences, highlight, query_terms, split_sentences
+
+
+def test_split_sentences_returns_spans():
+    text = "First sentence here. Second one! Third? Yes.\n\nNew paragraph"
+    assert [text[s:e] for s, e in split_sentences(text)] == \
+        ["First sentence here.", "Second one!", "Third?", "Yes.", "New paragraph"]
+
+
+def test_query_terms_drop_stopwords_and_repeats():
+    assert query_terms("Is flood damage covered by the flood policy?") == \
+        ["flood", "damage", "covered", "policy"]
+
+
+def test_best_sentences_cover_the_rarer_terms():
+    passages = [
+        {"text": "The policy covers fire damage to the dwelling. "
+                 "Flood damage is covered only under an NFIP flood policy. "
+                 "Premiums are due every month on the first day.",
+         "relevance_score": 0.8},
+        {"text": "Every policy lists its exclusions in section four of the document.",
+         "relevance_score": 0.4},
+    ]
+    sentences = extract_sentences("Is flood damage covered?", passages, max_sentences=2)
+    best = sentences[0]
+    assert best["text"] == "Flood damage is covered only under an NFIP flood policy."
+    assert best["passage"] == 0
+    assert passages[0]["text"][best["start"]:best["end"]] == best["text"]
+    assert best["coverage"] == 1.0
+    assert len(sentences) == 2 and sentences[0]["score"] >= sentences[1]["score"]
+    assert highlight(best) == "**Flood** **damage** is **covered** only under an NFIP **flood** policy."
+
+
+def test_duplicate_sentences_and_no_matches():
+    repeated = {"text": "Water damage from burst pipes is covered.", "relevance_score": 0.5}
+    sentences = extract_sentences("burst pipes covered", [repeated, dict(repeated)])
+    assert len(sentences) == 1
+    assert extract_sentences("earthquake", [repeated]) == []
+    assert extract_sentences("the and of", [repeated]) == []
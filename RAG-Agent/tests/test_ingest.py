@@ -0,0 +1,174 @@
+import hashlib
+import json
+import os
+import sys
+
+import numpy as np
+import pytest
+
+fitz = pytest.importorskip("fitz")
+import faiss
+
+from utils.embeddings import EmbeddingClient
+from utils.store import MetadataStore
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "ingestion"))
+import ingest
+
+
+def vector(text):
+    digest = np.frombuffer(hashlib.sha256(text.encode("utf-8")).digest()[:32], dtype=np.uint8)
+    v = digest[:8].astype(np.float32) + 1
+    return v / np.linalg.norm(v)
+
+
+class FakeClient(EmbeddingClient):
+    """Embeds locally and records every text; raises once `fail_after` batches went through"""
+
+    def __init__(self, embedded, fail_after=None, **kwargs):
+        super().__init__(**kwargs)
+        self.embedded = embedded
+        self.fail_after = fail_after
+
+    def embed_many(self, texts):
+        if self.fail_after is not None and self.fail_after <= 0:
+            raise KeyboardInterrupt
+        if self.fail_after is not None:
+            self.fail_after -= 1
+        self.embedded.extend(texts)
+        return np.vstack([vector(t) for t in texts])
+
+
+def write_pdf(path, pages):
+    doc = fitz.open()
+    for text in pages:
+        doc.new_page().insert_text((72, 72), text)
+    doc.save(str(path))
+    doc.close()
+
+
+@pytest.fixture
+def workspace(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "data").mkdir()
+    return tmp_path
+
+
+def run(monkeypatch, *args, fail_after=None):
+    """One ingest.py run; returns the texts it sent to the embedder."""
+    embedded = []
+    monkeypatch.setattr(ingest, "EmbeddingClient",
+                        lambda **kwargs: FakeClient(embedded, fail_after, **kwargs))
+    monkeypatch.setattr(sys, "argv", ["ingest.py", "--workers", "1", "--no-cache", "--index-factory", "Flat",
+                                      "--chunk-tokens", "8", "--chunk-overlap", "0", *args])
+    ingest.main()
+    return embedded
+
+
+def live_chunks():
+    """{id: text} of the live chunks, checked against the ids in the index"""
+    store = MetadataStore("store")
+    live = {int(i): store.text(int(i)) for i in np.flatnonzero(store.select())}
+    for i in live:
+        assert np.allclose(store.vectors([i])[0], vector(live[i]))
+    store.close()
+    index = faiss.read_index("index.faiss")
+    assert sorted(faiss.vector_to_array(faiss.downcast_index(index).id_map)) == sorted(live)
+    return live
+
+
+def manifest():
+    with open("manifest.json") as f:
+        return json.load(f)
+
+
+POLICY = ["Flood damage to the dwelling is excluded.", "Wind and hail are covered perils."]
+SOP = ["Adjusters inspect the roof within five days."]
+
+
+def test_first_run_embeds_every_page(workspace, monkeypatch):
+    write_pdf(workspace / "data" / "policy.pdf", POLICY)
+    embedded = run(monkeypatch)
+    live = live_chunks()
+    assert sorted(live.values()) == sorted(embedded)
+    assert manifest()["next_id"] == len(live)
+
+
+def test_changed_page_is_the_only_one_reembedded(workspace, monkeypatch):
+    write_pdf(workspace / "data" / "policy.pdf", POLICY)
+    run(monkeypatch)
+    page_one = {i: t for i, t in live_chunks().items() if "Flood" in t or "excluded" in t}
+
+    write_pdf(workspace / "data" / "policy.pdf", [POLICY[0], "Wind is covered, hail is now excluded."])
+    embedded = run(monkeypatch)
+    assert " ".join(embedded) == "Wind is covered, hail is now excluded."
+    live = live_chunks()
+    # Page 1 keeps its ids; page 2's old chunks are gone from the store and the index
+    assert {i: live[i] for i in page_one} == page_one
+    assert "Wind and hail are covered perils." not in " ".join(live.values())
+
+
+def test_removed_file_drops_its_chunks_without_embedding(workspace, monkeypatch):
+    write_pdf(workspace / "data" / "policy.pdf", POLICY)
+    write_pdf(workspace / "data" / "sop.pdf", SOP)
+    run(monkeypatch)
+    stale = [i for p in manifest()["files"]["sop.pdf"]["pages"].values() for i in p["ids"]]
+
+    os.remove(workspace / "data" / "sop.pdf")
+    assert run(monkeypatch) == []
+    live = live_chunks()
+    assert stale and not set(stale) & set(live)
+    assert "roof" not in " ".join(live.values())
+    assert list(manifest()["files"]) == ["policy.pdf"]
+
+
+def test_touched_file_is_not_reembedded(workspace, monkeypatch, capsys):
+    path = workspace / "data" / "policy.pdf"
+    write_pdf(path, POLICY)
+    run(monkeypatch)
+    before = live_chunks()
+
+    os.utime(path, (1_000_000_000, 1_000_000_000))
+    assert run(monkeypatch) == []
+    assert "up to date" in capsys.readouterr().out
+    assert live_chunks() == before
+    # The new timestamp is remembered, so the next run does not even open the PDF
+    assert manifest()["files"]["policy.pdf"]["fingerprint"]["mtime"] == 1_000_000_000
+    opened = []
+    monkeypatch.setattr(ingest, "extract_pages", lambda paths, **kw: opened.extend(paths) or iter(()))
+    assert run(monkeypatch) == []
+    assert opened == []
+
+
+def test_chunking_change_rebuilds_everything(workspace, monkeypatch):
+    write_pdf(workspace / "data" / "policy.pdf", POLICY)
+    run(monkeypatch)
+    embedded = run(monkeypatch, "--chunk-tokens", "4")
+    live = live_chunks()
+    assert sorted(live.values()) == sorted(embedded)
+    assert min(live) == 0
+
+
+def test_run_cut_off_before_the_manifest_is_recovered(workspace, monkeypatch):
+    write_pdf(workspace / "data" / "policy.pdf", POLICY)
+    run(monkeypatch)
+    next_id = manifest()["next_id"]
+
+    # The second run appends one batch to the store, then dies before the
+    # index and manifest are written
+    write_pdf(workspace / "data" / "sop.pdf", SOP + ["Photos of every room are required for the claim."])
+    with pytest.raises(KeyboardInterrupt):
+        run(monkeypatch, "--add-batch", "1", fail_after=1)
+    assert manifest()["next_id"] == next_id
+    orphans = MetadataStore("store")
+    assert len(orphans) == next_id + 1
+    orphans.close()
+
+    embedded = run(monkeypatch)
+    live = live_chunks()
+    # The orphaned row is retired and its id is not handed out again
+    assert next_id not in live
+    assert min(i for i in live if i >= next_id) == next_id + 1
+    assert sorted(t for i, t in live.items() if i > next_id) == sorted(embedded)
+    assert "roof" in " ".join(embedded) and "Photos" in " ".join(embedded)
+    assert manifest()["next_id"] == next_id + 1 + len(embedded)
@@ -0,0 +1,68 @@
+from utils.json_stream import IncrementalJSON, repair_json
+
+
+def feed_all(parser, pieces):
+    events = []
+    for piece in pieces:
+        events.extend(parser.feed(piece))
+    return events
+
+
+def test_string_fields_stream_as_deltas():
+    parser = IncrementalJSON()
+    events = feed_all(parser, ['{"answer": "Flo', 'od is cov', 'ered", "confidence": "high"}'])
+    deltas = "".join(text for kind, field, text in events if kind == "delta" and field == "answer")
+    assert deltas == "Flood is covered"
+    assert ("field", "answer", "Flood is covered") in events
+    assert ("field", "confidence", "high") in events
+    assert parser.done
+    assert parser.close() == {"answer": "Flood is covered", "confidence": "high"}
+
+
+def test_nested_values_are_reported_whole():
+    parser = IncrementalJSON()
+    events = feed_all(parser, ['{"risk_factors": ["a", ', '"b"], "review": {"x": 1}, "n": 2.5}'])
+    fields = {field: value for kind, field, value in events if kind == "field"}
+    assert fields == {"risk_factors": ["a", "b"], "review": {"x": 1}, "n": 2.5}
+    assert not [e for e in events if e[0] == "delta" and e[1] == "risk_factors"]
+
+
+def test_escapes_decode_even_when_split_between_pieces():
+    parser = IncrementalJSON()
+    feed_all(parser, ['{"a": "line\\', 'nnext \\u00', 'e9 \\"q\\""}'])
+    assert parser.close() == {"a": 'line\nnext é "q"'}
+
+
+def test_text_around_the_object_is_ignored():
+    parser = IncrementalJSON()
+    feed_all(parser, ['Sure! ```json\n{"a": 1}', '\n``` and more {"b": 2}'])
+    assert parser.close() == {"a": 1}
+
+
+def test_close_returns_truncated_object():
+    parser = IncrementalJSON()
+    feed_all(parser, ['{"answer": "cut off mid', ' sentence", "citations": [1, 2'])
+    assert parser.close() == {"answer": "cut off mid sentence", "citations": [1, 2]}
+
+
+def test_surrogate_pairs_combine_even_when_split_between_pieces():
+    parser = IncrementalJSON()
+    events = feed_all(parser, ['{"a": "ok \\ud83d', '\\ude00 \\ud83c\\', 'udfe0", "b": 1}'])
+    deltas = [text for kind, field, text in events if kind == "delta"]
+    assert "".join(deltas) == "ok \U0001F600 \U0001F3E0"
+    for text in deltas:
+        text.encode("utf-8")  # no delta ends in half a pair
+
+
+def test_lone_surrogates_are_replaced():
+    assert repair_json('{"a": "x\\ud83d y", "b": "\\ude00", "c": "\\ud83d\\n", "d": "\\ud83d') == \
+        {"a": "x\ufffd y", "b": "\ufffd", "c": "\ufffd\n", "d": "\ufffd"}
+
+
+def test_repair_json_tolerates_python_literals_and_trailing_commas():
+    assert repair_json('{"ok": True, "off": False, "none": None, "items": [1, 2,],}') == \
+        {"ok": True, "off": False, "none": None, "items": [1, 2]}
+
+
+def test_repair_json_without_an_object():
+    assert repair_json("no json here") is None
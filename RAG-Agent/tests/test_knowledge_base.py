@@ -0,0 +1,57 @@
+import os
+
+import numpy as np
+import pytest
+
+pytest.importorskip("faiss")
+
+
+def search(snapshot, vector):
+    _, ids = snapshot.index.search(vector.reshape(1, -1), 1)
+    return snapshot.store.text(int(ids[0, 0]))
+
+
+def test_nothing_is_loaded_before_first_use(write_knowledge_base, open_knowledge_base):
+    loaded = []
+    kb = open_knowledge_base(write_knowledge_base(12), on_load=lambda new, old: loaded.append((new, old)))
+    assert kb.stats["loads"] == 0 and loaded == []
+    snapshot = kb.current()
+    assert kb.current() is snapshot
+    assert loaded == [(snapshot, None)]
+    assert snapshot.store.live_count() == 12 and snapshot.lexical is not None
+
+
+def test_reload_swaps_in_a_new_version(write_knowledge_base, open_knowledge_base):
+    loaded = []
+    path = write_knowledge_base(12)
+    kb = open_knowledge_base(path, on_load=lambda new, old: loaded.append((new, old)))
+    old = kb.current()
+    assert kb.reload() is False  # nothing new on disk
+
+    write_knowledge_base(20, seed=1)
+    assert kb.reload() is True
+    new = kb.current()
+    assert new.version != old.version and new.version == kb.version_on_disk()
+    assert new.store.live_count() == 20 and new.index.ntotal == 20
+    assert loaded[-1] == (new, old) and kb.stats["loads"] == 2
+
+    # A query that took the old snapshot before the swap still finishes against it
+    old_vector = old.store.vectors([3])[0]
+    assert old.index.ntotal == 12
+    assert search(old, old_vector) == "chunk 3"
+    assert np.allclose(old.store.vectors([3])[0], old_vector)
+
+
+def test_failed_reload_keeps_serving_the_current_version(write_knowledge_base, open_knowledge_base):
+    path = write_knowledge_base(12)
+    kb = open_knowledge_base(path)
+    current = kb.current()
+    with open(path / "index.faiss.tmp", "wb") as f:
+        f.write(b"not an index")
+    os.replace(path / "index.faiss.tmp", path / "index.faiss")
+    with open(path / "manifest.json", "a") as f:
+        f.write(" ")
+    with pytest.raises(RuntimeError):
+        kb.reload()
+    assert kb.current() is current
+    assert search(current, current.store.vectors([5])[0]) == "chunk 5"
@@ -0,0 +1,113 @@
+import numpy as np
+
+from utils.lexical import LexicalIndex, build_lexical_index, looks_like_code, tokenize
+from utils.store import StoreWriter
+
+
+def make_store(path, texts, deleted=()):
+    writer = StoreWriter(str(path))
+    writer.append(list(range(len(texts))), texts,
+                  [{"source": f"doc{i}.pdf", "type": "policy", "page": 1} for i in range(len(texts))])
+    writer.delete(list(deleted))
+    writer.close()
+
+
+TEXTS = [
+    "Flood damage is excluded under form HO-3.",
+    "The NFIP flood policy covers flood damage to the building.",
+    "Fire damage is covered.",
+    "Claims filed after 11/2023 use form FF-206-FY-22.",
+]
+
+
+def test_tokenize_keeps_codes_whole_and_split():
+    assert tokenize("Form HO-3, filed 11/2023.") == ["form", "ho-3", "ho", "3", "filed", "11/2023", "11", "2023"]
+
+
+def test_looks_like_code():
+    assert looks_like_code("HO-3 FF-206")
+    assert not looks_like_code("what does HO-3 cover")
+    assert not looks_like_code("")
+
+
+def test_bm25_ranks_matching_chunks(tmp_path):
+    make_store(tmp_path / "store", TEXTS)
+    terms = build_lexical_index(str(tmp_path / "store"), str(tmp_path / "lexical"))
+    index = LexicalIndex(str(tmp_path / "lexical"))
+    assert len(index) == terms
+    scores, ids = index.search("flood damage", top_k=3)
+    assert ids.tolist()[:2] == [1, 0]  # two "flood"s beat one
+    assert 2 in ids.tolist()  # "damage" alone still matches
+    assert np.all(np.diff(scores) <= 0)
+    assert index.search("FF-206-FY-22", top_k=5)[1].tolist() == [3]
+    assert index.search("earthquake", top_k=5)[1].tolist() == []
+
+
+def test_mask_and_deleted_chunks(tmp_path):
+    make_store(tmp_path / "store", TEXTS, deleted=[1])
+    build_lexical_index(str(tmp_path / "store"), str(tmp_path / "lexical"))
+    index = LexicalIndex(str(tmp_path / "lexical"))
+    assert index.search("flood", top_k=5)[1].tolist() == [0]
+    mask = np.array([False, False, True, True])
+    assert index.search("damage", top_k=5, mask=mask)[1].tolist() == [2]
+
+
+def test_rebuild_replaces_the_index(tmp_path):
+    make_store(tmp_path / "store", TEXTS[:2])
+    build_lexical_index(str(tmp_path / "store"), str(tmp_path / "lexical"))
+    make_store(tmp_path / "store2", TEXTS)
+    build_lexical_index(str(tmp_path / "store2"), str(tmp_path / "lexical"))
+    assert LexicalIndex(str(tmp_path / "lexical")).search("fire", top_k=5)[1].tolist() == [2]
+    assert not (tmp_path / "lexical.tmp").exists()
+
+
+def search_all(path, queries=("flood damage", "form", "HO-3 fire", "covered building", "11/2023")):
+    index = LexicalIndex(str(path))
+    return [[(round(float(s), 5), int(i)) for s, i in zip(*index.search(q, top_k=10))] for q in queries]
+
+
+def test_incremental_build_matches_a_rebuild(tmp_path, monkeypatch):
+    monkeypatch.setattr("utils.lexical.SEGMENT_ROWS", 2)
+    monkeypatch.setattr("utils.lexical.MERGE_POSTINGS", 3)
+    make_store(tmp_path / "store", TEXTS[:3])
+    build_lexical_index(str(tmp_path / "store"), str(tmp_path / "lexical"))
+
+    writer = StoreWriter(str(tmp_path / "store"))
+    more = TEXTS[3:] + ["Fire at the insured building, form HO-3.", "Flood form."]
+    writer.append(list(range(3, 3 + len(more))), more,
+                  [{"source": "new.pdf", "type": "policy", "page": 1}] * len(more))
+    writer.delete([1])
+    writer.close()
+
+    terms = build_lexical_index(str(tmp_path / "store"), str(tmp_path / "lexical"))
+    rebuilt = build_lexical_index(str(tmp_path / "store"), str(tmp_path / "rebuilt"), rebuild=True)
+    assert terms == rebuilt
+    assert search_all(tmp_path / "lexical") == search_all(tmp_path / "rebuilt")
+    assert 1 not in LexicalIndex(str(tmp_path / "lexical")).search("nfip flood", top_k=10)[1]
+    assert not list(tmp_path.glob("lexical*/segment-*"))
+
+
+def test_index_ahead_of_the_store_is_rebuilt(tmp_path):
+    make_store(tmp_path / "store", TEXTS)
+    build_lexical_index(str(tmp_path / "store"), str(tmp_path / "lexical"))
+    make_store(tmp_path / "smaller", TEXTS[2:])
+    build_lexical_index(str(tmp_path / "smaller"), str(tmp_path / "lexical"))
+    assert LexicalIndex(str(tmp_path / "lexical")).search("fire", top_k=5)[1].tolist() == [0]
+
+
+def test_store_with_no_live_chunks(tmp_path):
+    make_store(tmp_path / "store", TEXTS, deleted=range(len(TEXTS)))
+    assert build_lexical_index(str(tmp_path / "store"), str(tmp_path / "lexical")) == 0
+    assert LexicalIndex(str(tmp_path / "lexical")).search("flood", top_k=5)[1].tolist() == []
+
+
+def test_max_score_bounds_every_hit(tmp_path):
+    make_store(tmp_path / "store", TEXTS)
+    build_lexical_index(str(tmp_path / "store"), str(tmp_path / "lexical"))
+    index = LexicalIndex(str(tmp_path / "lexical"))
+    for query in ("flood damage", "FF-206-FY-22", "fire"):
+        scores, _ = index.search(query, top_k=5)
+        assert 0 < scores.max() < index.max_score(query)
+    # A lone match is not the reference: a partial one scores well below it
+    assert index.search("fire earthquake flood", top_k=1)[0][0] < 0.5 * index.max_score("fire earthquake flood")
+    assert index.max_score("earthquake") == 0.0
@@ -0,0 +1,59 @@
+import pytest
+
+from utils.model_residency import ModelResidency
+
+
+class Response:
+    def __init__(self, payload):
+        self.payload = payload
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return self.payload
+
+
+class FakeSession:
+    """Answers /api/generate with a fixed load_duration (nanoseconds), recording request bodies"""
+
+    def __init__(self, load_duration):
+        self.load_duration = load_duration
+        self.bodies = []
+
+    def post(self, url, json, timeout):
+        self.bodies.append(json)
+        return Response({"done": True, "load_duration": self.load_duration})
+
+
+def test_record_counts_cold_loads_from_load_duration():
+    residency = ModelResidency("llama3.2", cold_load_ms=500)
+    timings = {}
+    assert residency.record({"done": True, "load_duration": 2_345_678_900}, timings) is True
+    assert timings == {"load_ms": 2345.7, "cold_load": True}
+    assert residency.record({"done": True, "load_duration": 12_000_000}) is False
+    assert residency.record({"done": True}) is False  # no load reported
+    stats = residency.snapshot()
+    assert stats["generations"] == 3 and stats["cold_loads"] == 1
+    assert stats["load_ms_total"] == 2345.7 and stats["last_cold_load"] is not None
+
+
+def test_snapshot_is_a_copy():
+    residency = ModelResidency("llama3.2")
+    residency.snapshot()["generations"] = 10
+    assert residency.snapshot()["generations"] == 0
+
+
+@pytest.mark.parametrize("keep_alive, sent", [("30m", "30m"), ("-1", -1), ("0", 0), ("3600", 3600)])
+def test_keep_alive_is_sent_the_way_ollama_reads_it(keep_alive, sent):
+    assert ModelResidency("llama3.2", keep_alive=keep_alive).options() == {"keep_alive": sent}
+
+
+def test_warm_up_loads_the_model_without_generating():
+    session = FakeSession(load_duration=900_000_000)
+    residency = ModelResidency("llama3.2", keep_alive="2h", session=session)
+    result = residency.warm_up()
+    assert result["load_ms"] == 900.0 and result["cold_load"] is True
+    assert session.bodies == [{"model": "llama3.2", "prompt": "", "stream": False, "keep_alive": "2h"}]
+    # A warm-up is not a generation
+    assert residency.snapshot()["warm_ups"] == 1 and residency.snapshot()["generations"] == 0
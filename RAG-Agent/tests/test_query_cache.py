@@ -0,0 +1,63 @@
+import asyncio
+
+import numpy as np
+import pytest
+
+
+@pytest.fixture
+def embedded(agent1, monkeypatch):
+    """Texts that reached the embedder, with a fresh two-entry query cache in front of it"""
+    calls = []
+
+    def embed(text):
+        calls.append(text)
+        return np.array([len(text), 1.0], dtype=np.float32)
+
+    monkeypatch.setattr(agent1, "query_cache", agent1.QueryCache(2))
+    monkeypatch.setattr(agent1.embedder, "embed", embed)
+    monkeypatch.setattr(agent1, "embedder_down_until", 0.0)
+    return calls
+
+
+def test_least_recently_used_entry_is_dropped(agent1):
+    cache = agent1.QueryCache(2)
+    cache.put("a", np.zeros(2))
+    cache.put("b", np.ones(2))
+    assert cache.get("a") is not None  # "b" is now the oldest
+    cache.put("c", np.ones(2))
+    assert cache.get("b") is None and cache.get("c") is not None
+    assert cache.stats() == {"hits": 2, "misses": 1, "size": 2}
+
+
+def test_cached_vectors_are_read_only(agent1):
+    cache = agent1.QueryCache(1)
+    cache.put("a", np.zeros(2))
+    with pytest.raises(ValueError):
+        cache.get("a")[0] = 1.0
+
+
+def test_repeated_queries_are_embedded_once(agent1, embedded):
+    first = agent1.get_embedding("HO-3 policy, roof damage")
+    assert agent1.get_embedding("HO-3 policy, roof damage") is first
+    assert embedded == ["HO-3 policy, roof damage"]
+    assert agent1.query_cache_stats() == {"hits": 1, "misses": 1, "size": 1}
+
+
+def test_case_context_is_embedded_once_per_case(agent1, embedded, monkeypatch):
+    async def embed(text):
+        return agent1.embedder.embed(text)
+
+    async def ask_twice():
+        await agent1.embed_case_query_async("HO-3 policy", "Is flood covered?")
+        await agent1.embed_case_query_async("HO-3 policy", "What about wind?")
+
+    monkeypatch.setattr(agent1.ollama, "embed", embed)
+    asyncio.run(ask_twice())
+    assert embedded == ["HO-3 policy", "Is flood covered?", "What about wind?"]
+
+
+def test_blended_vector_is_unit_length(agent1):
+    context, question = np.array([1.0, 0.0]), np.array([0.0, 1.0])
+    blended = agent1.blend_vectors(context, question, 0.25)
+    assert np.allclose(blended, np.array([0.25, 0.75]) / np.linalg.norm([0.25, 0.75]))
+    assert agent1.blend_vectors(None, question, 0.25) is None
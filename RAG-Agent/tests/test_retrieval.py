@@ -0,0 +1,78 @@
+import numpy as np
+import pytest
+
+pytest.importorskip("faiss")
+
+from utils.store import StoreWriter
+
+
+@pytest.fixture
+def kb(write_knowledge_base, open_knowledge_base):
+    """64 chunks under HNSW over 8-bit codes, with chunk 9 deleted after indexing"""
+    path = write_knowledge_base(64)
+    writer = StoreWriter(str(path / "store"))
+    writer.delete([9])
+    writer.close()
+    return open_knowledge_base(path).current()
+
+
+def exact_ranking(kb, query):
+    live = np.flatnonzero(kb.store.select())
+    similarities = kb.store.vectors(live) @ query
+    return live[np.argsort(-similarities, kind="stable")]
+
+
+def test_quantized_index_is_rescored(kb):
+    assert kb.info["approximate"] and kb.info["rescore"]
+
+
+def test_rescore_exact_ranks_candidates_by_full_precision_cosine(agent1, kb):
+    query = kb.store.vectors([5])[0] + 0.1 * kb.store.vectors([7])[0]
+    similarities, ids = agent1.rescore_exact(kb, query, np.array([-1, 7, 9, 3, 5, 200]), top_k=3)
+    # -1 padding, the deleted chunk and an id past the store are dropped
+    candidates = np.array([7, 3, 5])
+    exact = kb.store.vectors(candidates) @ query / np.linalg.norm(query)
+    order = np.argsort(-exact)
+    assert ids.tolist() == candidates[order].tolist()
+    assert np.allclose(similarities, exact[order], atol=1e-6)
+
+
+def test_rescore_exact_with_no_live_candidates(agent1, kb):
+    similarities, ids = agent1.rescore_exact(kb, kb.store.vectors([0])[0], np.array([-1, 9]), top_k=3)
+    assert len(similarities) == len(ids) == 0
+
+
+def test_two_stage_search_matches_exact_search(agent1, kb):
+    queries = kb.store.vectors([1, 2, 3]) + 0.05
+    for query, (similarities, ids) in zip(queries, agent1.search_vectors(kb, queries, top_k=5, candidates=32)):
+        assert ids.tolist() == exact_ranking(kb, query)[:5].tolist()
+        assert np.all(np.diff(similarities) <= 0)
+        assert 9 not in ids
+
+
+def test_retrieve_many_answers_each_query_in_order(agent1, kb):
+    queries = ["chunk 4", "chunk 10", "chunk 4", "chunk 21"]
+    embeddings = [kb.store.vectors([4])[0], kb.store.vectors([10])[0], kb.store.vectors([4])[0], None]
+    results = agent1.retrieve_many(queries, top_k=4, query_embeddings=embeddings, kb=kb)
+    assert [r[0]["metadata"]["id"] for r in results] == [4, 10, 4, 21]
+    # The same query in one batch gets the same answer; a missing vector falls back to BM25
+    assert results[0] == results[2]
+    assert [r[0]["retrieval"] for r in results] == ["hybrid", "hybrid", "hybrid", "lexical"]
+    for query, embedding, batched in zip(queries[:3], embeddings, results):
+        assert agent1.retrieve_context(query, top_k=4, query_embedding=embedding, kb=kb) == batched
+
+
+def test_chunks_found_by_both_retrievers_are_listed_once(agent1, kb):
+    for results in agent1.retrieve_many(["chunk 4", "chunk 30"], top_k=10,
+                                        query_embeddings=kb.store.vectors([4, 30]), kb=kb):
+        ids = [r["metadata"]["id"] for r in results]
+        assert len(ids) == len(set(ids)) == 10
+        scores = [r["relevance_score"] for r in results]
+        assert scores == sorted(scores, reverse=True)
+
+
+def test_retrieve_many_filters_every_query(agent1, kb):
+    results = agent1.retrieve_many(["chunk 4", "chunk 5"], top_k=3, query_embeddings=kb.store.vectors([4, 5]),
+                                   doc_types=["sop"], kb=kb)
+    assert [[r["metadata"]["type"] for r in rs] for rs in results] == [["sop"] * 3] * 2
+    assert agent1.retrieve_many([], kb=kb) == []
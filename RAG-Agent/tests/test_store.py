@@ -0,0 +1,97 @@
+import numpy as np
+import pytest
+
+from utils.store import MetadataStore, StoreWriter, replace_store
+
+
+def meta(source, type, page):
+    return {"source": source, "type": type, "page": page, "chunk": 0, "char_start": 0, "char_end": 5}
+
+
+def write(path, rows, start=0, vectors=True):
+    writer = StoreWriter(str(path))
+    ids = list(range(start, start + len(rows)))
+    vecs = np.arange(len(rows) * 4, dtype=np.float32).reshape(len(rows), 4) + start if vectors else None
+    writer.append(ids, [text for text, _ in rows], [m for _, m in rows], vecs)
+    return writer
+
+
+ROWS = [
+    ("flood cover", meta("policy_1.pdf", "policy", 1)),
+    ("sop steps ✓", meta("sop_manual.pdf", "sop", 2)),
+    ("fema rule", meta("regulation.pdf", "regulation", 3)),
+]
+
+
+def test_round_trip(tmp_path):
+    write(tmp_path / "store", ROWS).close()
+    store = MetadataStore(str(tmp_path / "store"))
+    assert len(store) == 3 and store.live_count() == 3
+    assert store.text(1) == "sop steps ✓"
+    assert store.metadata(2) == dict(meta("regulation.pdf", "regulation", 3), id=2)
+    assert store.has_vectors
+    np.testing.assert_array_equal(store.vectors([2, 0]), [[8, 9, 10, 11], [0, 1, 2, 3]])
+    store.close()
+
+
+def test_delete_hides_rows_and_select_filters(tmp_path):
+    writer = write(tmp_path / "store", ROWS)
+    writer.delete([0])
+    writer.close()
+    store = MetadataStore(str(tmp_path / "store"))
+    assert store.text(0) is None and store.metadata(0) is None
+    assert store.live_count() == 2
+    assert store.select().tolist() == [False, True, True]
+    assert store.select(types=["sop", "policy"]).tolist() == [False, True, False]
+    assert store.select(sources=["regulation.pdf"]).tolist() == [False, False, True]
+    assert store.select(types=["sop"]) is store.select(types=["sop"])  # cached
+    store.close()
+
+
+def test_appends_continue_in_id_order(tmp_path):
+    write(tmp_path / "store", ROWS[:2]).close()
+    writer = StoreWriter(str(tmp_path / "store"))
+    assert writer.rows == 2
+    with pytest.raises(ValueError):
+        writer.append([5], ["gap"], [ROWS[0][1]])
+    writer.append([2], [ROWS[2][0]], [ROWS[2][1]], np.ones((1, 4), dtype=np.float32))
+    writer.close()
+    store = MetadataStore(str(tmp_path / "store"))
+    assert len(store) == 3 and store.text(2) == "fema rule"
+    np.testing.assert_array_equal(store.vectors([2]), np.ones((1, 4)))
+    store.close()
+
+
+def test_half_written_rows_are_dropped_on_reopen(tmp_path):
+    write(tmp_path / "store", ROWS).close()
+    # A run that died after writing only some columns of a fourth row
+    with open(tmp_path / "store" / "page.i32", "ab") as f:
+        np.array([9], dtype=np.int32).tofile(f)
+    writer = StoreWriter(str(tmp_path / "store"))
+    assert writer.rows == 3
+    writer.close()
+    assert (tmp_path / "store" / "page.i32").stat().st_size == 3 * 4
+
+
+def test_store_without_vectors(tmp_path):
+    write(tmp_path / "store", ROWS, vectors=False).close()
+    store = MetadataStore(str(tmp_path / "store"))
+    assert not store.has_vectors
+    with pytest.raises(ValueError):
+        store.vectors([0])
+    store.close()
+
+
+def test_replace_store_swaps_directories(tmp_path):
+    write(tmp_path / "store", ROWS[:1]).close()
+    write(tmp_path / "store.tmp", ROWS).close()
+    replace_store(str(tmp_path / "store.tmp"), str(tmp_path / "store"))
+    assert not (tmp_path / "store.tmp").exists() and not (tmp_path / "store.old").exists()
+    store = MetadataStore(str(tmp_path / "store"))
+    assert len(store) == 3
+    store.close()
+
+
+def test_missing_store_raises(tmp_path):
+    with pytest.raises(FileNotFoundError):
+        MetadataStore(str(tmp_path / "nowhere"))
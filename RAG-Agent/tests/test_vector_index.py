@@ -0,0 +1,85 @@
+import gc
+import weakref
+
+import faiss
+import numpy as np
+import pytest
+
+from utils.vector_index import build_index, can_remove_ids, search_params, uses_chunk_ids
+
+FACTORIES = ["Flat", "IVF16,Flat", "HNSW16", "PCA16,IVF16,Flat", "OPQ4_16,Flat", "SQ8"]
+
+
+def filled_index(factory, n=1000, d=32):
+    rng = np.random.default_rng(0)
+    vectors = rng.standard_normal((n, d)).astype("float32")
+    index = build_index(factory, d)
+    index.train(vectors)
+    index.add_with_ids(vectors, np.arange(n, dtype="int64"))
+    return index, vectors
+
+
+@pytest.mark.parametrize("factory", FACTORIES)
+def test_filtered_search_only_returns_selected_ids(factory):
+    index, vectors = filled_index(factory)
+    mask = np.zeros(index.ntotal, dtype=bool)
+    mask[::9] = True
+    params = search_params(index, nprobe=16, ef_search=64, mask=mask)
+    gc.collect()
+    _ = [np.ones(1000) for _ in range(100)]  # reuse any memory freed too early
+    _, ids = index.search(vectors[:20] + 0.01, 5, params=params)
+    assert (ids >= 0).all()
+    assert mask[ids].all()
+    assert ids[0, 0] == 0  # row 0 is selected and its own nearest neighbour
+
+
+def test_selector_lives_as_long_as_the_parameters(monkeypatch):
+    created = []
+    for name in ("IDSelectorBitmap", "IDSelectorTranslated"):
+        def make(*args, _real=getattr(faiss, name)):
+            selector = _real(*args)
+            created.append(weakref.ref(selector))
+            return selector
+        monkeypatch.setattr(faiss, name, make)
+
+    index, _ = filled_index("PCA16,Flat")
+    params = search_params(index, mask=np.ones(index.ntotal, dtype=bool))
+    assert len(created) == 2  # the bitmap and its ID translation
+    gc.collect()
+    assert all(ref() is not None for ref in created)
+    del params
+    gc.collect()
+    assert all(ref() is None for ref in created)
+
+
+def test_no_parameters_when_nothing_applies():
+    index, _ = filled_index("Flat")
+    assert search_params(index, nprobe=8, ef_search=64) is None
+    assert isinstance(search_params(filled_index("IVF16,Flat")[0], nprobe=8), faiss.SearchParametersIVF)
+
+
+@pytest.mark.parametrize("factory", FACTORIES)
+def test_built_indexes_use_chunk_ids(factory):
+    index = build_index(factory, 32)
+    assert uses_chunk_ids(index)
+    wrapped = isinstance(faiss.downcast_index(index), faiss.IndexIDMap2)
+    assert wrapped == ("IVF" not in factory)
+    assert can_remove_ids(index) == ("HNSW" not in factory)
+
+
+def test_ivf_under_an_id_map_is_rebuilt():
+    index = faiss.IndexIDMap2(faiss.index_factory(32, "IVF16,Flat"))
+    assert not uses_chunk_ids(index)
+
+
+@pytest.mark.parametrize("factory", ["IVF16,Flat", "PCA16,IVF16,Flat", "Flat"])
+def test_removed_ids_leave_the_rest_addressable(factory):
+    index, vectors = filled_index(factory)
+    removed = np.arange(0, 1000, 3, dtype="int64")
+    assert index.remove_ids(removed) == len(removed)
+    live = np.setdiff1d(np.arange(1000), removed)
+    params = search_params(index, nprobe=16)
+    _, ids = index.search(vectors[live], 1, params=params)
+    assert index.ntotal == len(live)
+    assert (ids[:, 0] == live).mean() > 0.95
+    assert not np.isin(ids, removed).any()
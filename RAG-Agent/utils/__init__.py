@@ -0,0 +1,3 @@
+"""
+Shared helpers for the RAG agent (ingestion and query-time retrieval).
+"""
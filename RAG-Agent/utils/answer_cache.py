@@ -0,0 +1,186 @@
+"""
+ANSWER CACHE
+SQLite-backed store of finished agent responses, looked up by exact case
+text or by embedding similarity, and tied to the index version they came from
+"""
+
+import hashlib
+import json
+import re
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+ANSWER_CACHE_PATH = "answer_cache.sqlite"
+
+
+def normalize(text: str) -> str:
+    """Case, whitespace and trailing punctuation don't change the question."""
+    return re.sub(r"\s+", " ", text).strip().strip(".?!").strip().lower()
+
+
+class AnswerCache:
+    """
+    Two-tier answer cache shared by every agent process.
+
+    - exact tier: sha256 of the normalized case context and question
+    - similarity tier: cosine similarity of the query embedding against
+      cached queries, accepted at or above `similarity`; off when it is None
+
+    Entries carry the index version they were answered from and are only
+    served to callers on the same version, and a `scope` (document filters
+    and the like) that must match as well. Entries expire after `ttl`
+    seconds, and the least recently used ones are evicted beyond
+    `max_entries`.
+    """
+
+    def __init__(self, path: str = ANSWER_CACHE_PATH, max_entries: int = 5000,
+                 ttl: float = 24 * 3600, similarity: Optional[float] = None):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.similarity = similarity
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS answers ("
+            " key TEXT PRIMARY KEY,"
+            " version TEXT NOT NULL,"
+            " scope TEXT NOT NULL,"
+            " response TEXT NOT NULL,"
+            " vector BLOB,"
+            " created REAL NOT NULL,"
+            " last_used REAL NOT NULL)"
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_answers_last_used ON answers(last_used)")
+        self.conn.commit()
+        self.stats = {"exact_hits": 0, "similar_hits": 0, "misses": 0, "evictions": 0}
+
+        # In-memory copy of the cached query vectors for the similarity tier,
+        # reloaded after our own writes and whenever data_version shows
+        # another connection has written
+        self._vectors_version = None
+        self._data_version = None
+        self._keys: List[str] = []
+        self._scopes = np.zeros(0, dtype=object)
+        self._matrix = np.zeros((0, 0), dtype="float32")
+
+    @staticmethod
+    def key(case_context: str, question: str, scope: str = "") -> str:
+        text = f"{normalize(case_context)}\0{normalize(question)}\0{scope}"
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+    # ------------------------------------------------------------------------
+    # Lookups
+    # ------------------------------------------------------------------------
+
+    def get(self, case_context: str, question: str, version: str,
+            scope: str = "") -> Optional[Tuple[Dict, Dict]]:
+        """Exact tier. Returns (response, hit info) or None."""
+        key = self.key(case_context, question, scope)
+        with self._lock:
+            row = self.conn.execute(
+                "SELECT response, created FROM answers WHERE key = ? AND version = ? AND created >= ?",
+                (key, version, time.time() - self.ttl)
+            ).fetchone()
+            if row is None:
+                return None
+            self._touch(key)
+            self.stats["exact_hits"] += 1
+        return json.loads(row[0]), {"hit": "exact", "cached_at": row[1]}
+
+    def get_similar(self, vector: np.ndarray, version: str,
+                    scope: str = "") -> Optional[Tuple[Dict, Dict]]:
+        """Similarity tier. Returns (response, hit info) or None."""
+        if self.similarity is None:
+            return None
+        with self._lock:
+            self._refresh_vectors(version)
+            if not len(self._keys) or vector is None or self._matrix.shape[1] != len(vector):
+                self.stats["misses"] += 1
+                return None
+            query = vector / (np.linalg.norm(vector) or 1.0)
+            scores = np.where(self._scopes == scope, self._matrix @ query, -np.inf)
+            best = int(np.argmax(scores))
+            if scores[best] < self.similarity:
+                self.stats["misses"] += 1
+                return None
+            row = self.conn.execute(
+                "SELECT response, created FROM answers WHERE key = ? AND created >= ?",
+                (self._keys[best], time.time() - self.ttl)
+            ).fetchone()
+            if row is None:
+                self.stats["misses"] += 1
+                return None
+            self._touch(self._keys[best])
+            self.stats["similar_hits"] += 1
+        return json.loads(row[0]), {"hit": "similar", "similarity": float(scores[best]),
+                                    "cached_at": row[1]}
+
+    def _refresh_vectors(self, version: str):
+        data_version = self.conn.execute("PRAGMA data_version").fetchone()[0]
+        if version == self._vectors_version and data_version == self._data_version:
+            return
+        rows = self.conn.execute(
+            "SELECT key, scope, vector FROM answers"
+            " WHERE version = ? AND vector IS NOT NULL AND created >= ?",
+            (version, time.time() - self.ttl)
+        ).fetchall()
+        self._keys = [k for k, _, _ in rows]
+        self._scopes = np.array([scope for _, scope, _ in rows], dtype=object)
+        if rows:
+            matrix = np.vstack([np.frombuffer(blob, dtype="float32") for _, _, blob in rows])
+            norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+            self._matrix = matrix / np.where(norms == 0, 1, norms)
+        else:
+            self._matrix = np.zeros((0, 0), dtype="float32")
+        self._vectors_version, self._data_version = version, data_version
+
+    def _touch(self, key: str):
+        try:
+            self.conn.execute("UPDATE answers SET last_used = ? WHERE key = ?", (time.time(), key))
+            self.conn.commit()
+        except sqlite3.OperationalError:
+            self.conn.rollback()
+
+    # ------------------------------------------------------------------------
+    # Inserts and eviction
+    # ------------------------------------------------------------------------
+
+    def put(self, case_context: str, question: str, version: str, response: Dict,
+            vector: Optional[np.ndarray] = None, scope: str = ""):
+        now = time.time()
+        blob = None if vector is None else np.ascontiguousarray(vector, dtype="float32").tobytes()
+        with self._lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO answers"
+                " (key, version, scope, response, vector, created, last_used)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (self.key(case_context, question, scope), version, scope,
+                 json.dumps(response, default=float), blob, now, now)
+            )
+            self._evict(version, now)
+            self.conn.commit()
+            self._vectors_version = None
+
+    def _evict(self, version: str, now: float):
+        # Answers from other index versions or past their TTL are dead weight
+        removed = self.conn.execute(
+            "DELETE FROM answers WHERE version != ? OR created < ?", (version, now - self.ttl)
+        ).rowcount
+        total = self.conn.execute("SELECT COUNT(*) FROM answers").fetchone()[0]
+        if total > self.max_entries:
+            removed += self.conn.execute(
+                "DELETE FROM answers WHERE key IN"
+                " (SELECT key FROM answers ORDER BY last_used LIMIT ?)",
+                (total - self.max_entries,)
+            ).rowcount
+        self.stats["evictions"] += removed
+
+    def close(self):
+        self.conn.close()
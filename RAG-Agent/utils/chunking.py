@@ -0,0 +1,119 @@
+"""
+TEXT CHUNKING
+Splits page text into overlapping chunks with character offsets
+"""
+
+import re
+from dataclasses import dataclass, asdict
+from typing import Dict, List, Tuple
+
+CHUNK_MODES = ("tokens", "paragraph", "page")
+
+_TOKEN = re.compile(r"\S+")
+_PARAGRAPH_BREAK = re.compile(r"\n\s*\n")
+
+
+@dataclass
+class Chunk:
+    """One piece of a page. Offsets index into the page text."""
+    text: str
+    page: int
+    chunk: int
+    char_start: int
+    char_end: int
+
+    def to_dict(self) -> Dict:
+        return asdict(self)
+
+
+@dataclass
+class ChunkConfig:
+    """How pages are split. Stored in the manifest so a change forces a rebuild."""
+    mode: str = "tokens"
+    max_tokens: int = 200
+    overlap: int = 40
+
+    def __post_init__(self):
+        if self.mode not in CHUNK_MODES:
+            raise ValueError(f"chunk mode must be one of {CHUNK_MODES}, got {self.mode!r}")
+        if self.max_tokens < 1:
+            raise ValueError("max_tokens must be at least 1")
+        if not 0 <= self.overlap < self.max_tokens:
+            raise ValueError("overlap must be >= 0 and smaller than max_tokens")
+
+    def to_dict(self) -> Dict:
+        return asdict(self)
+
+
+# ============================================================================
+# SPLITTERS
+# ============================================================================
+
+def _token_spans(text: str, start: int = 0, end: int = None) -> List[Tuple[int, int]]:
+    return [m.span() for m in _TOKEN.finditer(text, start, len(text) if end is None else end)]
+
+
+def _windows(spans: List[Tuple[int, int]], max_tokens: int, overlap: int) -> List[Tuple[int, int]]:
+    """Group token spans into (char_start, char_end) windows with overlap."""
+    windows = []
+    step = max_tokens - overlap
+    for first in range(0, len(spans), step):
+        last = min(first + max_tokens, len(spans)) - 1
+        windows.append((spans[first][0], spans[last][1]))
+        if last == len(spans) - 1:
+            break
+    return windows
+
+
+def _paragraph_windows(text: str, max_tokens: int, overlap: int) -> List[Tuple[int, int]]:
+    """
+    Pack whole paragraphs into windows of at most max_tokens. A paragraph
+    longer than that is split by token window on its own.
+    """
+    paragraphs = []
+    start = 0
+    for brk in _PARAGRAPH_BREAK.finditer(text):
+        paragraphs.append((start, brk.start()))
+        start = brk.end()
+    paragraphs.append((start, len(text)))
+
+    windows = []
+    current = None  # (char_start, char_end, token_count)
+    for p_start, p_end in paragraphs:
+        spans = _token_spans(text, p_start, p_end)
+        if not spans:
+            continue
+        if len(spans) > max_tokens:
+            if current:
+                windows.append(current[:2])
+                current = None
+            windows.extend(_windows(spans, max_tokens, overlap))
+            continue
+        if current and current[2] + len(spans) <= max_tokens:
+            current = (current[0], spans[-1][1], current[2] + len(spans))
+        else:
+            if current:
+                windows.append(current[:2])
+            current = (spans[0][0], spans[-1][1], len(spans))
+    if current:
+        windows.append(current[:2])
+    return windows
+
+
+def chunk_page(text: str, page: int, config: ChunkConfig) -> List[Chunk]:
+    """Split one page of text into chunks according to `config`."""
+    if config.mode == "page":
+        stripped = text.strip()
+        if not stripped:
+            return []
+        start = text.index(stripped)
+        windows = [(start, start + len(stripped))]
+    elif config.mode == "paragraph":
+        windows = _paragraph_windows(text, config.max_tokens, config.overlap)
+    else:
+        windows = _windows(_token_spans(text), config.max_tokens, config.overlap)
+
+    return [
+        Chunk(text=text[s:e], page=page, chunk=n, char_start=s, char_end=e)
+        for n, (s, e) in enumerate(windows)
+    ]
@@ -0,0 +1,143 @@
+"""
+CONTEXT PACKING
+Fits retrieved passages into a token budget for the generation prompt
+"""
+
+import math
+import re
+from dataclasses import dataclass, field, asdict
+from typing import Dict, List, Tuple
+
+_TOKEN = re.compile(r"\S+")
+
+# Llama-style tokenizers average about 1.3 tokens per whitespace word on
+# English policy text; close enough to budget a prompt without a tokenizer
+TOKENS_PER_WORD = 1.3
+# A passage trimmed below this many tokens is dropped instead
+MIN_PASSAGE_TOKENS = 40
+
+
+def count_tokens(text: str) -> int:
+    """Estimated model tokens in `text`."""
+    return math.ceil(len(_TOKEN.findall(text)) * TOKENS_PER_WORD)
+
+
+def _truncate(text: str, max_tokens: int) -> str:
+    """The longest word-aligned prefix of `text` within max_tokens."""
+    words = int(max_tokens / TOKENS_PER_WORD)
+    spans = [m.span() for m in _TOKEN.finditer(text)]
+    if words >= len(spans):
+        return text
+    return text[:spans[words - 1][1]] if words else ""
+
+
+def _shingles(text: str, n: int = 3) -> set:
+    words = text.lower().split()
+    return {" ".join(words[i:i + n]) for i in range(max(1, len(words) - n + 1))}
+
+
+def _uncovered(start: int, end: int, covered: List[Tuple[int, int]]) -> Tuple[int, int]:
+    """Longest part of [start, end) outside the covered ranges."""
+    pieces = [(start, end)]
+    for c_start, c_end in covered:
+        next_pieces = []
+        for p_start, p_end in pieces:
+            if c_end <= p_start or c_start >= p_end:
+                next_pieces.append((p_start, p_end))
+                continue
+            if p_start < c_start:
+                next_pieces.append((p_start, c_start))
+            if c_end < p_end:
+                next_pieces.append((c_end, p_end))
+        pieces = next_pieces
+    return max(pieces, key=lambda p: p[1] - p[0], default=(start, start))
+
+
+@dataclass
+class PackedContext:
+    """Passages that made it into the prompt, and a record of what was cut."""
+    passages: List[Dict]
+    tokens: int
+    budget: int
+    # {"id", "source", "page", "reason"}; trimmed entries add "tokens" and "kept_tokens"
+    dropped: List[Dict] = field(default_factory=list)
+    trimmed: List[Dict] = field(default_factory=list)
+
+    def report(self) -> Dict:
+        report = asdict(self)
+        del report["passages"]
+        report["passages_kept"] = len(self.passages)
+        return report
+
+
+def pack_context(sources: List[Dict], budget: int,
+                 dedup_threshold: float = 0.8) -> PackedContext:
+    """
+    Choose and trim retrieved sources ({"text", "metadata", "relevance_score"})
+    so their text fits in `budget` tokens, most relevant first:
+
+    - parts of a chunk that overlap an already chosen chunk of the same page
+      (chunks are cut with overlap) are trimmed off, and chunks that are
+      fully covered are dropped
+    - chunks whose word 3-grams mostly repeat a chosen chunk (Jaccard
+      similarity >= dedup_threshold, e.g. the same boilerplate page in two
+      PDFs) are dropped
+    - the last chunk that does not fit is cut at a word boundary, and the
+      ones after it are dropped
+
+    Kept passages are copies of the sources with "text" replaced by what
+    goes into the prompt.
+    """
+    packed = PackedContext(passages=[], tokens=0, budget=budget)
+    covered: Dict[Tuple, List[Tuple[int, int]]] = {}
+    kept_shingles = []
+
+    for s in sorted(sources, key=lambda s: s.get("relevance_score", 0.0), reverse=True):
+        meta = s["metadata"]
+        entry = {"id": meta.get("id"), "source": meta.get("source"), "page": meta.get("page")}
+        text = s["text"]
+        tokens = count_tokens(text)
+        trims = []
+
+        # Overlap with chosen chunks of the same page, by character offsets
+        page_key = (meta.get("source"), meta.get("page"))
+        start, end = meta.get("char_start"), meta.get("char_end")
+        if start is not None and end is not None and end > start:
+            ranges = covered.setdefault(page_key, [])
+            u_start, u_end = _uncovered(start, end, ranges)
+            if u_end <= u_start:
+                packed.dropped.append(dict(entry, reason="duplicate"))
+                continue
+            if (u_start, u_end) != (start, end):
+                text = text[u_start - start:u_end - start].strip()
+                trims.append(dict(entry, reason="overlap", tokens=tokens,
+                                  kept_tokens=count_tokens(text)))
+                tokens = count_tokens(text)
+            span = (u_start, u_end)
+        else:
+            span = None
+
+        shingles = _shingles(text)
+        if any(len(shingles & other) / len(shingles | other) >= dedup_threshold
+               for other in kept_shingles):
+            packed.dropped.append(dict(entry, reason="duplicate"))
+            continue
+
+        remaining = budget - packed.tokens
+        if tokens > remaining:
+            if remaining < MIN_PASSAGE_TOKENS:
+                packed.dropped.append(dict(entry, reason="budget"))
+                continue
+            text = _truncate(text, remaining)
+            trims.append(dict(entry, reason="budget", tokens=tokens,
+                              kept_tokens=count_tokens(text)))
+            tokens = count_tokens(text)
+
+        if span is not None:
+            covered[page_key].append(span)
+        kept_shingles.append(shingles)
+        packed.trimmed.extend(trims)
+        packed.passages.append(dict(s, text=text))
+        packed.tokens += tokens
+
+    return packed
@@ -0,0 +1,158 @@
+"""
+PERSISTENT EMBEDDING CACHE
+SQLite-backed store of embeddings keyed on (model name, text hash)
+"""
+
+import hashlib
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+CACHE_PATH = "embedding_cache.sqlite"
+
+
+class EmbeddingCache:
+    """
+    On-disk embedding cache shared by ingestion and the agents.
+
+    SQLite in WAL mode lets any number of processes read while one writes.
+    When the stored vectors exceed `max_bytes`, the least recently used
+    entries are evicted. Triggers keep the byte total in cache_meta up to
+    date in the same transaction as every insert and delete, whichever
+    process writes, so checking it never scans the vectors.
+    """
+
+    def __init__(self, path: str = CACHE_PATH, max_bytes: int = 512 * 1024 * 1024):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            " key TEXT PRIMARY KEY,"
+            " vector BLOB NOT NULL,"
+            " nbytes INTEGER NOT NULL,"
+            " last_used REAL NOT NULL)"
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_last_used ON embeddings(last_used)")
+        self._track_bytes()
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0}
+
+    def _track_bytes(self):
+        # Caches written before the total existed are summed once, in the
+        # same transaction that installs the triggers
+        self.conn.execute("BEGIN IMMEDIATE")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS cache_meta (name TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+        self.conn.execute(
+            "CREATE TRIGGER IF NOT EXISTS embeddings_bytes_insert AFTER INSERT ON embeddings BEGIN"
+            " UPDATE cache_meta SET value = value + new.nbytes WHERE name = 'bytes'; END"
+        )
+        self.conn.execute(
+            "CREATE TRIGGER IF NOT EXISTS embeddings_bytes_update AFTER UPDATE OF nbytes ON embeddings BEGIN"
+            " UPDATE cache_meta SET value = value + new.nbytes - old.nbytes WHERE name = 'bytes'; END"
+        )
+        self.conn.execute(
+            "CREATE TRIGGER IF NOT EXISTS embeddings_bytes_delete AFTER DELETE ON embeddings BEGIN"
+            " UPDATE cache_meta SET value = value - old.nbytes WHERE name = 'bytes'; END"
+        )
+        self.conn.execute(
+            "INSERT OR IGNORE INTO cache_meta (name, value)"
+            " SELECT 'bytes', COALESCE(SUM(nbytes), 0) FROM embeddings"
+        )
+        self.conn.commit()
+
+    @property
+    def total_bytes(self) -> int:
+        return self.conn.execute("SELECT value FROM cache_meta WHERE name = 'bytes'").fetchone()[0]
+
+    @staticmethod
+    def key(model: str, text: str) -> str:
+        return hashlib.sha256(f"{model}\0{text}".encode("utf-8")).hexdigest()
+
+    # ------------------------------------------------------------------------
+    # Lookups
+    # ------------------------------------------------------------------------
+
+    def get_many(self, model: str, texts: Sequence[str]) -> List[Optional[np.ndarray]]:
+        """Return the cached vector for each text, or None where missing."""
+        keys = [self.key(model, t) for t in texts]
+        found: Dict[str, np.ndarray] = {}
+        with self._lock:
+            # SQLite limits bound parameters per statement, so look up in chunks
+            for start in range(0, len(keys), 500):
+                chunk = keys[start:start + 500]
+                rows = self.conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({','.join('?' * len(chunk))})",
+                    chunk
+                ).fetchall()
+                for k, blob in rows:
+                    found[k] = np.frombuffer(blob, dtype="float32")
+
+            if found:
+                self._touch(list(found))
+            self.stats["hits"] += len(found)
+            self.stats["misses"] += len(keys) - len(found)
+        return [found.get(k) for k in keys]
+
+    def get(self, model: str, text: str) -> Optional[np.ndarray]:
+        return self.get_many(model, [text])[0]
+
+    def _touch(self, keys: List[str]):
+        # Recency is best-effort: a busy writer in another process must not
+        # turn a cache hit into an error
+        try:
+            now = time.time()
+            self.conn.executemany("UPDATE embeddings SET last_used = ? WHERE key = ?",
+                                  [(now, k) for k in keys])
+            self.conn.commit()
+        except sqlite3.OperationalError:
+            self.conn.rollback()
+
+    # ------------------------------------------------------------------------
+    # Inserts and eviction
+    # ------------------------------------------------------------------------
+
+    def put_many(self, model: str, texts: Sequence[str], vectors: np.ndarray):
+        now = time.time()
+        rows = []
+        for text, vector in zip(texts, vectors):
+            blob = np.ascontiguousarray(vector, dtype="float32").tobytes()
+            rows.append((self.key(model, text), blob, len(blob), now))
+        with self._lock:
+            # An upsert rather than INSERT OR REPLACE: the implicit delete
+            # of a replaced row would bypass the delete trigger
+            self.conn.executemany(
+                "INSERT INTO embeddings (key, vector, nbytes, last_used) VALUES (?, ?, ?, ?)"
+                " ON CONFLICT(key) DO UPDATE SET vector = excluded.vector,"
+                " nbytes = excluded.nbytes, last_used = excluded.last_used",
+                rows
+            )
+            self.conn.commit()
+            self._evict()
+
+    def put(self, model: str, text: str, vector: np.ndarray):
+        self.put_many(model, [text], vector.reshape(1, -1))
+
+    def _evict(self):
+        total = self.total_bytes
+        if total <= self.max_bytes:
+            return
+        # Drop least recently used entries until we are 10% under the limit
+        excess = total - int(self.max_bytes * 0.9)
+        victims = []
+        for k, nbytes in self.conn.execute("SELECT key, nbytes FROM embeddings ORDER BY last_used"):
+            victims.append((k,))
+            excess -= nbytes
+            if excess <= 0:
+                break
+        self.conn.executemany("DELETE FROM embeddings WHERE key = ?", victims)
+        self.conn.commit()
+        self.stats["evictions"] += len(victims)
+
+    def close(self):
+        self.conn.close()
@@ -0,0 +1,147 @@
+"""
+OLLAMA EMBEDDING CLIENT
+Batched, concurrent embedding requests over a keep-alive session
+"""
+
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Optional, Sequence
+
+import numpy as np
+import requests
+from requests.adapters import HTTPAdapter
+
+from utils.embedding_cache import EmbeddingCache
+
+OLLAMA_URL = "http://localhost:11434"
+EMBED_MODEL = "llama3.2"
+
+
+class EmbeddingClient:
+    """
+    Embeds texts through Ollama's batch endpoint (/api/embed).
+
+    - One requests.Session is reused, so TCP connections stay alive
+    - Texts are sent in batches of `batch_size`
+    - At most `max_in_flight` batches are outstanding at once
+    - Failed batches are retried with exponential backoff
+    - With a `cache`, only texts not embedded before reach the model
+    """
+
+    def __init__(self,
+                 model: str = EMBED_MODEL,
+                 base_url: str = OLLAMA_URL,
+                 batch_size: int = 32,
+                 max_in_flight: int = 4,
+                 max_retries: int = 3,
+                 backoff: float = 0.5,
+                 timeout: float = 120,
+                 cache: Optional[EmbeddingCache] = None):
+        self.model = model
+        self.url = f"{base_url.rstrip('/')}/api/embed"
+        self.batch_size = max(1, batch_size)
+        self.max_in_flight = max(1, max_in_flight)
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.cache = cache
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.max_in_flight)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+        self._lock = threading.Lock()
+        self.stats = {"texts": 0, "batches": 0, "retries": 0, "seconds": 0.0}
+
+    # ------------------------------------------------------------------------
+    # Single batch
+    # ------------------------------------------------------------------------
+
+    def embed_batch(self, texts: Sequence[str]) -> np.ndarray:
+        """Embed one batch of texts, retrying with backoff on failure."""
+        attempt = 0
+        while True:
+            try:
+                response = self.session.post(
+                    self.url,
+                    json={"model": self.model, "input": list(texts)},
+                    timeout=self.timeout
+                )
+                response.raise_for_status()
+                vectors = response.json()["embeddings"]
+                if len(vectors) != len(texts):
+                    raise ValueError(f"expected {len(texts)} embeddings, got {len(vectors)}")
+                with self._lock:
+                    self.stats["batches"] += 1
+                    self.stats["texts"] += len(texts)
+                return np.asarray(vectors, dtype="float32")
+            except (requests.RequestException, KeyError, ValueError):
+                if attempt >= self.max_retries:
+                    raise
+                with self._lock:
+                    self.stats["retries"] += 1
+                time.sleep(self.backoff * (2 ** attempt))
+                attempt += 1
+
+    def embed(self, text: str) -> np.ndarray:
+        """Embed a single text."""
+        if self.cache is not None:
+            cached = self.cache.get(self.model, text)
+            if cached is not None:
+                return cached
+        vector = self.embed_batch([text])[0]
+        if self.cache is not None:
+            self.cache.put(self.model, text, vector)
+        return vector
+
+    # ------------------------------------------------------------------------
+    # Many batches, bounded concurrency
+    # ------------------------------------------------------------------------
+
+    def embed_many(self, texts: Sequence[str]) -> np.ndarray:
+        """
+        Embed any number of texts. Batches run concurrently (bounded by
+        `max_in_flight`) and results keep the input order.
+        """
+        if not texts:
+            return np.zeros((0, 0), dtype="float32")
+        if self.cache is None:
+            return self._embed_uncached(texts)
+
+        cached = self.cache.get_many(self.model, texts)
+        missing = [i for i, v in enumerate(cached) if v is None]
+        if missing:
+            fresh = self._embed_uncached([texts[i] for i in missing])
+            self.cache.put_many(self.model, [texts[i] for i in missing], fresh)
+            for i, vector in zip(missing, fresh):
+                cached[i] = vector
+        return np.vstack(cached)
+
+    def _embed_uncached(self, texts: Sequence[str]) -> np.ndarray:
+        batches = [texts[i:i + self.batch_size] for i in range(0, len(texts), self.batch_size)]
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=self.max_in_flight) as pool:
+            results = list(pool.map(self.embed_batch, batches))
+        with self._lock:
+            self.stats["seconds"] += time.perf_counter() - start
+        return np.vstack(results)
+
+    def throughput(self) -> float:
+        """Texts embedded per second across all embed_many calls."""
+        if not self.stats["seconds"]:
+            return 0.0
+        return self.stats["texts"] / self.stats["seconds"]
+
+    def report(self) -> Dict:
+        """Snapshot of client counters, including texts/second."""
+        report = dict(self.stats)
+        report["texts_per_second"] = self.throughput()
+        if self.cache is not None:
+            report["cache_hits"] = self.cache.stats["hits"]
+            report["cache_misses"] = self.cache.stats["misses"]
+        return report
+
+    def close(self):
+        self.session.close()
@@ -0,0 +1,66 @@
+"""
+PDF TEXT EXTRACTION
+Fans page extraction out over a process pool, keeping document order
+"""
+
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterator, List, Sequence, Tuple
+
+import fitz  # PyMuPDF
+
+# (page_number, text) with 1-based page numbers, as stored in the metadata
+Page = Tuple[int, str]
+
+
+def extract_range(file_path: str, first: int, last: int) -> List[Page]:
+    """Extract pages [first, last) of one PDF. Runs inside worker processes."""
+    pages = []
+    with fitz.open(file_path) as doc:
+        for page_number in range(first, last):
+            pages.append((page_number + 1, doc[page_number].get_text()))
+    return pages
+
+
+def iter_tasks(file_paths: Sequence[str], pages_per_task: int) -> Iterator[Tuple[str, int, int]]:
+    """Split every file into (file_path, first, last) page ranges, lazily."""
+    for file_path in file_paths:
+        with fitz.open(file_path) as doc:
+            page_count = doc.page_count
+        for first in range(0, page_count, pages_per_task):
+            yield file_path, first, min(first + pages_per_task, page_count)
+
+
+def extract_pages(file_paths: Sequence[str],
+                  workers: int = 0,
+                  pages_per_task: int = 16) -> Iterator[Tuple[str, int, str]]:
+    """
+    Yield (file_path, page_number, text) for every page, in document order.
+
+    workers=0 uses one process per CPU; workers=1 extracts in this process.
+    Page ranges of large PDFs are spread over several workers, but results
+    are yielded in submission order, so output is the same for any worker
+    count. At most 2 * workers ranges are in flight, which keeps memory
+    bounded however many files there are.
+    """
+    workers = workers or os.cpu_count() or 1
+
+    if workers == 1:
+        for task in iter_tasks(file_paths, pages_per_task):
+            for page_number, text in extract_range(*task):
+                yield task[0], page_number, text
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = deque()
+        for task in iter_tasks(file_paths, pages_per_task):
+            pending.append((task[0], pool.submit(extract_range, *task)))
+            if len(pending) >= 2 * workers:
+                file_path, future = pending.popleft()
+                for page_number, text in future.result():
+                    yield file_path, page_number, text
+        while pending:
+            file_path, future = pending.popleft()
+            for page_number, text in future.result():
+                yield file_path, page_number, text
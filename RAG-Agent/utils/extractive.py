@@ -0,0 +1,113 @@
+"""
+EXTRACTIVE ANSWERS
+Picks the sentences of the retrieved passages that best match the question,
+for answers that need no generation at all
+"""
+
+import math
+import re
+from typing import Dict, List, Tuple
+
+from utils.lexical import tokenize
+
+# Sentence ends: ., ! or ? before whitespace and a capital, digit or quote,
+# or a blank line. Abbreviations like "Sec. 4" may split; harmless here
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+(?=[A-Z0-9\"'(])|\n\s*\n")
+
+STOPWORDS = frozenset(
+    "a an and are as at be by can do does for from has have how i if in is it its "
+    "may of on or our should that the their there this to was we what when where "
+    "which who why will with would you your".split()
+)
+MIN_SENTENCE_CHARS = 25
+
+
+def split_sentences(text: str) -> List[Tuple[int, int]]:
+    """(start, end) character spans of the sentences in `text`."""
+    spans, start = [], 0
+    for match in _SENTENCE_END.finditer(text):
+        spans.append((start, match.start()))
+        start = match.end()
+    spans.append((start, len(text)))
+    return [(s, e) for s, e in spans if text[s:e].strip()]
+
+
+def query_terms(query: str) -> List[str]:
+    return [t for t in dict.fromkeys(tokenize(query)) if t not in STOPWORDS]
+
+
+def term_spans(sentence: str, terms: set) -> List[Tuple[int, int]]:
+    """Character spans of the words in `sentence` that are query terms."""
+    return [m.span() for m in re.finditer(r"[A-Za-z0-9]+(?:[-/.][A-Za-z0-9]+)*", sentence)
+            if set(tokenize(m.group())) & terms]
+
+
+def extract_sentences(query: str, passages: List[Dict], max_sentences: int = 3,
+                      relevance_weight: float = 0.3) -> List[Dict]:
+    """
+    The best `max_sentences` sentences of `passages` ({"text",
+    "relevance_score"}) for `query`, best first. A sentence scores by the
+    share of the query's term weight (rarer terms weigh more) it covers,
+    blended with the relevance of its passage. Each result has:
+
+        passage      index into `passages`
+        start, end   span of the sentence in the passage text
+        text         the sentence
+        spans        spans of the matched query terms within `text`
+        score, coverage
+    """
+    terms = query_terms(query)
+    candidates = []
+    for p, passage in enumerate(passages):
+        for start, end in split_sentences(passage["text"]):
+            text = passage["text"][start:end].strip()
+            if len(text) < MIN_SENTENCE_CHARS:
+                continue
+            start += passage["text"][start:end].index(text[0])
+            candidates.append((p, start, start + len(text), text, set(tokenize(text))))
+    if not candidates or not terms:
+        return []
+
+    # Terms found in few sentences say more about which sentence answers
+    df = {t: sum(1 for c in candidates if t in c[4]) for t in terms}
+    weight = {t: math.log(1 + len(candidates) / (1 + df[t])) for t in terms}
+    total = sum(weight.values()) or 1.0
+
+    scored = []
+    for p, start, end, text, tokens in candidates:
+        matched = {t for t in terms if t in tokens}
+        if not matched:
+            continue
+        coverage = sum(weight[t] for t in matched) / total
+        relevance = passages[p].get("relevance_score", 0.0)
+        scored.append({
+            "passage": p,
+            "start": start,
+            "end": end,
+            "text": text,
+            "spans": term_spans(text, matched),
+            "coverage": round(coverage, 3),
+            "score": round((1 - relevance_weight) * coverage + relevance_weight * relevance, 3),
+        })
+
+    scored.sort(key=lambda s: s["score"], reverse=True)
+    chosen, seen = [], set()
+    for sentence in scored:
+        key = sentence["text"].lower()
+        if key in seen:
+            continue
+        seen.add(key)
+        chosen.append(sentence)
+        if len(chosen) == max_sentences:
+            break
+    return chosen
+
+
+def highlight(sentence: Dict, marker: str = "**") -> str:
+    """The sentence text with its matched terms wrapped in `marker`."""
+    text, out, last = sentence["text"], [], 0
+    for start, end in sentence["spans"]:
+        out.append(text[last:start] + marker + text[start:end] + marker)
+        last = end
+    out.append(text[last:])
+    return "".join(out)
@@ -0,0 +1,198 @@
+"""
+INCREMENTAL JSON
+Parses a JSON object while the model is still writing it, and repairs the
+output of generations that stopped early or wandered off the format
+"""
+
+import json
+from typing import Any, Dict, List, Optional, Tuple
+
+ESCAPES = {'"': '"', "\\": "\\", "/": "/", "b": "\b", "f": "\f", "n": "\n", "r": "\r", "t": "\t"}
+# Literals as JSON spells them, plus the Python spellings models fall into
+LITERALS = {"true": True, "false": False, "null": None, "True": True, "False": False, "None": None}
+LITERAL_CHARS = set("-+.0123456789eE") | set("truefalsnoTFN")
+# Stands in for half a UTF-16 surrogate pair, which cannot be encoded
+REPLACEMENT = "\ufffd"
+
+
+class IncrementalJSON:
+    """
+    Character-level parser for one JSON object arriving in pieces.
+
+    feed() returns events as soon as they are known:
+
+        ("delta", field, text)   more of a top-level string field
+        ("field", field, value)  a top-level field is complete
+
+    Text before the opening brace (prose, a ```json fence) and after the
+    closing one is ignored. close() ends the input and returns the object
+    with whatever was complete, plus the truncated string or container that
+    was still being written, so a generation cut off early still yields
+    its fields.
+    """
+
+    def __init__(self):
+        self.root: Optional[Dict] = None
+        self.done = False
+        # Open containers, innermost last: [container, pending key]
+        self._stack: List[list] = []
+        self._string: Optional[List[str]] = None  # characters of the open string
+        self._escape: Optional[str] = None        # escape sequence read so far
+        self._high: Optional[int] = None          # high surrogate awaiting its low half
+        self._literal: Optional[List[str]] = None
+        self._emitted = 0  # characters of the open top-level string already sent
+
+    def feed(self, text: str) -> List[Tuple[str, str, Any]]:
+        events = []
+        for c in text:
+            if self.done:
+                break
+            self._char(c, events)
+        if self._string is not None and self._top_level_value():
+            # Send what is decoded so far; an escape cut in half waits
+            pending = "".join(self._string[self._emitted:])
+            if pending:
+                events.append(("delta", self._stack[0][1], pending))
+                self._emitted = len(self._string)
+        return events
+
+    def close(self) -> Optional[Dict]:
+        """End of input; returns the (possibly partial) top-level object."""
+        if self.done or not self._stack:
+            return self.root
+        events = []
+        if self._string is not None:
+            self._end_string(events)
+        if self._literal is not None:
+            self._end_literal(events)
+        while self._stack:
+            self._close_container(events)
+        return self.root
+
+    # ------------------------------------------------------------------------
+    # Parsing
+    # ------------------------------------------------------------------------
+
+    def _top_level_value(self) -> bool:
+        return len(self._stack) == 1 and self._stack[0][1] is not None
+
+    def _char(self, c: str, events: List):
+        if self._string is not None:
+            self._string_char(c, events)
+            return
+        if self._literal is not None:
+            if c in LITERAL_CHARS:
+                self._literal.append(c)
+                return
+            self._end_literal(events)
+        if not self._stack:
+            if c == "{":
+                self._stack.append([{}, None])
+            return  # anything before the object
+        if c == '"':
+            self._string, self._emitted = [], 0
+        elif c in "{[":
+            self._stack.append([{} if c == "{" else [], None])
+        elif c in "}]":
+            self._close_container(events)
+        elif c in LITERAL_CHARS:
+            self._literal = [c]
+        # whitespace, ":" and "," carry nothing a lenient parser needs
+
+    def _string_char(self, c: str, events: List):
+        if self._escape is not None:
+            self._escape += c
+            if self._escape[0] == "u":
+                if len(self._escape) < 5:
+                    return
+                try:
+                    code = int(self._escape[1:], 16)
+                except ValueError:
+                    self._append("\\" + self._escape)
+                else:
+                    self._code_point(code)
+            else:
+                self._append(ESCAPES.get(self._escape, self._escape))
+            self._escape = None
+        elif c == "\\":
+            self._escape = ""
+        elif c == '"':
+            self._end_string(events)
+        else:
+            self._append(c)
+
+    def _append(self, text: str):
+        if self._high is not None:
+            self._string.append(REPLACEMENT)  # the low half never came
+            self._high = None
+        self._string.append(text)
+
+    def _code_point(self, code: int):
+        """A \\uXXXX escape; characters beyond the BMP arrive as a surrogate pair."""
+        high, self._high = self._high, None
+        if high is not None and 0xDC00 <= code <= 0xDFFF:
+            self._string.append(chr(0x10000 + ((high - 0xD800) << 10) + (code - 0xDC00)))
+            return
+        if high is not None:
+            self._string.append(REPLACEMENT)
+        if 0xD800 <= code <= 0xDBFF:
+            self._high = code  # held back, so no delta ends in half a pair
+        elif 0xDC00 <= code <= 0xDFFF:
+            self._string.append(REPLACEMENT)
+        else:
+            self._string.append(chr(code))
+
+    def _end_string(self, events: List):
+        if self._high is not None:
+            self._append("")  # writes out the unpaired high surrogate
+        text = "".join(self._string)
+        self._string, self._escape = None, None
+        frame = self._stack[-1]
+        if isinstance(frame[0], dict) and frame[1] is None:
+            frame[1] = text  # a key
+        else:
+            self._value(text, events)
+
+    def _end_literal(self, events: List):
+        word = "".join(self._literal)
+        self._literal = None
+        if word in LITERALS:
+            self._value(LITERALS[word], events)
+            return
+        try:
+            self._value(json.loads(word), events)
+        except ValueError:
+            self._value(word, events)
+
+    def _close_container(self, events: List):
+        container, _ = self._stack.pop()
+        if self._stack:
+            self._value(container, events)
+        else:
+            self.root, self.done = container, True
+
+    def _value(self, value: Any, events: List):
+        frame = self._stack[-1]
+        if isinstance(frame[0], list):
+            frame[0].append(value)
+            return
+        if frame[1] is None:
+            return  # a value without a key; nothing to attach it to
+        frame[0][frame[1]] = value
+        if len(self._stack) == 1:
+            if isinstance(value, str) and self._emitted < len(value):
+                events.append(("delta", frame[1], value[self._emitted:]))
+            events.append(("field", frame[1], value))
+        frame[1] = None
+        self._emitted = 0
+
+
+def repair_json(text: str) -> Optional[Dict]:
+    """
+    The object in `text`, tolerating surrounding prose, code fences,
+    trailing commas, Python literals and output cut off mid-object.
+    None when there is no object at all.
+    """
+    parser = IncrementalJSON()
+    parser.feed(text)
+    return parser.close()
@@ -0,0 +1,176 @@
+"""
+KNOWLEDGE BASE
+The index, chunk store and lexical index an agent answers from, loaded on
+first use and swapped for the next version when ingest.py finishes a run
+"""
+
+import hashlib
+import os
+import threading
+import time
+from dataclasses import dataclass
+from typing import Callable, Dict, Optional, Sequence
+
+import faiss
+
+from utils.store import MetadataStore, STORE_DIR
+from utils.lexical import LexicalIndex, LEXICAL_DIR
+from utils.vector_index import INDEX_INFO_PATH, read_index_info, index_type, is_approximate
+
+INDEX_PATH = "index.faiss"
+# ingest.py writes the manifest after the index, store and lexical index,
+# so a changed manifest means a complete new version is on disk
+MANIFEST_PATH = "manifest.json"
+
+# Memory-map the index file instead of reading it into RAM: loading is
+# near-instant and pages are shared between agent processes
+MMAP_FLAGS = getattr(faiss, "IO_FLAG_MMAP_IFC", faiss.IO_FLAG_MMAP) | faiss.IO_FLAG_READ_ONLY
+
+
+def fingerprint(paths: Sequence[str]) -> str:
+    """Short hash of the size and mtime of each file; missing files count too."""
+    parts = []
+    for path in paths:
+        try:
+            st = os.stat(path)
+            parts.append(f"{path}:{st.st_size}:{st.st_mtime_ns}")
+        except FileNotFoundError:
+            parts.append(f"{path}:-")
+    return hashlib.sha256("|".join(parts).encode("utf-8")).hexdigest()[:16]
+
+
+@dataclass(frozen=True)
+class Snapshot:
+    """
+    One loaded version of the knowledge base. A query takes the current
+    snapshot once and uses it throughout, so a reload never changes the
+    index under it; the old version is freed when its last query is done.
+    """
+    index: faiss.Index
+    store: MetadataStore
+    lexical: Optional[LexicalIndex]
+    # index_info.json plus index_type, approximate, rescore (exact re-scoring on) and version
+    info: Dict
+    version: str
+    loaded_at: float
+
+
+class KnowledgeBase:
+    """
+    Lazily loaded, hot-reloading knowledge base.
+
+    - Nothing is read until the first current() call
+    - A daemon thread checks every `watch_interval` seconds whether a new
+      version was ingested, loads it next to the current one and swaps it
+      in with a single reference assignment; queries never wait on a load
+    - A failed reload keeps the current version serving and is retried on
+      the next check
+    """
+
+    def __init__(self,
+                 index_path: str = INDEX_PATH,
+                 store_path: str = STORE_DIR,
+                 lexical_path: str = LEXICAL_DIR,
+                 manifest_path: str = MANIFEST_PATH,
+                 info_path: str = INDEX_INFO_PATH,
+                 hybrid: bool = True,
+                 rescore: str = "auto",
+                 mmap: bool = True,
+                 watch_interval: float = 5.0,
+                 on_load: Callable[[Snapshot, Optional[Snapshot]], None] = None):
+        self.index_path = index_path
+        self.store_path = store_path
+        self.lexical_path = lexical_path
+        self.manifest_path = manifest_path
+        self.info_path = info_path
+        self.hybrid = hybrid
+        self.rescore = rescore  # auto | on | off
+        self.mmap = mmap
+        self.watch_interval = watch_interval
+        self.on_load = on_load
+
+        self._snapshot: Optional[Snapshot] = None
+        self._lock = threading.Lock()  # one load at a time
+        self._watcher = None
+        self.stats = {"loads": 0, "reload_errors": 0, "last_error": None}
+
+    def current(self) -> Snapshot:
+        """The snapshot to answer from, loading the first one if needed."""
+        snapshot = self._snapshot
+        if snapshot is None:
+            with self._lock:
+                if self._snapshot is None:
+                    self._swap(self._load(self.version_on_disk()))
+                snapshot = self._snapshot
+            self._start_watcher()
+        return snapshot
+
+    def version_on_disk(self) -> str:
+        if os.path.exists(self.manifest_path):
+            return fingerprint([self.manifest_path])
+        # Built before manifests existed
+        return fingerprint([self.index_path, self.info_path])
+
+    def reload(self) -> bool:
+        """Load and swap in the version on disk if it is new. True if swapped."""
+        with self._lock:
+            version = self.version_on_disk()
+            if self._snapshot is not None and self._snapshot.version == version:
+                return False
+            self._swap(self._load(version))
+            return True
+
+    # ------------------------------------------------------------------------
+    # Loading
+    # ------------------------------------------------------------------------
+
+    def _load(self, version: str) -> Snapshot:
+        index = self._read_index()
+        store = MetadataStore(self.store_path)
+        info = read_index_info(self.info_path)
+        info["index_type"] = index_type(index)
+        info["approximate"] = is_approximate(index)
+        info["rescore"] = store.has_vectors and (
+            self.rescore == "on" or (self.rescore == "auto" and info["approximate"]))
+        info["version"] = version
+        lexical = None
+        if self.hybrid and os.path.exists(self.lexical_path):
+            lexical = LexicalIndex(self.lexical_path)
+        return Snapshot(index=index, store=store, lexical=lexical, info=info,
+                        version=version, loaded_at=time.time())
+
+    def _read_index(self) -> faiss.Index:
+        if self.mmap:
+            try:
+                return faiss.read_index(self.index_path, MMAP_FLAGS)
+            except RuntimeError:
+                pass  # index type without mmap support
+        return faiss.read_index(self.index_path)
+
+    def _swap(self, snapshot: Snapshot):
+        previous, self._snapshot = self._snapshot, snapshot
+        self.stats["loads"] += 1
+        if self.on_load is not None:
+            self.on_load(snapshot, previous)
+
+    # ------------------------------------------------------------------------
+    # Watching for new versions
+    # ------------------------------------------------------------------------
+
+    def _start_watcher(self):
+        if self.watch_interval <= 0 or self._watcher is not None:
+            return
+        with self._lock:
+            if self._watcher is None:
+                self._watcher = threading.Thread(target=self._watch, name="knowledge-base-watcher",
+                                                 daemon=True)
+                self._watcher.start()
+
+    def _watch(self):
+        while True:
+            time.sleep(self.watch_interval)
+            try:
+                self.reload()
+            except Exception as e:
+                self.stats["reload_errors"] += 1
+                self.stats["last_error"] = str(e)
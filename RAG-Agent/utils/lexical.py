@@ -0,0 +1,296 @@
+"""
+LEXICAL INDEX
+BM25 inverted index over the chunk store, for keyword and form-code lookups
+
+Layout of the lexical directory (postings of term t are rows ptr[t]:ptr[t+1]):
+
+    vocab.json      {"terms": {term: t}, "rows": store rows covered,
+                     "documents": n, "avg_length": avgdl}
+    ptr.npy         int64 offsets into the postings, one per term plus one
+    docs.npy        int32 chunk ids, grouped by term
+    tf.npy          int32 term frequency of each posting
+    length.npy      int32 token count of every store row (0 for deleted rows)
+"""
+
+import json
+import os
+import re
+import shutil
+from array import array
+from collections import Counter
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from utils.store import MetadataStore, STORE_DIR, replace_store
+
+LEXICAL_DIR = "lexical"
+
+# Store rows tokenized per segment, and postings handled per block while
+# merging; these bound the memory a build takes
+SEGMENT_ROWS = 8192
+MERGE_POSTINGS = 1 << 18
+POSTINGS = ("ptr", "docs", "tf")
+
+# Standard BM25 parameters
+K1 = 1.2
+B = 0.75
+
+# Words, with codes like "HO-3", "FF-206-FY-22" or "11/2023" kept in one piece
+_WORD = re.compile(r"[a-z0-9]+(?:[-/.][a-z0-9]+)*")
+_CODE_SEPARATOR = re.compile(r"[-/.]")
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercased words. Compound codes are indexed whole and by their parts."""
+    tokens = []
+    for match in _WORD.finditer(text.lower()):
+        token = match.group()
+        tokens.append(token)
+        if not token.isalnum():
+            tokens.extend(part for part in _CODE_SEPARATOR.split(token) if part)
+    return tokens
+
+
+def looks_like_code(query: str) -> bool:
+    """True for queries made only of identifiers (policy numbers, form codes)."""
+    words = _WORD.findall(query.lower())
+    return bool(words) and all(any(c.isdigit() for c in word) for word in words)
+
+
+def build_lexical_index(store_path: str = STORE_DIR, path: str = LEXICAL_DIR,
+                        rebuild: bool = False) -> int:
+    """
+    Bring the inverted index up to date with the store and swap it in for
+    the current one. Returns the number of terms with live postings.
+
+    Store rows are append-only, so only rows added since the last build
+    are tokenized; postings of rows deleted since are dropped as the
+    existing ones are carried over. `rebuild` starts over, for a store
+    that was rebuilt rather than appended to.
+
+    Memory stays bounded whatever the corpus size: new rows are tokenized
+    SEGMENT_ROWS at a time into sorted segments on disk, which are merged
+    with the existing postings MERGE_POSTINGS at a time.
+    """
+    store = MetadataStore(store_path)
+    rows = len(store)
+    live = store.select()
+    store.close()
+    previous = None if rebuild else _previous_build(path, rows)
+
+    tmp_path = path + ".tmp"
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    os.makedirs(tmp_path)
+
+    terms, first_row, sources = {}, 0, []
+    length = np.zeros(rows, dtype=np.int32)
+    if previous is not None:
+        terms, first_row = previous["terms"], previous["rows"]
+        length[:first_row] = np.load(os.path.join(path, "length.npy"))
+        length[~live] = 0
+        sources.append(({name: os.path.join(path, f"{name}.npy") for name in POSTINGS}, True))
+    for start in range(first_row, rows, SEGMENT_ROWS):
+        prefix = os.path.join(tmp_path, f"segment-{len(sources)}")
+        segment = _write_segment(store_path, start, min(rows, start + SEGMENT_ROWS), terms, length, prefix)
+        sources.append((segment, False))
+
+    live_terms = _merge(sources, live, len(terms), tmp_path)
+    for files, carried_over in sources:
+        if not carried_over:
+            for name in POSTINGS:
+                os.remove(files[name])
+
+    documents = int(np.count_nonzero(length))
+    np.save(os.path.join(tmp_path, "length.npy"), length)
+    with open(os.path.join(tmp_path, "vocab.json"), "w") as f:
+        json.dump({
+            "terms": terms,
+            "rows": rows,
+            "documents": documents,
+            "avg_length": float(length.sum()) / documents if documents else 0.0,
+        }, f)
+    replace_store(tmp_path, path)
+    return live_terms
+
+
+def _previous_build(path: str, rows: int) -> Optional[dict]:
+    """vocab.json of the current index, if it covers a prefix of the store's rows."""
+    try:
+        with open(os.path.join(path, "vocab.json")) as f:
+            vocab = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if vocab.get("rows", rows + 1) > rows:
+        return None
+    if not all(os.path.exists(os.path.join(path, f"{name}.npy")) for name in POSTINGS + ("length",)):
+        return None
+    return vocab
+
+
+def _write_segment(store_path: str, start: int, end: int, terms: dict,
+                   length: np.ndarray, prefix: str) -> dict:
+    """
+    Tokenize store rows start:end into postings sorted by term, saved as
+    `prefix`-ptr/docs/tf.npy. New terms are added to `terms`; token counts
+    go into `length`. The store is opened per segment, so only this
+    segment's texts are ever mapped in.
+    """
+    store = MetadataStore(store_path)
+    term_ids, doc_ids, freqs = array("q"), array("i"), array("i")
+    for i in range(start, end):
+        text = store.text(i)
+        if text is None:  # deleted
+            continue
+        counts = Counter(tokenize(text))
+        length[i] = sum(counts.values())
+        term_ids.extend(terms.setdefault(term, len(terms)) for term in counts)
+        doc_ids.extend([i] * len(counts))
+        freqs.extend(counts.values())
+    store.close()
+
+    term_ids = np.frombuffer(term_ids, dtype=np.int64)
+    order = np.argsort(term_ids, kind="stable")
+    ptr = np.zeros(len(terms) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(term_ids, minlength=len(terms)), out=ptr[1:])
+    files = {name: f"{prefix}-{name}.npy" for name in POSTINGS}
+    np.save(files["ptr"], ptr)
+    np.save(files["docs"], np.frombuffer(doc_ids, dtype=np.int32)[order])
+    np.save(files["tf"], np.frombuffer(freqs, dtype=np.int32)[order])
+    return files
+
+
+def _merge(sources: List[Tuple[dict, bool]], live: np.ndarray, vocabulary: int, path: str) -> int:
+    """
+    Write ptr/docs/tf.npy under `path` from the postings of every source
+    in order; those of a carried-over index are kept only for live rows.
+    Sources are in row order, so chunk ids stay ascending within a term.
+    Returns the number of terms left with postings.
+    """
+    stored = np.zeros(vocabulary + 1, dtype=np.int64)
+    for files, _ in sources:
+        stored += _pointers(files["ptr"], 0, vocabulary)
+    # Term ranges holding about MERGE_POSTINGS stored postings each
+    blocks, first = [], 0
+    while first < vocabulary:
+        last = int(np.searchsorted(stored, stored[first] + MERGE_POSTINGS, side="right")) - 1
+        blocks.append((first, min(vocabulary, max(first + 1, last))))
+        first = blocks[-1][1]
+
+    counts = np.zeros(vocabulary, dtype=np.int64)
+    for first, last in blocks:
+        for files, carried_over in sources:
+            if carried_over:
+                block_terms, _, _ = _postings(files, first, last, live)
+                counts[first:last] += np.bincount(block_terms - first, minlength=last - first)
+            else:
+                counts[first:last] += np.diff(_pointers(files["ptr"], first, last))
+    ptr = np.zeros(vocabulary + 1, dtype=np.int64)
+    np.cumsum(counts, out=ptr[1:])
+    np.save(os.path.join(path, "ptr.npy"), ptr)
+
+    # Blocks come out in term order, so the arrays are written front to back
+    header = {"descr": np.lib.format.dtype_to_descr(np.dtype(np.int32)),
+              "fortran_order": False, "shape": (int(ptr[-1]),)}
+    with open(os.path.join(path, "docs.npy"), "wb") as docs_file, \
+            open(os.path.join(path, "tf.npy"), "wb") as tf_file:
+        for f in (docs_file, tf_file):
+            np.lib.format.write_array_header_1_0(f, header)
+        for first, last in blocks:
+            parts = [_postings(files, first, last, live if carried_over else None)
+                     for files, carried_over in sources]
+            order = np.argsort(np.concatenate([p[0] for p in parts]), kind="stable")
+            np.concatenate([p[1] for p in parts])[order].astype(np.int32).tofile(docs_file)
+            np.concatenate([p[2] for p in parts])[order].astype(np.int32).tofile(tf_file)
+    return int(np.count_nonzero(counts))
+
+
+def _pointers(path: str, first: int, last: int) -> np.ndarray:
+    """ptr[first:last + 1] of a saved pointer array; terms it predates have no postings."""
+    ptr = np.load(path, mmap_mode="r")
+    block = np.array(ptr[first:last + 1])
+    missing = last + 1 - first - len(block)
+    return np.concatenate([block, np.full(missing, ptr[-1])]) if missing else block
+
+
+def _postings(files: dict, first: int, last: int,
+              live: Optional[np.ndarray]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Term, chunk id and tf of the postings of terms first:last, only live ones given `live`."""
+    ptr = _pointers(files["ptr"], first, last)
+    if ptr[0] == ptr[-1]:
+        empty = np.zeros(0, dtype=np.int64)
+        return empty, empty, empty
+    docs = np.array(np.load(files["docs"], mmap_mode="r")[ptr[0]:ptr[-1]])
+    tf = np.array(np.load(files["tf"], mmap_mode="r")[ptr[0]:ptr[-1]])
+    block_terms = np.repeat(np.arange(first, last), np.diff(ptr))
+    if live is not None:
+        keep = live[docs]
+        block_terms, docs, tf = block_terms[keep], docs[keep], tf[keep]
+    return block_terms, docs, tf
+
+
+class LexicalIndex:
+    """Read-only BM25 search over a lexical directory built by ingest.py."""
+
+    def __init__(self, path: str = LEXICAL_DIR):
+        with open(os.path.join(path, "vocab.json")) as f:
+            vocab = json.load(f)
+        self.path = path
+        self.terms = vocab["terms"]
+        self.documents = vocab["documents"]
+        self.avg_length = vocab["avg_length"] or 1.0
+        self.ptr = np.load(os.path.join(path, "ptr.npy"), mmap_mode="r")
+        self.docs = np.load(os.path.join(path, "docs.npy"), mmap_mode="r")
+        self.tf = np.load(os.path.join(path, "tf.npy"), mmap_mode="r")
+        self.length = np.load(os.path.join(path, "length.npy"), mmap_mode="r")
+
+    def __len__(self) -> int:
+        return len(self.terms)
+
+    def _query_terms(self, query: str):
+        """Postings range and idf of each distinct query term that has postings."""
+        for term in set(tokenize(query)):
+            t = self.terms.get(term)
+            if t is None:
+                continue
+            start, end = int(self.ptr[t]), int(self.ptr[t + 1])
+            if start < end:
+                n = end - start
+                yield start, end, np.log(1 + (self.documents - n + 0.5) / (n + 0.5))
+
+    def max_score(self, query: str) -> float:
+        """
+        Upper bound of any chunk's BM25 score for `query`: each term's idf
+        times K1 + 1, the limit of its tf factor. Scores divided by it fall
+        in [0, 1) and, unlike scores scaled to the best hit, mean the same
+        whichever chunks happen to match.
+        """
+        return float(sum(idf for _, _, idf in self._query_terms(query))) * (K1 + 1)
+
+    def search(self, query: str, top_k: int,
+               mask: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        BM25 scores and chunk ids of the top_k matches, best first. With a
+        `mask` (bool per chunk id), only chunks it selects are ranked.
+        """
+        doc_parts, score_parts = [], []
+        for start, end, idf in self._query_terms(query):
+            docs = np.asarray(self.docs[start:end])
+            tf = np.asarray(self.tf[start:end], dtype=np.float32)
+            norm = K1 * (1 - B + B * self.length[docs] / self.avg_length)
+            doc_parts.append(docs)
+            score_parts.append(idf * tf * (K1 + 1) / (tf + norm))
+        if not doc_parts:
+            return np.zeros(0, dtype=np.float32), np.zeros(0, dtype=np.int64)
+
+        docs, inverse = np.unique(np.concatenate(doc_parts), return_inverse=True)
+        scores = np.bincount(inverse, weights=np.concatenate(score_parts))
+        if mask is not None:
+            keep = mask[docs]
+            docs, scores = docs[keep], scores[keep]
+        if len(scores) > top_k:
+            top = np.argpartition(-scores, top_k)[:top_k]
+        else:
+            top = np.arange(len(scores))
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return scores[top].astype(np.float32), docs[top].astype(np.int64)
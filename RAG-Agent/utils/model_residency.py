@@ -0,0 +1,82 @@
+"""
+MODEL RESIDENCY
+Keeps the generation model loaded in Ollama and counts the requests that
+had to wait for it to load
+"""
+
+import threading
+import time
+from typing import Dict, Optional
+
+import requests
+
+from utils.embeddings import OLLAMA_URL
+
+
+class ModelResidency:
+    """
+    Residency policy and cold-load accounting for one Ollama model.
+
+    - `keep_alive` is sent with every generation request: how long Ollama
+      keeps the model in memory after it ("30m", "2h"; "-1" = until the
+      server stops, "0" = unload at once)
+    - warm_up() loads the model ahead of the first real question
+    - record() reads load_duration from the final chunk of each
+      generation; a load of at least `cold_load_ms` counts as a cold load
+    """
+
+    def __init__(self, model: str, base_url: str = OLLAMA_URL, keep_alive: str = "30m",
+                 cold_load_ms: float = 500, session: Optional[requests.Session] = None):
+        self.model = model
+        self.base_url = base_url.rstrip("/")
+        # Ollama takes durations as strings and seconds as numbers; -1 and 0 only as numbers
+        self.keep_alive = int(keep_alive) if keep_alive.lstrip("-").isdigit() else keep_alive
+        self.cold_load_ms = cold_load_ms
+        self.session = session or requests.Session()
+        self._lock = threading.Lock()
+        self.stats = {"generations": 0, "cold_loads": 0, "load_ms_total": 0.0,
+                      "last_cold_load": None, "warm_ups": 0}
+
+    def options(self) -> Dict:
+        """Fields to add to a /api/generate or /api/chat request body."""
+        return {"keep_alive": self.keep_alive}
+
+    def record(self, chunk: Dict, timings: Dict = None) -> bool:
+        """
+        Account for a finished generation from its final ("done") chunk.
+        Adds load_ms and cold_load to `timings`. Returns True for a cold load.
+        """
+        load_ms = round(chunk.get("load_duration", 0) / 1e6, 1)
+        cold = load_ms >= self.cold_load_ms
+        with self._lock:
+            self.stats["generations"] += 1
+            if cold:
+                self.stats["cold_loads"] += 1
+                self.stats["load_ms_total"] += load_ms
+                self.stats["last_cold_load"] = time.time()
+        if timings is not None:
+            timings["load_ms"] = load_ms
+            timings["cold_load"] = cold
+        return cold
+
+    def warm_up(self, timeout: float = 120) -> Dict:
+        """
+        Load the model without generating (an empty prompt) and pin it for
+        `keep_alive`. Returns {"load_ms", "cold_load", "total_ms"}.
+        """
+        start = time.perf_counter()
+        response = self.session.post(
+            f"{self.base_url}/api/generate",
+            json={"model": self.model, "prompt": "", "stream": False, **self.options()},
+            timeout=timeout
+        )
+        response.raise_for_status()
+        load_ms = round(response.json().get("load_duration", 0) / 1e6, 1)
+        with self._lock:
+            self.stats["warm_ups"] += 1
+        return {"load_ms": load_ms, "cold_load": load_ms >= self.cold_load_ms,
+                "total_ms": round((time.perf_counter() - start) * 1000, 1)}
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            return dict(self.stats)
@@ -0,0 +1,181 @@
+"""
+ASYNC OLLAMA CLIENT
+Embeddings and generation over one pooled httpx.AsyncClient per event loop
+"""
+
+import asyncio
+import json
+import time
+import weakref
+from typing import AsyncIterator, Dict, Optional, Sequence
+
+import httpx
+import numpy as np
+
+from utils.embeddings import OLLAMA_URL, EMBED_MODEL
+from utils.embedding_cache import EmbeddingCache
+from utils.model_residency import ModelResidency
+
+GENERATE_MODEL = "llama3.2"
+
+
+class AsyncOllamaClient:
+    """
+    Async counterpart of EmbeddingClient that also generates.
+
+    - Connections are pooled and kept alive; httpx clients cannot be shared
+      between event loops, so each loop gets its own pool
+    - At most `max_in_flight` requests per loop are sent to Ollama at
+      once; the rest wait on a semaphore instead of piling onto the model
+    - With a `cache`, only texts not embedded before reach the model
+    - With a `residency`, generations carry its keep_alive and report
+      model load times to it
+    """
+
+    def __init__(self,
+                 base_url: str = OLLAMA_URL,
+                 embed_model: str = EMBED_MODEL,
+                 generate_model: str = GENERATE_MODEL,
+                 max_in_flight: int = 8,
+                 batch_size: int = 32,
+                 embed_timeout: float = 30,
+                 generate_timeout: float = 60,
+                 connect_timeout: float = 10,
+                 cache: Optional[EmbeddingCache] = None,
+                 residency: Optional[ModelResidency] = None):
+        self.base_url = base_url.rstrip("/")
+        self.embed_model = embed_model
+        self.generate_model = generate_model
+        self.max_in_flight = max(1, max_in_flight)
+        self.batch_size = max(1, batch_size)
+        self.embed_timeout = httpx.Timeout(embed_timeout, connect=connect_timeout)
+        # Generation streams, so the read timeout is the longest pause between chunks
+        self.generate_timeout = httpx.Timeout(generate_timeout, connect=connect_timeout)
+        self.cache = cache
+        self.residency = residency
+
+        self._pools = weakref.WeakKeyDictionary()  # event loop -> (client, semaphore)
+        self.stats = {"embed_requests": 0, "generate_requests": 0, "in_flight": 0, "peak_in_flight": 0}
+
+    def _pool(self):
+        loop = asyncio.get_running_loop()
+        pool = self._pools.get(loop)
+        if pool is None:
+            client = httpx.AsyncClient(
+                base_url=self.base_url,
+                limits=httpx.Limits(max_connections=self.max_in_flight,
+                                    max_keepalive_connections=self.max_in_flight)
+            )
+            pool = self._pools[loop] = (client, asyncio.Semaphore(self.max_in_flight))
+        return pool
+
+    def _started(self, kind: str):
+        self.stats[kind] += 1
+        self.stats["in_flight"] += 1
+        self.stats["peak_in_flight"] = max(self.stats["peak_in_flight"], self.stats["in_flight"])
+
+    # ------------------------------------------------------------------------
+    # Embeddings
+    # ------------------------------------------------------------------------
+
+    async def embed_batch(self, texts: Sequence[str]) -> np.ndarray:
+        client, semaphore = self._pool()
+        async with semaphore:
+            self._started("embed_requests")
+            try:
+                response = await client.post(
+                    "/api/embed",
+                    json={"model": self.embed_model, "input": list(texts)},
+                    timeout=self.embed_timeout
+                )
+            finally:
+                self.stats["in_flight"] -= 1
+        response.raise_for_status()
+        vectors = response.json()["embeddings"]
+        if len(vectors) != len(texts):
+            raise ValueError(f"expected {len(texts)} embeddings, got {len(vectors)}")
+        return np.asarray(vectors, dtype="float32")
+
+    async def embed_many(self, texts: Sequence[str]) -> np.ndarray:
+        """Embed any number of texts; batches are sent concurrently, up to the cap."""
+        if not texts:
+            return np.zeros((0, 0), dtype="float32")
+        cached = [None] * len(texts)
+        if self.cache is not None:
+            # SQLite calls block (up to the busy timeout behind another
+            # writer), so keep them off the event loop
+            cached = await asyncio.to_thread(self.cache.get_many, self.embed_model, texts)
+        missing = [i for i, v in enumerate(cached) if v is None]
+        if missing:
+            batches = [missing[i:i + self.batch_size] for i in range(0, len(missing), self.batch_size)]
+            results = await asyncio.gather(*(self.embed_batch([texts[i] for i in b]) for b in batches))
+            fresh = np.vstack(results)
+            if self.cache is not None:
+                await asyncio.to_thread(self.cache.put_many, self.embed_model,
+                                        [texts[i] for i in missing], fresh)
+            for i, vector in zip(missing, fresh):
+                cached[i] = vector
+        return np.vstack(cached)
+
+    async def embed(self, text: str) -> np.ndarray:
+        return (await self.embed_many([text]))[0]
+
+    # ------------------------------------------------------------------------
+    # Generation
+    # ------------------------------------------------------------------------
+
+    async def stream(self, prompt: str, timings: Dict = None,
+                     schema: Dict = None) -> AsyncIterator[str]:
+        """
+        Yield generated text as Ollama produces it. `timings` receives
+        ttft_ms (time to first token), total_ms and tokens, plus load_ms
+        and cold_load with a residency. A JSON `schema` constrains the
+        output to match it.
+        """
+        client, semaphore = self._pool()
+        body = {"model": self.generate_model, "prompt": prompt, "stream": True}
+        if self.residency is not None:
+            body.update(self.residency.options())
+        if schema is not None:
+            body["format"] = schema
+        start = time.perf_counter()
+        async with semaphore:
+            self._started("generate_requests")
+            try:
+                async with client.stream(
+                    "POST", "/api/generate",
+                    json=body,
+                    timeout=self.generate_timeout
+                ) as response:
+                    response.raise_for_status()
+                    async for line in response.aiter_lines():
+                        if not line:
+                            continue
+                        chunk = json.loads(line)
+                        if "error" in chunk:
+                            raise RuntimeError(chunk["error"])
+                        token = chunk.get("response", "")
+                        if token:
+                            if timings is not None and "ttft_ms" not in timings:
+                                timings["ttft_ms"] = round((time.perf_counter() - start) * 1000, 1)
+                            yield token
+                        # Read on to the end of the body after "done", so the
+                        # connection goes back to the pool instead of being closed
+                        if chunk.get("done"):
+                            if timings is not None:
+                                timings["tokens"] = chunk.get("eval_count")
+                            if self.residency is not None:
+                                self.residency.record(chunk, timings)
+            finally:
+                self.stats["in_flight"] -= 1
+        if timings is not None:
+            timings["total_ms"] = round((time.perf_counter() - start) * 1000, 1)
+
+    async def generate(self, prompt: str, timings: Dict = None, schema: Dict = None) -> str:
+        return "".join([token async for token in self.stream(prompt, timings, schema)])
+
+    async def aclose(self):
+        """Close the connection pool of the running event loop."""
+        pool = self._pools.pop(asyncio.get_running_loop(), None)
+        if pool is not None:
+            await pool[0].aclose()
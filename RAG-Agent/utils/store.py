@@ -0,0 +1,299 @@
+"""
+METADATA STORE
+Columnar, append-only chunk store read through mmap
+
+Layout of the store directory (row i belongs to vector id i):
+
+    texts.bin       UTF-8 chunk texts, back to back
+    offsets.i64     [start, end) byte range of each text in texts.bin
+    source.i32      index into labels.json["source"]
+    type.u8         index into labels.json["type"]
+    page.i32        1-based page number
+    chunk.i32       chunk number within the page
+    char_start.i32  character offsets of the chunk within the page text
+    char_end.i32
+    deleted.u8      1 once the chunk has been removed from the index
+    labels.json     {"source": [...], "type": [...]}
+    vectors.f32     full-precision embeddings, `dimension` floats per row
+    vectors.json    {"dimension": d}
+"""
+
+import json
+import mmap
+import os
+import shutil
+from typing import Dict, Optional, Sequence, Tuple
+
+import numpy as np
+
+STORE_DIR = "store"
+MAX_CACHED_MASKS = 64
+
+# column name -> dtype; offsets has two values per row
+COLUMNS = {
+    "offsets": np.int64,
+    "source": np.int32,
+    "type": np.uint8,
+    "page": np.int32,
+    "chunk": np.int32,
+    "char_start": np.int32,
+    "char_end": np.int32,
+    "deleted": np.uint8,
+}
+SUFFIX = {np.int64: "i64", np.int32: "i32", np.uint8: "u8"}
+
+
+def _column_path(path: str, name: str) -> str:
+    return os.path.join(path, f"{name}.{SUFFIX[COLUMNS[name]]}")
+
+
+def _row_count(path: str) -> int:
+    """Rows fully written to every column (a crashed append may leave some short)."""
+    counts = []
+    for name, dtype in COLUMNS.items():
+        column = _column_path(path, name)
+        size = os.path.getsize(column) if os.path.exists(column) else 0
+        width = np.dtype(dtype).itemsize * (2 if name == "offsets" else 1)
+        counts.append(size // width)
+    return min(counts)
+
+
+def _vector_dimension(path: str) -> Optional[int]:
+    info_path = os.path.join(path, "vectors.json")
+    if not os.path.exists(info_path):
+        return None
+    with open(info_path) as f:
+        return json.load(f)["dimension"]
+
+
+def _load_labels(path: str) -> Dict:
+    labels_path = os.path.join(path, "labels.json")
+    if not os.path.exists(labels_path):
+        return {"source": [], "type": []}
+    with open(labels_path) as f:
+        return json.load(f)
+
+
+# ============================================================================
+# WRITER
+# ============================================================================
+
+class StoreWriter:
+    """Appends chunks column by column while ingestion streams."""
+
+    def __init__(self, path: str = STORE_DIR, truncate: bool = False):
+        self.path = path
+        if truncate and os.path.exists(path):
+            shutil.rmtree(path)
+        os.makedirs(path, exist_ok=True)
+
+        self.rows = _row_count(path)
+        self.labels = _load_labels(path)
+        self._label_index = {k: {v: i for i, v in enumerate(vs)} for k, vs in self.labels.items()}
+
+        text_path = os.path.join(path, "texts.bin")
+        self.text_file = open(text_path, "ab")
+        self.text_end = self.text_file.tell()
+        self.files = {name: open(_column_path(path, name), "ab") for name in COLUMNS}
+
+        # Drop half-written rows left by an interrupted run
+        for name, f in self.files.items():
+            width = np.dtype(COLUMNS[name]).itemsize * (2 if name == "offsets" else 1)
+            f.truncate(self.rows * width)
+            f.seek(0, os.SEEK_END)
+
+        # Full-precision vectors are only kept when the store has had them
+        # from its first row (stores built before they existed go without)
+        self.dimension = _vector_dimension(path)
+        self.keep_vectors = self.dimension is not None or self.rows == 0
+        self.vector_file = None
+        if self.dimension is not None:
+            self.vector_file = open(os.path.join(path, "vectors.f32"), "ab")
+            self.vector_file.truncate(self.rows * self.dimension * 4)
+            self.vector_file.seek(0, os.SEEK_END)
+
+    def _label(self, kind: str, value: str) -> int:
+        codes = self._label_index[kind]
+        if value not in codes:
+            codes[value] = len(self.labels[kind])
+            self.labels[kind].append(value)
+            tmp_path = os.path.join(self.path, "labels.json.tmp")
+            with open(tmp_path, "w") as f:
+                json.dump(self.labels, f)
+            os.replace(tmp_path, os.path.join(self.path, "labels.json"))
+        return codes[value]
+
+    def append(self, ids: Sequence[int], texts: Sequence[str], metadata: Sequence[Dict],
+               vectors: Optional[np.ndarray] = None):
+        if list(ids) != list(range(self.rows, self.rows + len(ids))):
+            raise ValueError(f"store rows must be appended in id order starting at {self.rows}")
+
+        if vectors is not None and self.keep_vectors:
+            if self.vector_file is None:
+                self.dimension = vectors.shape[1]
+                with open(os.path.join(self.path, "vectors.json"), "w") as f:
+                    json.dump({"dimension": self.dimension}, f)
+                self.vector_file = open(os.path.join(self.path, "vectors.f32"), "ab")
+            np.ascontiguousarray(vectors, dtype=np.float32).tofile(self.vector_file)
+            self.vector_file.flush()
+
+        offsets = np.empty((len(texts), 2), dtype=np.int64)
+        for n, text in enumerate(texts):
+            data = text.encode("utf-8")
+            self.text_file.write(data)
+            offsets[n] = (self.text_end, self.text_end + len(data))
+            self.text_end += len(data)
+        self.text_file.flush()
+
+        columns = {
+            "source": [self._label("source", m["source"]) for m in metadata],
+            "type": [self._label("type", m["type"]) for m in metadata],
+            "page": [m["page"] for m in metadata],
+            "chunk": [m.get("chunk", 0) for m in metadata],
+            "char_start": [m.get("char_start", 0) for m in metadata],
+            "char_end": [m.get("char_end", 0) for m in metadata],
+            "deleted": [0] * len(metadata),
+        }
+        for name, values in columns.items():
+            np.asarray(values, dtype=COLUMNS[name]).tofile(self.files[name])
+            self.files[name].flush()
+        # offsets last: a row only counts once every column has it
+        offsets.tofile(self.files["offsets"])
+        self.files["offsets"].flush()
+        self.rows += len(ids)
+
+    def delete(self, ids: Sequence[int]):
+        if not len(ids):
+            return
+        deleted = np.memmap(_column_path(self.path, "deleted"), dtype=np.uint8, mode="r+",
+                            shape=(self.rows,))
+        deleted[np.asarray(ids, dtype=np.int64)] = 1
+        deleted.flush()
+        del deleted
+
+    def close(self):
+        self.text_file.close()
+        if self.vector_file is not None:
+            self.vector_file.close()
+        for f in self.files.values():
+            f.close()
+
+
+def replace_store(new_path: str, path: str = STORE_DIR):
+    """Swap a freshly built store directory in for the current one."""
+    old_path = path + ".old"
+    if os.path.exists(old_path):
+        shutil.rmtree(old_path)
+    if os.path.exists(path):
+        os.replace(path, old_path)
+    os.replace(new_path, path)
+    shutil.rmtree(old_path, ignore_errors=True)
+
+
+# ============================================================================
+# READER
+# ============================================================================
+
+class MetadataStore:
+    """
+    Read-only view of the store. Columns are memory-mapped, so opening is
+    cheap and only the texts of returned hits are ever read from disk.
+    Rows appended after opening are not visible until the store is reopened.
+    """
+
+    def __init__(self, path: str = STORE_DIR):
+        if not os.path.exists(os.path.join(path, "texts.bin")):
+            raise FileNotFoundError(f"no chunk store at {path!r}; run ingest.py first")
+        self.path = path
+        self.rows = _row_count(path)
+        self.labels = _load_labels(path)
+
+        self.columns = {}
+        for name, dtype in COLUMNS.items():
+            shape = (self.rows, 2) if name == "offsets" else (self.rows,)
+            if self.rows:
+                self.columns[name] = np.memmap(_column_path(path, name), dtype=dtype, mode="r", shape=shape)
+            else:
+                self.columns[name] = np.zeros(shape, dtype=dtype)
+
+        self._text_file = open(os.path.join(path, "texts.bin"), "rb")
+        size = os.fstat(self._text_file.fileno()).st_size
+        self._texts = mmap.mmap(self._text_file.fileno(), 0, access=mmap.ACCESS_READ) if size else b""
+
+        self._masks: Dict[Tuple, np.ndarray] = {}
+
+        self.dimension = _vector_dimension(path)
+        self._vectors = None
+        vector_path = os.path.join(path, "vectors.f32")
+        if self.dimension and self.rows and os.path.exists(vector_path):
+            self._vectors = np.memmap(vector_path, dtype=np.float32, mode="r",
+                                      shape=(self.rows, self.dimension))
+
+    def __len__(self) -> int:
+        return self.rows
+
+    def live_count(self) -> int:
+        return int(self.rows - np.count_nonzero(self.columns["deleted"]))
+
+    def is_live(self, i: int) -> bool:
+        return 0 <= i < self.rows and not self.columns["deleted"][i]
+
+    def text(self, i: int) -> Optional[str]:
+        if not self.is_live(i):
+            return None
+        start, end = self.columns["offsets"][i]
+        return self._texts[start:end].decode("utf-8")
+
+    def metadata(self, i: int) -> Optional[Dict]:
+        if not self.is_live(i):
+            return None
+        c = self.columns
+        return {
+            "source": self.labels["source"][c["source"][i]],
+            "type": self.labels["type"][c["type"][i]],
+            "page": int(c["page"][i]),
+            "chunk": int(c["chunk"][i]),
+            "char_start": int(c["char_start"][i]),
+            "char_end": int(c["char_end"][i]),
+            "id": int(i),
+        }
+
+    def select(self, types: Optional[Sequence[str]] = None,
+               sources: Optional[Sequence[str]] = None) -> np.ndarray:
+        """
+        Bitmap (bool per row) of live chunks whose type and source are among
+        the given values; None means any. Computed from the columns once per
+        filter and cached, since rows never change under an open store.
+        """
+        key = (tuple(sorted(types)) if types else None,
+               tuple(sorted(sources)) if sources else None)
+        mask = self._masks.get(key)
+        if mask is None:
+            mask = self.columns["deleted"] == 0
+            for column, values in (("type", key[0]), ("source", key[1])):
+                if values is not None:
+                    codes = [n for n, label in enumerate(self.labels[column]) if label in values]
+                    mask &= np.isin(self.columns[column], codes)
+            mask.setflags(write=False)
+            if len(self._masks) >= MAX_CACHED_MASKS:
+                self._masks.clear()
+            self._masks[key] = mask
+        return mask
+
+    @property
+    def has_vectors(self) -> bool:
+        return self._vectors is not None
+
+    def vectors(self, ids: Sequence[int]) -> np.ndarray:
+        """Full-precision embeddings of the given rows (only those pages are read)."""
+        if self._vectors is None:
+            raise ValueError("this store was built without full-precision vectors")
+        return np.asarray(self._vectors[np.asarray(ids, dtype=np.int64)])
+
+    def close(self):
+        if isinstance(self._texts, mmap.mmap):
+            self._texts.close()
+        self._text_file.close()
+        self.columns = {}
+        self._masks = {}
+        self._vectors = None
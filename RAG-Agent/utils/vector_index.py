@@ -0,0 +1,203 @@
+"""
+FAISS INDEX HELPERS
+Builds indexes from factory strings and applies search-time parameters
+"""
+
+import json
+import os
+from typing import Dict, Optional
+
+import faiss
+import numpy as np
+
+INDEX_INFO_PATH = "index_info.json"
+DEFAULT_FACTORY = "Flat"
+
+# --storage option -> FAISS scalar quantizer code
+STORAGE_CODES = {"float32": None, "float16": "SQfp16", "sq8": "SQ8"}
+
+
+def apply_storage(factory: str, storage: str) -> str:
+    """
+    Swap the vector encoding of a factory string for float16 or 8-bit
+    scalar quantization: "Flat" -> "SQ8", "IVF1024,Flat" -> "IVF1024,SQ8",
+    "HNSW32" -> "HNSW32,SQ8".
+    """
+    code = STORAGE_CODES[storage]
+    if code is None:
+        return factory
+    parts = factory.split(",")
+    if parts[-1] == "Flat":
+        parts[-1] = code
+    elif parts[-1].startswith("HNSW"):
+        parts.append(code)
+    else:
+        raise ValueError(f"--storage {storage} needs a Flat or HNSW factory; "
+                         f"{factory!r} already chooses its own encoding")
+    return ",".join(parts)
+
+
+def apply_transform(factory: str, transform: str) -> str:
+    """
+    Prefix a dimensionality-reducing transform ("PCA256", "PCAR256",
+    "OPQ16_64") to a factory string. FAISS stores it inside the index as an
+    IndexPreTransform, so query vectors go through the same trained
+    transform on every index.search.
+    """
+    return f"{transform},{factory}" if transform else factory
+
+
+def transforms(index: faiss.Index):
+    """The trained vector transforms in front of the index, outermost first."""
+    wrapped = faiss.downcast_index(index)
+    if isinstance(wrapped, (faiss.IndexIDMap, faiss.IndexIDMap2)):
+        wrapped = faiss.downcast_index(wrapped.index)
+    if not isinstance(wrapped, faiss.IndexPreTransform):
+        return []
+    return [faiss.downcast_VectorTransform(wrapped.chain.at(i)) for i in range(wrapped.chain.size())]
+
+
+def is_compressed(index: faiss.Index) -> bool:
+    """True when search distances are approximate (quantized codes or a reducing transform)."""
+    if transforms(index):
+        return True
+    inner = inner_index(index)
+    if isinstance(inner, faiss.IndexHNSW):
+        inner = faiss.downcast_index(inner.storage)
+    return not isinstance(inner, (faiss.IndexFlat, faiss.IndexIVFFlat))
+
+
+def is_approximate(index: faiss.Index) -> bool:
+    """True when search may miss or misrank neighbours: compressed, partitioned (IVF) or graph (HNSW)."""
+    inner = inner_index(index)
+    return is_compressed(index) or isinstance(inner, faiss.IndexIVF) or hasattr(inner, "hnsw")
+
+
+def build_index(factory: str, dimension: int) -> faiss.Index:
+    """
+    Build an empty index from a FAISS factory string ("Flat", "IVF1024,Flat",
+    "HNSW32", "IVF256,PQ32", ...) whose vectors are added and removed by
+    chunk id. IVF indexes store the ids in their inverted lists; every
+    other type is wrapped in an IndexIDMap2.
+    """
+    index = faiss.index_factory(dimension, factory)
+    if isinstance(inner_index(index), faiss.IndexIVF):
+        return index
+    return faiss.IndexIDMap2(index)
+
+
+def uses_chunk_ids(index: faiss.Index) -> bool:
+    """Whether `index` is laid out the way build_index builds it."""
+    ivf = isinstance(inner_index(index), faiss.IndexIVF)
+    if isinstance(faiss.downcast_index(index), faiss.IndexIDMap2):
+        # An ID map over an IVF keeps its own sequence numbers, which stop
+        # matching the IVF's once remove_ids compacts the map
+        return not ivf
+    return ivf
+
+
+def inner_index(index: faiss.Index) -> faiss.Index:
+    """The index under the ID map (and any pre-transform)."""
+    index = faiss.downcast_index(index)
+    while isinstance(index, (faiss.IndexIDMap, faiss.IndexIDMap2, faiss.IndexPreTransform)):
+        index = faiss.downcast_index(index.index)
+    return index
+
+
+def index_type(index: faiss.Index) -> str:
+    return type(inner_index(index)).__name__
+
+
+def can_remove_ids(index: faiss.Index) -> bool:
+    """Whether remove_ids works; HNSW graphs cannot drop vectors."""
+    return not hasattr(inner_index(index), "hnsw")
+
+
+def min_training_points(index: faiss.Index) -> int:
+    """Rough lower bound on vectors needed to train `index` at all."""
+    inner = inner_index(index)
+    need = 1
+    if isinstance(inner, faiss.IndexIVF):
+        need = max(need, inner.nlist)
+    pq = getattr(inner, "pq", None)
+    if pq is not None:
+        need = max(need, pq.ksub)
+    for transform in transforms(index):
+        if isinstance(transform, faiss.OPQMatrix):
+            need = max(need, 256)
+        elif isinstance(transform, faiss.PCAMatrix):
+            need = max(need, transform.d_out)
+    return need
+
+
+def search_params(index: faiss.Index, nprobe: Optional[int] = None,
+                  ef_search: Optional[int] = None,
+                  mask: Optional[np.ndarray] = None) -> Optional[faiss.SearchParameters]:
+    """
+    Per-query search knobs for `index.search(..., params=...)`. nprobe
+    applies to IVF indexes, efSearch to HNSW; other types get None.
+    Per-query parameters leave the shared index untouched, so concurrent
+    callers can use different settings.
+
+    `mask` (one bool per chunk id) restricts the search to those ids
+    through a bitmap IDSelector, so FAISS skips everything else instead of
+    the caller over-fetching and filtering.
+
+    FAISS does not own the objects the parameters point to. Each one is
+    handed to its parent's constructor, which keeps a Python reference to
+    it: the bitmap lives as long as its selector, and the selector as long
+    as the returned parameters. Callers must keep those for the whole search.
+    """
+    inner = inner_index(index)
+    pre_transformed = bool(transforms(index))
+
+    selector = None
+    if mask is not None:
+        selector = faiss.IDSelectorBitmap(np.packbits(mask, bitorder="little"))
+        wrapped = faiss.downcast_index(index)
+        if pre_transformed and isinstance(wrapped, (faiss.IndexIDMap, faiss.IndexIDMap2)):
+            # The ID map only translates selectors it is handed directly;
+            # one nested inside the pre-transform's parameters must already
+            # speak the inner index's sequence numbers
+            selector = faiss.IDSelectorTranslated(wrapped.id_map, selector)
+    selection = {} if selector is None else {"sel": selector}
+
+    if nprobe is not None and isinstance(inner, faiss.IndexIVF):
+        params = faiss.SearchParametersIVF(nprobe=nprobe, **selection)
+    elif ef_search is not None and hasattr(inner, "hnsw"):
+        params = faiss.SearchParametersHNSW(efSearch=ef_search, **selection)
+    elif selector is not None:
+        params = faiss.SearchParameters(**selection)
+    else:
+        return None
+
+    if pre_transformed:
+        params = faiss.SearchParametersPreTransform(index_params=params)
+    return params
+
+
+def search_settings(index: faiss.Index, nprobe: Optional[int] = None,
+                    ef_search: Optional[int] = None) -> Dict:
+    """The knobs from search_params that actually apply to `index`, for logging."""
+    inner = inner_index(index)
+    settings = {}
+    if nprobe is not None and isinstance(inner, faiss.IndexIVF):
+        settings["nprobe"] = nprobe
+    if ef_search is not None and hasattr(inner, "hnsw"):
+        settings["efSearch"] = ef_search
+    return settings
+
+
+def write_index_info(info: Dict, path: str = INDEX_INFO_PATH):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(info, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def read_index_info(path: str = INDEX_INFO_PATH) -> Dict:
+    """Settings the index was built with; defaults for indexes built before they were recorded."""
+    if not os.path.exists(path):
+        return {"factory": DEFAULT_FACTORY}
+    with open(path) as f:
+        return json.load(f)